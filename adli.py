@@ -4,6 +4,7 @@ import os
 import json
 import argparse
 from injector.ProgramProcessor import ProgramProcessor
+from injector.helper import parseSampling, parseLoopSummary, parseSerializerLimits, TIERS
 
 '''
     {
@@ -22,6 +23,24 @@ def verify_python_compatibility():
     if not hasattr(ast, 'unparse'):
         raise RuntimeError("This program requires Python 3.9+ (ast.unparse not available)")
 
+def sampling_policy(value):
+    try:
+        return parseSampling(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def loop_summary(value):
+    try:
+        return parseLoopSummary(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def serializer_limits(value):
+    try:
+        return parseSerializerLimits(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
 def main(argv):
     verify_python_compatibility()
 
@@ -48,11 +67,45 @@ def main(argv):
         help="A unique id representing the system this program belongs to.",
         required=False
     )
+
+    args_parser.add_argument(
+        "-sampling",
+        type=sampling_policy,
+        help="Sampling policy for logtypes and variables: N logs 1 in N executions, K:N logs the first K executions in each scope and then 1 in N.",
+        required=False
+    )
+
+    args_parser.add_argument(
+        "-loopsummary",
+        type=loop_summary,
+        help="Summarize loops: N logs the first and last N iterations in full, F:L logs the first F and last L iterations.",
+        required=False
+    )
     
+    args_parser.add_argument(
+        "-limits",
+        type=serializer_limits,
+        help="Limits used when serializing variable values, for example depth=8,elements=1000,string=10000,nodes=10000.",
+        required=False
+    )
+
+    args_parser.add_argument(
+        "-tier",
+        type=str,
+        choices=list(TIERS),
+        default="full",
+        help="Statements to instrument: functions (function calls), control-flow (functions, branches, loops, try statements and returns) or full (every statement).",
+        required=False
+    )
+
     parsed_args = args_parser.parse_args(argv[1:])
     source = parsed_args.source
     sys_info_path = parsed_args.sysinfo
     sysuid = parsed_args.adlisysuid
+    sampling = parsed_args.sampling
+    loopSummary = parsed_args.loopsummary
+    serializerLimits = parsed_args.limits
+    tier = parsed_args.tier
 
     try:
         open(source)
@@ -79,7 +132,7 @@ def main(argv):
         sysinfo = None
 
     workingDirectory = os.path.dirname(os.path.abspath(__file__))
-    processor = ProgramProcessor(source, workingDirectory, sysinfo)
+    processor = ProgramProcessor(source, workingDirectory, sysinfo, sampling, loopSummary, serializerLimits, tier)
     processor.run()
 
 if "__main__" == __name__:
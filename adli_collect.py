@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import shutil
+import socket
+import stat
+import argparse
+import threading
+
+'''
+    Collects the records streamed by injected programs run with
+    ADLI_SINK=socket and ADLI_SINK_SOCKET=<socket_path>. Each process
+    streams its records as JSON lines over its own connection, starting
+    with its header, and they are written to <execution_id>.cdl.jsonl in
+    the output directory.
+
+    python adli_collect.py <socket_path> [-output <directory>]
+'''
+
+def getExecutionId(line, index):
+    '''
+        Returns the execution id of the header record or a name based on the
+        index of the connection if the first record isn't a header.
+    '''
+    try:
+        record = json.loads(line)
+        return record["header"]["execInfo"]["programExecutionId"]
+    except (ValueError, KeyError, TypeError):
+        return f"connection-{index}"
+
+def receive(connection, outputDirectory, index):
+    '''
+        Writes the records received on the connection to a CDL file.
+    '''
+    with connection, connection.makefile("rb") as stream:
+        first = stream.readline()
+        if not first:
+            return
+
+        path = os.path.join(outputDirectory, f"{getExecutionId(first, index)}.cdl.jsonl")
+        with open(path, "wb") as f:
+            f.write(first)
+            shutil.copyfileobj(stream, f)
+
+    print(f"Received {path}")
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Collects the records streamed by programs run with ADLI_SINK=socket."
+    )
+
+    args_parser.add_argument(
+        "socket",
+        type=str,
+        help="Path of the Unix domain socket to listen on."
+    )
+
+    args_parser.add_argument(
+        "-output",
+        type=str,
+        default=".",
+        help="Directory to write the CDL files to.",
+        required=False
+    )
+
+    parsed_args = args_parser.parse_args(argv[1:])
+    socketPath = parsed_args.socket
+    outputDirectory = parsed_args.output
+
+    os.makedirs(outputDirectory, exist_ok=True)
+
+    # Remove the socket left by a previous collector.
+    if os.path.exists(socketPath):
+        if not stat.S_ISSOCK(os.stat(socketPath).st_mode):
+            print(f"Invalid arguments: {socketPath} exists and isn't a socket", file=sys.stderr)
+            return -1
+        os.remove(socketPath)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socketPath)
+    server.listen()
+    print(f"Listening on {socketPath}")
+
+    index = 0
+    try:
+        while True:
+            (connection, _) = server.accept()
+            threading.Thread(target=receive, args=(connection, outputDirectory, index), daemon=True).start()
+            index += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(socketPath)
+
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
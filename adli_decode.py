@@ -0,0 +1,83 @@
+import sys
+import os
+import argparse
+from reader.BinaryDecoder import readBinaryRecords
+from reader.CdlFile import writeClp, writeJsonLines
+from reader.StackTable import expandStacks
+from reader.DeltaResolver import resolveDeltas
+
+'''
+    Converts a CDL file written with ADLI_FORMAT=binary to a CLP key-value
+    IR CDL file (the format read by the Diagnostic Log Viewer) or to a
+    JSON lines file.
+
+    python adli_decode.py <execution_id>.adlib.zst [-output out.clp.zst] [-expandstacks] [-resolvedeltas]
+'''
+
+def getOutputPath(source, jsonl):
+    name = os.path.basename(source)
+    if name.endswith(".adlib.zst"):
+        name = name[:-len(".adlib.zst")]
+    extension = ".jsonl" if jsonl else ".clp.zst"
+    return os.path.join(os.path.dirname(source), name + extension)
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Converts a binary CDL file to a CLP key-value IR CDL file."
+    )
+
+    args_parser.add_argument(
+        "source",
+        type=str,
+        help="Path to the binary CDL file (<execution_id>.adlib.zst)"
+    )
+
+    args_parser.add_argument(
+        "-output",
+        type=str,
+        help="Path to the output file.",
+        required=False
+    )
+
+    args_parser.add_argument(
+        "-jsonl",
+        action="store_true",
+        help="Write the records as JSON lines instead of CLP key-value IR."
+    )
+
+    args_parser.add_argument(
+        "-expandstacks",
+        action="store_true",
+        help="Replace the stack ids with the full stacks and drop the stack definitions."
+    )
+
+    args_parser.add_argument(
+        "-resolvedeltas",
+        action="store_true",
+        help="Replace the variable deltas logged with ADLI_DELTA with the full values."
+    )
+
+    parsed_args = args_parser.parse_args(argv[1:])
+    source = parsed_args.source
+    outputPath = parsed_args.output or getOutputPath(source, parsed_args.jsonl)
+
+    records = readBinaryRecords(source)
+    if parsed_args.expandstacks:
+        records = expandStacks(records)
+    if parsed_args.resolvedeltas:
+        records = resolveDeltas(records)
+
+    try:
+        if parsed_args.jsonl:
+            writeJsonLines(records, outputPath)
+        else:
+            writeClp(records, outputPath)
+    except (OSError, ValueError, EOFError) as e:
+        print(f"Unable to decode {source}: {str(e)}", file=sys.stderr)
+        return -1
+
+    print(f"Wrote {outputPath}")
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
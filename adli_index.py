@@ -0,0 +1,126 @@
+import sys
+import os
+import json
+import argparse
+from reader.CdlFile import readCdlRecords, CLP_EXTENSION, BINARY_EXTENSION, JSONL_EXTENSION
+from reader.DeltaResolver import resolveDeltas
+from reader.SegmentIndex import buildChunkIndex
+from injector.LoggerInstance.AdliWriters import SegmentedWriter, ClpWriter, BinaryWriter, JsonLinesWriter
+
+'''
+    Builds the index of a chunked CDL file (<execution_id>.index.json), for
+    example when the process was killed before the index was written. With
+    -records, a CDL file written as a single stream is rewritten as chunks
+    of that many records with its index, so that readers can decode only
+    the chunks of a thread, scope, logtype or time range.
+
+    python adli_index.py <cdl file> [-records 10000] [-output directory]
+'''
+
+WRITERS = {
+    CLP_EXTENSION: ClpWriter,
+    BINARY_EXTENSION: BinaryWriter,
+    JSONL_EXTENSION: JsonLinesWriter
+}
+
+def getExtension(path):
+    for extension in WRITERS:
+        if path.endswith(extension):
+            return extension
+    return None
+
+def writeIndex(index, outputPath):
+    with open(outputPath, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+
+def rewriteChunked(source, outputDirectory, maxRecords):
+    '''
+        Writes the records of the CDL file as chunks of maxRecords records
+        and returns the path of the index. The variable deltas are
+        resolved so that each chunk can be decoded on its own.
+
+        :param source: Path to a CDL file written as a single stream.
+        :param outputDirectory: Directory of the chunked file.
+        :param int maxRecords: Number of records per chunk.
+    '''
+    extension = getExtension(source)
+    Writer = WRITERS[extension]
+    records = resolveDeltas(readCdlRecords(source, allowIncomplete=True))
+
+    header = next(records, None)
+    if header is None or header.get("type") != "adli_header":
+        raise ValueError("The CDL file doesn't start with a header.")
+    executionId = header["header"]["execInfo"]["programExecutionId"]
+
+    os.makedirs(outputDirectory, exist_ok=True)
+    writer = SegmentedWriter(
+        lambda path, append: Writer(path, append),
+        outputDirectory,
+        executionId,
+        extension,
+        maxRecords=maxRecords,
+        chunked=True
+    )
+    try:
+        writer.write(header)
+        for record in records:
+            if record.get("type") in ("adli_segment", "adli_segment_end"):
+                raise ValueError("The CDL file is already segmented or chunked.")
+            writer.write(record)
+    finally:
+        writer.close()
+    return writer.indexPath
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Builds the index of a chunked CDL file or rewrites a CDL file as chunks."
+    )
+
+    args_parser.add_argument(
+        "source",
+        type=str,
+        help="Path to the CDL file (.clp.zst, .adlib.zst or .cdl.jsonl)."
+    )
+
+    args_parser.add_argument(
+        "-records",
+        type=int,
+        help="Rewrite the CDL file as chunks of this many records.",
+        required=False
+    )
+
+    args_parser.add_argument(
+        "-output",
+        type=str,
+        help="Path of the index or, with -records, directory of the chunked file "
+             "(by default a chunked directory next to the CDL file).",
+        required=False
+    )
+
+    parsed_args = args_parser.parse_args(argv[1:])
+    source = parsed_args.source
+
+    if getExtension(source) is None or not os.path.isfile(source):
+        print(f"Invalid arguments: {source} is not a CDL file.", file=sys.stderr)
+        return -1
+
+    try:
+        if parsed_args.records:
+            outputDirectory = parsed_args.output or os.path.join(os.path.dirname(source), "chunked")
+            indexPath = rewriteChunked(source, outputDirectory, parsed_args.records)
+        else:
+            index = buildChunkIndex(source)
+            indexPath = parsed_args.output or os.path.join(
+                os.path.dirname(source),
+                f"{index['executionId']}.index.json"
+            )
+            writeIndex(index, indexPath)
+    except (OSError, ValueError) as e:
+        print(f"Unable to index {source}: {str(e)}", file=sys.stderr)
+        return -1
+
+    print(f"Wrote {indexPath}")
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
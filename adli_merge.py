@@ -0,0 +1,74 @@
+import os
+import sys
+import argparse
+from reader.CdlFile import writeClp, writeJsonLines
+from reader.MergeExecutions import ExecutionMerger, findCdlFiles
+
+'''
+    Merges the CDL files written by the processes of a program (each
+    forked or spawned process writes its own CDL file) into one trace.
+
+    python adli_merge.py <output_directory or files> [-output merged.clp.zst] [-jsonl]
+'''
+
+def isOutputFile(path, outputPath):
+    '''
+        Returns True if the path is the output file, even if it is written
+        differently (relative or absolute, "./", symbolic links). The output
+        of a previous run must not be merged again.
+    '''
+    if os.path.abspath(path) == os.path.abspath(outputPath):
+        return True
+    try:
+        return os.path.samefile(path, outputPath)
+    except OSError:
+        return False
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Merges the CDL files of a multiprocess program into one trace."
+    )
+
+    args_parser.add_argument(
+        "sources",
+        type=str,
+        nargs="+",
+        help="CDL files (.clp.zst, .adlib.zst or .cdl.jsonl) or directories containing them."
+    )
+
+    args_parser.add_argument(
+        "-output",
+        type=str,
+        help="Path to the output file.",
+        required=False
+    )
+
+    args_parser.add_argument(
+        "-jsonl",
+        action="store_true",
+        help="Write the records as JSON lines instead of CLP key-value IR."
+    )
+
+    parsed_args = args_parser.parse_args(argv[1:])
+    outputPath = parsed_args.output or ("merged.jsonl" if parsed_args.jsonl else "merged.clp.zst")
+
+    files = findCdlFiles(parsed_args.sources)
+    merger = ExecutionMerger([f for f in files if not isOutputFile(f, outputPath)])
+
+    for path in merger.skipped:
+        print(f"Skipped {path}: the file doesn't contain a header.", file=sys.stderr)
+
+    try:
+        if parsed_args.jsonl:
+            writeJsonLines(merger, outputPath)
+        else:
+            writeClp(merger, outputPath)
+    except (OSError, ValueError) as e:
+        print(f"Unable to merge the CDL files: {str(e)}", file=sys.stderr)
+        return -1
+
+    print(f"Merged {len(merger.executions)} executions into {outputPath}")
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
@@ -0,0 +1,120 @@
+import sys
+import json
+import argparse
+from reader.CdlStream import CdlStream
+from reader.TraceSummary import summarizeStream
+from reader.ParallelDecode import summarizeParallel
+
+'''
+    Summarizes the CDL files of a program in a single pass: the logtypes
+    with the most hits, the most called functions, the events logged by
+    each thread and the variables with the most logged bytes. The records
+    are streamed, so traces of any size can be summarized in constant
+    memory. With -processes, the files, segments
+    and chunks are decoded in parallel.
+
+    python adli_summary.py <output_directory or files> [-header header.json] [-limit 10] [-processes 1] [-json]
+'''
+
+def formatSummary(summary, limit):
+    '''
+        Returns the summary as a report.
+
+        :param TraceSummary summary: The summary of the trace.
+        :param int limit: Number of entries in each section.
+    '''
+    data = summary.toDict(limit)
+    lines = [f"Records: {data['records']}"]
+
+    lines.append("")
+    lines.append("Logtypes with the most hits:")
+    lines.append(f"  {'logtype':>8} {'hits':>12}  location")
+    for lt in data["logTypes"]:
+        lines.append(f"  {lt['id']:>8} {lt['hits']:>12}  {lt['file']}:{lt['lineno']}  {lt['statement'] or ''}")
+
+    lines.append("")
+    lines.append("Most called functions:")
+    lines.append(f"  {'funcid':>8} {'calls':>12}  function")
+    for function in data["functions"]:
+        lines.append(f"  {function['funcid']:>8} {function['calls']:>12}  {function['name']}")
+
+    lines.append("")
+    lines.append("Events per thread:")
+    lines.append(f"  {'events':>12}  {'thread':>16}  execution")
+    for thread in data["threads"]:
+        lines.append(f"  {thread['events']:>12}  {thread['thread']:>16}  {thread['executionId']}")
+
+    lines.append("")
+    lines.append("Variables with the most logged bytes:")
+    lines.append(f"  {'varid':>8} {'records':>12} {'bytes':>14} {'assignments':>12}  name")
+    for variable in data["variables"]:
+        lines.append(f"  {variable['varid']:>8} {variable['records']:>12} {variable['bytes']:>14} "
+                     f"{variable['assignments']:>12}  {variable['name']}")
+
+    return "\n".join(lines)
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Summarizes the CDL files of a program in a single pass."
+    )
+
+    args_parser.add_argument(
+        "sources",
+        type=str,
+        nargs="+",
+        help="CDL files (.clp.zst, .adlib.zst or .cdl.jsonl) or directories containing them."
+    )
+
+    args_parser.add_argument(
+        "-header",
+        type=str,
+        help="Path to the header.json of the program, by default the one next to each CDL file.",
+        required=False
+    )
+
+    args_parser.add_argument(
+        "-limit",
+        type=int,
+        default=10,
+        help="Number of entries in each section.",
+        required=False
+    )
+
+    args_parser.add_argument(
+        "-processes",
+        type=int,
+        default=1,
+        help="Number of processes decoding the files and chunks in parallel, 0 for the number of CPUs.",
+        required=False
+    )
+
+    args_parser.add_argument(
+        "-json",
+        action="store_true",
+        help="Print the summary as JSON."
+    )
+
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    stream = CdlStream(parsed_args.sources, parsed_args.header)
+    if not stream.paths:
+        print("Invalid arguments: no CDL files were found.", file=sys.stderr)
+        return -1
+
+    try:
+        if parsed_args.processes == 1:
+            summary = summarizeStream(stream)
+        else:
+            summary = summarizeParallel(parsed_args.sources, parsed_args.header, parsed_args.processes or None)
+    except (OSError, ValueError) as e:
+        print(f"Unable to summarize {stream.path or 'the CDL files'}: {str(e)}", file=sys.stderr)
+        return -1
+
+    if parsed_args.json:
+        print(json.dumps(summary.toDict(parsed_args.limit), indent=2))
+    else:
+        print(formatSummary(summary, parsed_args.limit))
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
@@ -0,0 +1,70 @@
+'''
+    Measures the cost per event of tracking asyncio tasks (ADLI_TASKS) as
+    the number of concurrent tasks grows. The same number of statements
+    and variables is logged by 1 to 10000 tasks on one event loop, each
+    task awaits after every statement so the event loop switches between
+    them, and the time per event is compared with task tracking disabled.
+
+    Usage:
+        python benchmarks/async_tasks.py [-tasks 1 10 100 1000 10000] [-events 200000]
+'''
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from runtime import ROOT_DIRECTORY, loadRuntime
+
+# Logtype of the async function logged by the workers.
+ASYNC_FUNCTION = 1
+
+async def worker(adli, iterations):
+    adli_uid = adli.getUniqueId(ASYNC_FUNCTION)
+    for i in range(iterations):
+        adli.logStmt(2, adli_uid)
+        adli.logVariable(3, i, adli_uid)
+        await asyncio.sleep(0)
+
+async def runTasks(adli, tasks, events):
+    iterations = max(events // (2 * tasks), 1)
+    await asyncio.gather(*(worker(adli, iterations) for _ in range(tasks)))
+    return iterations * tasks * 2
+
+def timeTasks(adli, tasks, events, trackTasks):
+    '''
+        Runs the tasks and returns the time per event in microseconds.
+    '''
+    adli.trackTasks = trackTasks
+    start = time.perf_counter()
+    logged = asyncio.run(runTasks(adli, tasks, events))
+    return (time.perf_counter() - start) / logged * 1e6
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Benchmarks the asyncio task tracking of AdliLogger."
+    )
+    args_parser.add_argument("-tasks", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    args_parser.add_argument("-events", type=int, default=200000)
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    os.chdir(ROOT_DIRECTORY)
+
+    with tempfile.TemporaryDirectory() as directory:
+        module = loadRuntime(directory)
+        adli = module.adli
+        adli.asyncFunctions = frozenset([ASYNC_FUNCTION])
+
+        print(f"{'tasks':>6} {'untracked':>15} {'tracked':>15} {'overhead':>9}")
+        for tasks in parsed_args.tasks:
+            untracked = timeTasks(adli, tasks, parsed_args.events, False)
+            tracked = timeTasks(adli, tasks, parsed_args.events, True)
+            print(f"{tasks:>6} {untracked:>9.2f} us/ev {tracked:>9.2f} us/ev {(tracked / untracked - 1) * 100:>8.1f}%")
+
+        module.writer.close()
+
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
@@ -0,0 +1,110 @@
+'''
+    Compares finding the records of a sequence number, a scope and a
+    logtype by decoding the whole CDL file with decoding only the chunks
+    listed by the chunk index (ADLI_CHUNK_RECORDS). The cost per record of
+    writing the chunked file is compared with writing a single stream.
+
+    Usage:
+        python benchmarks/chunk_index.py [-events 1000000] [-chunk 50000] [-format clp]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from runtime import ROOT_DIRECTORY, loadRuntime
+
+from reader.CdlFile import readCdlRecords
+from reader.SegmentIndex import readSegmentIndex, findSegments, readSegments
+
+FORMATS = {"clp": ".clp.zst", "binary": ".adlib.zst"}
+
+# Number of statements logged in each scope.
+SCOPE_SIZE = 100
+
+def getRecords(events):
+    '''
+        Returns execution and variable records like the ones logged by an
+        injected program, with a new scope every SCOPE_SIZE records.
+    '''
+    records = []
+    for i in range(events // 2):
+        scope = 2 * i // SCOPE_SIZE + 1
+        records.append({"type": "adli_execution", "value": i % 100, "thread": 1, "scope_uid": scope, "seq": 2 * i})
+        records.append({"type": "adli_variable", "varid": i % 50, "thread": 1, "scope_uid": scope,
+                        "value": {"count": i, "name": f"item {i}"}, "seq": 2 * i + 1})
+    return records
+
+def timeWrite(writer, records):
+    '''
+        Writes the records and returns the time per record in microseconds.
+    '''
+    start = time.perf_counter()
+    for record in records:
+        writer.write(record)
+    writer.close()
+    return (time.perf_counter() - start) / len(records) * 1e6
+
+def timeLookup(records, match):
+    '''
+        Returns the matching records and the time it took to find them in
+        milliseconds.
+    '''
+    start = time.perf_counter()
+    found = [record for record in records if match(record)]
+    return found, (time.perf_counter() - start) * 1e3
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Benchmarks reading a chunked CDL file through its index."
+    )
+    args_parser.add_argument("-events", type=int, default=1000000)
+    args_parser.add_argument("-chunk", type=int, default=50000)
+    args_parser.add_argument("-format", type=str, choices=list(FORMATS), default="clp")
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    os.chdir(ROOT_DIRECTORY)
+    records = getRecords(parsed_args.events)
+    extension = FORMATS[parsed_args.format]
+
+    with tempfile.TemporaryDirectory() as directory:
+        module = loadRuntime(directory)
+        module.ADLI_FORMAT = parsed_args.format
+
+        singleCost = timeWrite(module.openTarget(os.path.join(directory, f"single{extension}")), records)
+        chunked = module.SegmentedWriter(
+            module.openTarget, directory, "chunked", extension, maxRecords=parsed_args.chunk, chunked=True
+        )
+        chunkedCost = timeWrite(chunked, records)
+        print(f"Write: {singleCost:.2f} us/record single stream, {chunkedCost:.2f} us/record chunked")
+
+        path = os.path.join(directory, f"chunked{extension}")
+        index = readSegmentIndex(chunked.indexPath)
+        print(f"{len(index['segments'])} chunks, {os.path.getsize(path)} bytes")
+
+        middle = len(records) // 2
+        lookups = [
+            ("seq", {"seq": middle}, lambda record: record.get("seq") == middle),
+            ("scope", {"scope": records[middle]["scope_uid"]},
+             lambda record: record.get("scope_uid") == records[middle]["scope_uid"]),
+            ("logtype", {"logtype": 7},
+             lambda record: record.get("type") == "adli_execution" and record["value"] == 7),
+        ]
+
+        print(f"{'lookup':>8} {'full decode':>14} {'indexed':>14} {'chunks':>7} {'speedup':>8}")
+        for (name, query, match) in lookups:
+            expected, fullTime = timeLookup(readCdlRecords(path), match)
+            segments = findSegments(index, **query)
+            found, indexedTime = timeLookup(readSegments(chunked.indexPath, segments), match)
+            if found != expected:
+                print(f"The indexed {name} lookup didn't find the same records.", file=sys.stderr)
+                return 1
+            print(f"{name:>8} {fullTime:>11.1f} ms {indexedTime:>11.1f} ms {len(segments):>7} {fullTime / indexedTime:>7.1f}x")
+
+        module.writer.close()
+
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
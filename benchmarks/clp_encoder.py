@@ -0,0 +1,107 @@
+'''
+    Compares the per event cost of writing CLP key-value IR records through
+    the logging module (ADLI_CLP_ENCODER=logging) with encoding them
+    directly with AdliWriters.ClpWriter (ADLI_CLP_ENCODER=direct). The
+    writers are measured on their own and behind AdliLogger.logStmt and
+    logVariable.
+
+    Usage:
+        python benchmarks/clp_encoder.py [-events 100000]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from runtime import ROOT_DIRECTORY, loadRuntime
+
+from reader.CdlFile import readClpRecords
+
+ENCODERS = ("logging", "direct")
+
+def getRecords(events):
+    '''
+        Returns execution and variable records like the ones logged by an
+        injected program.
+    '''
+    records = []
+    for i in range(events // 2):
+        records.append({"type": "adli_execution", "value": i % 100, "thread": 1, "scope_uid": 3, "seq": 2 * i})
+        records.append({"type": "adli_variable", "varid": i % 50, "thread": 1, "scope_uid": 3,
+                        "value": {"count": i, "name": f"item {i}"}, "seq": 2 * i + 1})
+    return records
+
+def openWriter(module, encoder, path):
+    module.ADLI_CLP_ENCODER = encoder
+    return module.openTarget(path)
+
+def timeWriter(module, encoder, path, records):
+    '''
+        Writes the records with the writer of the encoder and returns the
+        time per record in microseconds.
+    '''
+    writer = openWriter(module, encoder, path)
+    start = time.perf_counter()
+    for record in records:
+        writer.write(record)
+    writer.close()
+    return (time.perf_counter() - start) / len(records) * 1e6
+
+def timeLogger(module, encoder, path, events):
+    '''
+        Logs statements and variables through AdliLogger with the writer
+        of the encoder and returns the time per event in microseconds.
+    '''
+    adli = module.adli
+    previous = adli.writer
+    adli.writer = openWriter(module, encoder, path)
+
+    start = time.perf_counter()
+    for i in range(events // 2):
+        adli.logStmt(1, "global")
+        adli.logVariable(1, i, "global")
+    adli.writer.close()
+    elapsed = time.perf_counter() - start
+
+    adli.writer = previous
+    return elapsed / events * 1e6
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Benchmarks the CLP key-value IR encoders of AdliLogger."
+    )
+    args_parser.add_argument("-events", type=int, default=100000)
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    os.chdir(ROOT_DIRECTORY)
+    records = getRecords(parsed_args.events)
+
+    with tempfile.TemporaryDirectory() as directory:
+        module = loadRuntime(directory)
+
+        print(f"{'encoder':>8} {'writer':>14} {'logger':>14} {'bytes/event':>12}")
+        results = {}
+        for encoder in ENCODERS:
+            path = os.path.join(directory, f"{encoder}.clp.zst")
+            writerCost = timeWriter(module, encoder, path, records)
+            size = os.path.getsize(path)
+            decoded = list(readClpRecords(path))
+            if decoded != records:
+                print(f"The {encoder} encoder didn't write the records that were logged.", file=sys.stderr)
+                return 1
+
+            loggerCost = timeLogger(module, encoder, os.path.join(directory, f"{encoder}.logger.clp.zst"), parsed_args.events)
+            results[encoder] = (writerCost, loggerCost)
+            print(f"{encoder:>8} {writerCost:>9.2f} us/ev {loggerCost:>9.2f} us/ev {size / len(records):>12.2f}")
+
+        (loggingWriter, loggingLogger) = results["logging"]
+        (directWriter, directLogger) = results["direct"]
+        print(f"Speedup: {loggingWriter / directWriter:.2f}x per record, {loggingLogger / directLogger:.2f}x per logged event")
+
+        module.writer.close()
+
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
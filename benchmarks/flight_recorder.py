@@ -0,0 +1,63 @@
+'''
+    Compares the per event cost of logging statements and variables when
+    every record is written with the cost of keeping them in the flight
+    recorder (ADLI_FLIGHT_RECORDER), and measures the time it takes to dump
+    the recorder.
+
+    Usage:
+        python benchmarks/flight_recorder.py [-events 100000] [-size 1000]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from runtime import ROOT_DIRECTORY, loadRuntime
+
+def timeLogger(adli, flightSize, events):
+    '''
+        Logs statements and variables through AdliLogger and returns the
+        time per event in microseconds.
+    '''
+    adli.flightSize = flightSize
+    adli.getThreadState().resetFlight(flightSize)
+
+    start = time.perf_counter()
+    for i in range(events // 2):
+        adli.logStmt(1, "global")
+        adli.logVariable(1, {"count": i, "name": f"item {i}"}, "global")
+    return (time.perf_counter() - start) / events * 1e6
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Benchmarks the flight recorder of AdliLogger."
+    )
+    args_parser.add_argument("-events", type=int, default=100000)
+    args_parser.add_argument("-size", type=int, default=1000)
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    os.chdir(ROOT_DIRECTORY)
+
+    with tempfile.TemporaryDirectory() as directory:
+        module = loadRuntime(directory)
+        adli = module.adli
+
+        written = timeLogger(adli, 0, parsed_args.events)
+        recorded = timeLogger(adli, parsed_args.size, parsed_args.events)
+
+        start = time.perf_counter()
+        dumped = adli.dumpFlightRecorder()
+        dump = time.perf_counter() - start
+
+        print(f"{'written':>9} {written:>9.2f} us/ev")
+        print(f"{'recorded':>9} {recorded:>9.2f} us/ev")
+        print(f"Dumped {dumped} events in {dump * 1000:.2f}ms, {written / recorded:.2f}x cheaper while recording")
+
+        adli.flightSize = 0
+        module.writer.close()
+
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
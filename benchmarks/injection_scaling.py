@@ -0,0 +1,210 @@
+'''
+    Measures how the injector scales with the size of the program. For each
+    size a synthetic project is generated (see synthetic_project.py) and
+    injected the way ProgramProcessor.run injects it, timing each phase
+    separately: finding the local imports, parsing, LogInjector, the line
+    number update, writing the injected files and writing the header. Each
+    size is measured in a new interpreter so the peak memory of the
+    injection (the growth of the peak RSS during the injection) isn't
+    affected by the previous sizes.
+
+    The time and memory per file are compared with the stored baselines and
+    the script exits with 1 if they grew by more than the tolerance.
+
+    Usage:
+        python benchmarks/injection_scaling.py [-files 10 100 1000] [-functions 10] [-depth 3] [-fanout 4]
+                                               [-tolerance 0.25] [-save]
+'''
+import argparse
+import ast
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# Adds the root of the repository to the path.
+import runtime
+
+from injector.FindLocalImports import findLocalImports
+from injector.LogInjector import LogInjector
+from overhead import compareWithBaseline, loadBaselines, saveBaselines
+from synthetic_project import generateProject
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "injection.json")
+PHASES = ("imports", "parse", "inject", "lineNumbers", "write", "header")
+
+# Metrics compared with the baseline, a larger value is a regression.
+COMPARED_METRICS = ("msPerFile", "peakKbPerFile")
+
+def getPeakRss():
+    '''
+        Returns the peak RSS of this process in KiB.
+    '''
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+
+    # ru_maxrss is in bytes on macOS and in KiB on Linux.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+class DeferredLineNumbers(LogInjector):
+    '''
+        LogInjector which doesn't update the line numbers when it is created
+        so the update can be timed on its own.
+    '''
+    def updateLineNumbers(self):
+        pass
+
+def injectProject(mainPath, outputDirectory, timings):
+    '''
+        Injects the project into the output directory the same way as
+        ProgramProcessor.run and adds the time spent in each phase to
+        timings. Returns the number of files and lines in the project.
+    '''
+    sourceDirectory = os.path.dirname(mainPath)
+
+    start = time.perf_counter()
+    files = findLocalImports(mainPath)
+    timings["imports"] += time.perf_counter() - start
+
+    ltMap = {}
+    varMap = {}
+    fileTree = {}
+    logTypeCount = 0
+    lines = 0
+
+    for currFilePath in files:
+        currRelPath = os.path.relpath(currFilePath, sourceDirectory)
+        outputFilePath = os.path.join(outputDirectory, currRelPath)
+
+        start = time.perf_counter()
+        with open(currFilePath, "r") as f:
+            source = f.read()
+        currAst = ast.parse(source)
+        parsed = time.perf_counter()
+
+        injector = DeferredLineNumbers(source, currAst, logTypeCount, currRelPath, currFilePath == mainPath, None)
+        injected = time.perf_counter()
+
+        LogInjector.updateLineNumbers(injector)
+        updated = time.perf_counter()
+
+        os.makedirs(os.path.dirname(outputFilePath), exist_ok=True)
+        with open(outputFilePath, "w+") as f:
+            f.write(ast.unparse(injector.tree))
+        written = time.perf_counter()
+
+        timings["parse"] += parsed - start
+        timings["inject"] += injected - parsed
+        timings["lineNumbers"] += updated - injected
+        timings["write"] += written - updated
+
+        logTypeCount = injector.logTypeCount
+        ltMap.update(injector.ltMap)
+        varMap.update(injector.varMap)
+        fileTree[currRelPath] = {
+            "source": source,
+            "minLt": injector.minLogTypeCount,
+            "maxLt": injector.maxLogTypeCount,
+            "tier": injector.fileTier
+        }
+        lines += source.count("\n")
+
+    start = time.perf_counter()
+    header = {"fileTree": fileTree, "ltMap": ltMap, "varMap": varMap}
+    with open(os.path.join(outputDirectory, "header.json"), "w+") as f:
+        f.write(json.dumps(header, indent=2))
+    timings["header"] += time.perf_counter() - start
+
+    return (len(files), lines)
+
+def measureSize(files, functions, depth, fanout):
+    '''
+        Generates a project of the given size, injects it and returns the
+        metrics of the injection. This is called in a new interpreter for
+        each size.
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        mainPath = generateProject(os.path.join(directory, "source"), files, functions, depth, fanout)
+
+        startRss = getPeakRss()
+        timings = {phase: 0.0 for phase in PHASES}
+        (fileCount, lines) = injectProject(mainPath, os.path.join(directory, "output"), timings)
+        peak = max(getPeakRss() - startRss, 0)
+
+    total = sum(timings.values())
+    return {
+        "files": fileCount,
+        "lines": lines,
+        **timings,
+        "total": total,
+        "msPerFile": total / fileCount * 1000,
+        "peakKb": peak,
+        "peakKbPerFile": peak / fileCount
+    }
+
+def runSize(files, functions, depth, fanout):
+    '''
+        Measures the size in a new interpreter and returns its metrics.
+    '''
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "-measure",
+         "-files", str(files), "-functions", str(functions), "-depth", str(depth), "-fanout", str(fanout)],
+        stdout=subprocess.PIPE,
+        check=True
+    )
+    return json.loads(process.stdout)
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Benchmarks the injector on synthetic projects of increasing size."
+    )
+    args_parser.add_argument("-files", type=int, nargs="+", default=[10, 100, 1000])
+    args_parser.add_argument("-functions", type=int, default=10)
+    args_parser.add_argument("-depth", type=int, default=3)
+    args_parser.add_argument("-fanout", type=int, default=4)
+    args_parser.add_argument("-baseline", type=str, default=BASELINE_FILE)
+    args_parser.add_argument("-tolerance", type=float, default=0.25)
+    args_parser.add_argument("-save", action="store_true", help="Save the results as the baseline.")
+    args_parser.add_argument("-measure", action="store_true", help=argparse.SUPPRESS)
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    if parsed_args.measure:
+        metrics = measureSize(parsed_args.files[0], parsed_args.functions, parsed_args.depth, parsed_args.fanout)
+        print(json.dumps(metrics))
+        return 0
+
+    baselines = loadBaselines(parsed_args.baseline)
+    results = {}
+
+    print(f"{'files':>6}{'lines':>9}" + "".join(f"{phase:>12}" for phase in PHASES)
+          + f"{'total':>10}{'ms/file':>9}{'baseline':>9}{'peak':>10}")
+
+    for files in parsed_args.files:
+        key = f"files={files},functions={parsed_args.functions},depth={parsed_args.depth},fanout={parsed_args.fanout}"
+        metrics = runSize(files, parsed_args.functions, parsed_args.depth, parsed_args.fanout)
+        results[key] = metrics
+
+        expected = f"{baselines[key]['msPerFile']:.2f}" if key in baselines else "-"
+        print(f"{metrics['files']:>6}{metrics['lines']:>9}" + "".join(f"{metrics[phase]:>11.3f}s" for phase in PHASES)
+              + f"{metrics['total']:>9.2f}s{metrics['msPerFile']:>9.2f}{expected:>9}{metrics['peakKb'] / 1024:>8.1f}MB")
+
+    if parsed_args.save:
+        saveBaselines(parsed_args.baseline, {**baselines, **results})
+        print(f"Saved the baseline to {parsed_args.baseline}")
+        return 0
+
+    regressions = compareWithBaseline(results, baselines, parsed_args.tolerance, COMPARED_METRICS)
+    for (key, metric, expected, value) in regressions:
+        print(f"Regression: {key} {metric} is {value:.2f}, the baseline is {expected:.2f}", file=sys.stderr)
+
+    return 1 if regressions else 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
@@ -0,0 +1,283 @@
+'''
+    Measures the overhead of injected programs. Each workload is run as is
+    and after it is injected with ProgramProcessor, the wall time, CPU time
+    and peak RSS of both runs are measured along with the number of events
+    logged per second and the size of the CDL output per event.
+
+    The results are compared with the stored baselines so regressions in
+    AdliLogger or LogInjector are caught, the script exits with 1 if the
+    CPU time added per event or the bytes per event of a workload are
+    larger than its baseline by more than the tolerance. The plain runs
+    are dominated by the interpreter startup so the overhead ratios are
+    reported but not compared. The ADLI_* environment variables are passed to the injected
+    programs so other runtime configurations can be measured.
+
+    Usage:
+        python benchmarks/overhead.py [-workloads numeric_loops recursion] [-repeat 3] [-tier full]
+                                      [-tolerance 0.25] [-save]
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from runtime import ROOT_DIRECTORY
+
+from injector.ProgramProcessor import ProgramProcessor
+from injector.helper import TIERS
+from reader.CdlFile import isCdlFile, readCdlRecords
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+WORKLOAD_DIRECTORY = os.path.join(BENCHMARK_DIRECTORY, "workloads")
+BASELINE_FILE = os.path.join(BENCHMARK_DIRECTORY, "baselines", "overhead.json")
+SAMPLE_DIRECTORY = os.path.join(ROOT_DIRECTORY, "sample")
+
+# Runs the program as __main__ and writes its peak RSS in KiB to the path
+# passed after the program. On Linux the ru_maxrss of a child includes the
+# RSS of this process when it was forked, so the high water mark of the
+# program's own memory (VmHWM) is used instead.
+LAUNCHER = """
+import atexit, os, resource, runpy, sys
+
+def writePeakRss(path):
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    peak = int(line.split()[1])
+    with open(path, "w") as f:
+        f.write(str(peak))
+
+source = os.path.abspath(sys.argv[1])
+atexit.register(writePeakRss, sys.argv[2])
+sys.argv = [sys.argv[1]]
+sys.path[0] = os.path.dirname(source)
+runpy.run_path(source, run_name="__main__")
+"""
+
+# Metrics compared with the baseline, a larger value is a regression.
+COMPARED_METRICS = ("usPerEvent", "bytesPerEvent")
+
+def libraryManagerV1Input(books=300):
+    '''
+        Returns the input which adds the given number of books with the
+        first version of the library manager.
+    '''
+    lines = []
+    for i in range(books):
+        lines += [f"Book {i}", f"Genre {i % 5}", "y" if i < books - 1 else "n"]
+    return "\n".join(lines) + "\n"
+
+def libraryManagerV2Input(books=300):
+    '''
+        Returns the input which adds the given number of books with the
+        second version of the library manager, places them on the shelf
+        every 10 books and displays the shelf at the end.
+    '''
+    lines = []
+    for i in range(books):
+        lines += ["a", f"Book {i}", f"Genre {i % 5}"]
+        if i % 10 == 9:
+            lines.append("p")
+    lines += ["p", "d", "q"]
+    return "\n".join(lines) + "\n"
+
+def getWorkloads():
+    '''
+        Returns the workloads as a dict of name to the source file and the
+        input passed to the program.
+    '''
+    workloads = {
+        "library_manager_v1": (os.path.join(SAMPLE_DIRECTORY, "library_manager_v1", "library_manager.py"), libraryManagerV1Input()),
+        "library_manager_v2": (os.path.join(SAMPLE_DIRECTORY, "library_manager_v2", "library_manager.py"), libraryManagerV2Input()),
+    }
+    for fileName in sorted(os.listdir(WORKLOAD_DIRECTORY)):
+        if fileName.endswith(".py"):
+            workloads[fileName[:-3]] = (os.path.join(WORKLOAD_DIRECTORY, fileName), "")
+    return workloads
+
+def runProgram(source, directory, stdin):
+    '''
+        Runs the program in a new interpreter and returns its wall time,
+        CPU time (user and system) and peak RSS in KiB.
+
+        :param str source: Path to the program.
+        :param str directory: Working directory of the program.
+        :param str stdin: Input passed to the program.
+    '''
+    (descriptor, rssPath) = tempfile.mkstemp()
+    os.close(descriptor)
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", LAUNCHER, source, rssPath],
+        cwd=directory,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    process.stdin.write(stdin.encode())
+    process.stdin.close()
+    errors = process.stderr.read()
+    (_, status, usage) = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.stderr.close()
+
+    with open(rssPath) as f:
+        maxrss = f.read()
+    os.remove(rssPath)
+
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"{source} failed:\n{errors.decode(errors='replace')}")
+    maxrss = int(maxrss)
+
+    return {"wall": wall, "cpu": usage.ru_utime + usage.ru_stime, "maxrss": maxrss}
+
+def getCdlFiles(directory):
+    return [os.path.join(directory, fileName) for fileName in os.listdir(directory) if isCdlFile(fileName)]
+
+def measure(source, directory, stdin, repeat, countEvents=False):
+    '''
+        Runs the program repeat times and returns the run with the median
+        wall time. If countEvents is True, the CDL files written by each
+        run are deleted before the next run and the number of events and
+        bytes written by the median run are added to the result.
+    '''
+    runs = []
+    for _ in range(repeat):
+        for path in getCdlFiles(directory):
+            os.remove(path)
+
+        run = runProgram(source, directory, stdin)
+        if countEvents:
+            paths = getCdlFiles(directory)
+            run["bytes"] = sum(os.path.getsize(path) for path in paths)
+            run["events"] = sum(1 for path in paths for _ in readCdlRecords(path, allowIncomplete=True))
+        runs.append(run)
+
+    runs.sort(key=lambda run: run["wall"])
+    return runs[len(runs) // 2]
+
+def runWorkload(name, source, stdin, repeat, tier, workingDirectory):
+    '''
+        Measures the workload before and after injection and returns the
+        metrics of the workload.
+    '''
+    plain = measure(source, os.path.dirname(source), stdin, repeat)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor = ProgramProcessor(source, workingDirectory, None, tier=tier)
+        processor.run()
+    injectionTime = time.perf_counter() - start
+
+    injected = measure(os.path.basename(source), processor.outputDirectory, stdin, repeat, countEvents=True)
+    shutil.rmtree(processor.outputDirectory)
+
+    return {
+        "plainWall": plain["wall"],
+        "plainCpu": plain["cpu"],
+        "plainMaxrss": plain["maxrss"],
+        "wall": injected["wall"],
+        "cpu": injected["cpu"],
+        "maxrss": injected["maxrss"],
+        "injectionTime": injectionTime,
+        "overhead": injected["wall"] / plain["wall"],
+        "cpuOverhead": injected["cpu"] / max(plain["cpu"], 1e-3),
+        "events": injected["events"],
+        "eventsPerSecond": injected["events"] / injected["wall"],
+        "usPerEvent": (injected["cpu"] - plain["cpu"]) / max(injected["events"], 1) * 1e6,
+        "bytesPerEvent": injected["bytes"] / max(injected["events"], 1)
+    }
+
+def compareWithBaseline(results, baseline, tolerance, comparedMetrics=COMPARED_METRICS):
+    '''
+        Returns the regressions of the results as a list of (workload,
+        metric, baseline value, value) tuples.
+
+        :param dict results: The metrics of each workload.
+        :param dict baseline: The stored metrics of each workload.
+        :param float tolerance: Allowed relative increase of a metric.
+        :param comparedMetrics: Metrics where a larger value is a regression.
+    '''
+    regressions = []
+    for (name, metrics) in results.items():
+        if name not in baseline:
+            continue
+        for metric in comparedMetrics:
+            if metrics[metric] > baseline[name][metric] * (1 + tolerance):
+                regressions.append((name, metric, baseline[name][metric], metrics[metric]))
+    return regressions
+
+def loadBaselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def saveBaselines(path, baselines):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w+") as f:
+        f.write(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+
+def main(argv):
+    workloads = getWorkloads()
+
+    args_parser = argparse.ArgumentParser(
+        description="Benchmarks programs before and after injection."
+    )
+    args_parser.add_argument("-workloads", type=str, nargs="+", choices=list(workloads), default=list(workloads))
+    args_parser.add_argument("-repeat", type=int, default=3)
+    args_parser.add_argument("-tier", type=str, choices=list(TIERS), default="full")
+    args_parser.add_argument("-baseline", type=str, default=BASELINE_FILE)
+    args_parser.add_argument("-tolerance", type=float, default=0.25)
+    args_parser.add_argument("-save", action="store_true", help="Save the results as the baseline.")
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    baselines = loadBaselines(parsed_args.baseline)
+    baseline = baselines.get(parsed_args.tier, {}).get("workloads", {})
+    results = {}
+
+    print(f"{'workload':<20}{'plain':>9}{'injected':>10}{'overhead':>10}{'cpu':>8}{'rss':>10}"
+          f"{'events':>9}{'events/s':>10}{'us/event':>9}{'baseline':>10}{'B/event':>9}")
+
+    with tempfile.TemporaryDirectory() as workingDirectory:
+        for name in parsed_args.workloads:
+            (source, stdin) = workloads[name]
+            metrics = runWorkload(name, source, stdin, parsed_args.repeat, parsed_args.tier, workingDirectory)
+            results[name] = metrics
+
+            expected = f"{baseline[name]['usPerEvent']:.2f}" if name in baseline else "-"
+            print(f"{name:<20}{metrics['plainWall']:>8.3f}s{metrics['wall']:>9.3f}s{metrics['overhead']:>9.2f}x"
+                  f"{metrics['cpuOverhead']:>7.2f}x{metrics['maxrss'] - metrics['plainMaxrss']:>+8d}KB"
+                  f"{metrics['events']:>9}{metrics['eventsPerSecond']:>10.0f}{metrics['usPerEvent']:>9.2f}{expected:>10}"
+                  f"{metrics['bytesPerEvent']:>9.2f}")
+
+    if parsed_args.save:
+        baselines[parsed_args.tier] = {
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "repeat": parsed_args.repeat,
+            "workloads": {**baseline, **results}
+        }
+        saveBaselines(parsed_args.baseline, baselines)
+        print(f"Saved the baseline to {parsed_args.baseline}")
+        return 0
+
+    regressions = compareWithBaseline(results, baseline, parsed_args.tolerance)
+    for (name, metric, expected, value) in regressions:
+        print(f"Regression: {name} {metric} is {value:.2f}, the baseline is {expected:.2f}", file=sys.stderr)
+
+    return 1 if regressions else 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
@@ -0,0 +1,79 @@
+'''
+    Measures the time to summarize the CDL files of a system run with 1 to
+    N processes (adli_summary.py -processes). Several chunked CDL files are
+    written with the AdliLogger runtime, summarized with the single process
+    stream and with reader.ParallelDecode, and the summaries are checked
+    to be identical.
+
+    Usage:
+        python benchmarks/parallel_summary.py [-files 4] [-events 250000] [-chunk 25000] [-processes 1 2 4 8]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from runtime import ROOT_DIRECTORY, loadRuntime
+
+from reader.CdlStream import CdlStream
+from reader.ParallelDecode import summarizeParallel
+from reader.TraceSummary import summarizeStream
+
+def writeTrace(module, directory, executionId, events, chunk):
+    '''
+        Writes a chunked CDL file with a header and execution and variable
+        records like the ones logged by an injected program.
+    '''
+    writer = module.SegmentedWriter(
+        module.openTarget, directory, executionId, ".clp.zst", maxRecords=chunk, chunked=True
+    )
+    writer.write({"type": "adli_header", "header": {"execInfo": {"programExecutionId": executionId}}})
+    for i in range(events // 2):
+        scope = i // 50 + 1
+        writer.write({"type": "adli_execution", "value": i % 100, "thread": 1, "scope_uid": scope, "seq": 2 * i})
+        writer.write({"type": "adli_variable", "varid": i % 50, "thread": 1, "scope_uid": scope,
+                      "value": {"count": i, "name": f"item {i}"}, "seq": 2 * i + 1})
+    writer.close()
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Benchmarks summarizing CDL files in a pool of processes."
+    )
+    args_parser.add_argument("-files", type=int, default=4)
+    args_parser.add_argument("-events", type=int, default=250000)
+    args_parser.add_argument("-chunk", type=int, default=25000)
+    args_parser.add_argument("-processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    os.chdir(ROOT_DIRECTORY)
+
+    with tempfile.TemporaryDirectory() as directory:
+        module = loadRuntime(directory)
+        traceDirectory = os.path.join(directory, "trace")
+        os.makedirs(traceDirectory)
+        for i in range(parsed_args.files):
+            writeTrace(module, traceDirectory, f"execution-{i}", parsed_args.events, parsed_args.chunk)
+
+        start = time.perf_counter()
+        expected = summarizeStream(CdlStream([traceDirectory])).toDict()
+        streamTime = time.perf_counter() - start
+        print(f"{os.cpu_count()} CPUs, {expected['records']} records")
+        print(f"{'processes':>9} {'time':>10} {'speedup':>8}")
+        print(f"{'stream':>9} {streamTime:>8.2f} s {1:>7.2f}x")
+
+        for processes in parsed_args.processes:
+            start = time.perf_counter()
+            summary = summarizeParallel([traceDirectory], processes=processes).toDict()
+            elapsed = time.perf_counter() - start
+            if summary != expected:
+                print(f"The summary with {processes} processes differs from the stream summary.", file=sys.stderr)
+                return 1
+            print(f"{processes:>9} {elapsed:>8.2f} s {streamTime / elapsed:>7.2f}x")
+
+        module.writer.close()
+
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
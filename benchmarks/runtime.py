@@ -0,0 +1,34 @@
+import importlib
+import os
+import sys
+import time
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+
+from injector.LoggerInstance.getLoggerInstance import getRuntimeModules
+
+def loadRuntime(directory):
+    '''
+        Writes the AdliLogger runtime that is shipped with injected programs
+        into the given directory and imports it. This ensures the benchmarks
+        measure the same source that the injected programs run.
+
+        :param str directory: Directory to write the runtime to.
+    '''
+    for (fileName, source) in getRuntimeModules().items():
+        with open(os.path.join(directory, fileName), "w+") as f:
+            f.write(source)
+
+    sys.path.insert(0, directory)
+    return importlib.import_module("AdliLogger")
+
+def timeCalls(func, iterations):
+    '''
+        Calls the function the given number of times and returns the
+        average time per call in microseconds.
+    '''
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
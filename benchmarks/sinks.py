@@ -0,0 +1,84 @@
+'''
+    Measures the cost per record of each sink (ADLI_SINK). The socket sink
+    streams to a collector thread which reads and discards the records.
+
+    Usage:
+        python benchmarks/sinks.py [-events 100000]
+'''
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from runtime import ROOT_DIRECTORY, loadRuntime
+
+from clp_encoder import getRecords
+
+def startCollector(path):
+    '''
+        Listens on the Unix domain socket and discards what it receives.
+    '''
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+
+    def collect():
+        (connection, _) = server.accept()
+        with connection:
+            while connection.recv(1 << 16):
+                pass
+        server.close()
+
+    thread = threading.Thread(target=collect, daemon=True)
+    thread.start()
+    return thread
+
+def timeSink(module, sink, directory, records):
+    '''
+        Writes the records with the writer of the sink and returns the time
+        per record in microseconds.
+    '''
+    module.ADLI_SINK = sink
+    if sink == "socket":
+        module.ADLI_SINK_SOCKET = os.path.join(directory, "adli.sock")
+        collector = startCollector(module.ADLI_SINK_SOCKET)
+
+    writer = module.openSink(f"sink-{sink}")
+
+    start = time.perf_counter()
+    for record in records:
+        writer.write(record)
+    writer.close()
+    elapsed = time.perf_counter() - start
+
+    if sink == "socket":
+        collector.join()
+
+    return elapsed / len(records) * 1e6
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Benchmarks the sinks of AdliLogger."
+    )
+    args_parser.add_argument("-events", type=int, default=100000)
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    os.chdir(ROOT_DIRECTORY)
+    records = getRecords(parsed_args.events)
+
+    with tempfile.TemporaryDirectory() as directory:
+        module = loadRuntime(directory)
+
+        print(f"{'sink':>8} {'cost':>14}")
+        for sink in module.SINKS:
+            print(f"{sink:>8} {timeSink(module, sink, directory, records):>9.2f} us/ev")
+
+        module.writer.close()
+
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
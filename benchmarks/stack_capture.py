@@ -0,0 +1,107 @@
+'''
+    Compares the cost of capturing the stack for each logged statement
+    using traceback.extract_stack (the previous implementation) against
+    the frame walking implementation in AdliLogger.captureStack.
+
+    Usage:
+        python benchmarks/stack_capture.py [-depths 5 20 50] [-iterations 20000]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import traceback
+
+from runtime import ROOT_DIRECTORY, loadRuntime, timeCalls
+
+def atDepth(depth, func):
+    '''
+        Calls func after recursing to the given depth so that the
+        stack being captured has a realistic size.
+    '''
+    if depth <= 0:
+        return func()
+    return atDepth(depth - 1, func)
+
+def getStack(fullStack):
+    '''
+        Returns the frames of the stack extracted with traceback that are
+        in the current directory. This is the previous implementation of
+        the stack capture, it was moved here from AdliLogger.
+    '''
+    stack = {}
+    base_path = os.getcwd()
+    stackCount = 0
+    for frame in fullStack:
+        if frame.filename.startswith(base_path):
+            stack[str(stackCount)] = {
+                "name": frame.name,
+                "filename": os.path.relpath(frame.filename, base_path),
+                "lineno": frame.lineno
+            }
+            stackCount += 1
+
+    return stack
+
+def legacyLogStmt(module):
+    '''
+        Returns the statement logging function used before the stack
+        capture was replaced, for comparison.
+    '''
+    def logStmt(stmtId, scope_uid, fullStack):
+        stmtObj = {
+            "type": "adli_execution",
+            "thread": threading.get_ident(),
+            "scope_uid": str(scope_uid),
+            "stack": getStack(fullStack),
+            "value": stmtId
+        }
+        module.writer.write(stmtObj)
+    return logStmt
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Benchmarks the stack capture used by AdliLogger.logStmt."
+    )
+    args_parser.add_argument("-depths", type=int, nargs="+", default=[5, 20, 50])
+    args_parser.add_argument("-iterations", type=int, default=20000)
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    # Frames in the benchmarks folder must be part of the project.
+    os.chdir(ROOT_DIRECTORY)
+
+    with tempfile.TemporaryDirectory() as directory:
+        module = loadRuntime(directory)
+        adli = module.adli
+        oldLogStmt = legacyLogStmt(module)
+
+        # Both implementations must log the same stack.
+        oldStack, newStack = atDepth(3, lambda: (
+            getStack(traceback.extract_stack()), adli.formatStack(adli.captureStack(sys._getframe()))))
+        if oldStack != newStack:
+            raise RuntimeError(f"Stack mismatch:\n{oldStack}\n{newStack}")
+
+        print(f"{'depth':>6} {'extract_stack':>15} {'captureStack':>14} {'speedup':>8}"
+              f" {'old logStmt':>13} {'new logStmt':>13} {'speedup':>8}")
+
+        for depth in parsed_args.depths:
+            n = parsed_args.iterations
+            oldCapture = atDepth(depth, lambda: timeCalls(
+                lambda: getStack(traceback.extract_stack()), n))
+            newCapture = atDepth(depth, lambda: timeCalls(
+                lambda: adli.formatStack(adli.captureStack(sys._getframe())), n))
+            oldLog = atDepth(depth, lambda: timeCalls(
+                lambda: oldLogStmt(1, "global", traceback.extract_stack()), n))
+            newLog = atDepth(depth, lambda: timeCalls(
+                lambda: adli.logStmt(1, "global"), n))
+
+            print(f"{depth:>6} {oldCapture:>13.2f}us {newCapture:>12.2f}us {oldCapture / newCapture:>7.1f}x"
+                  f" {oldLog:>11.2f}us {newLog:>11.2f}us {oldLog / newLog:>7.1f}x")
+
+        module.writer.close()
+
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
@@ -0,0 +1,141 @@
+'''
+    Generates synthetic projects to benchmark the injector on. The project
+    has a main.py and the given number of modules spread over packages of
+    100 modules. Every module imports up to fanout other modules so all of
+    them are found from main.py, and each function has nested branches and
+    loops up to the given depth and calls a function of an imported module.
+
+    Usage:
+        python benchmarks/synthetic_project.py <directory> [-files 100] [-functions 10] [-depth 3] [-fanout 4]
+'''
+import argparse
+import os
+import sys
+
+MODULES_PER_PACKAGE = 100
+
+def getModuleName(index):
+    return f"pkg_{index // MODULES_PER_PACKAGE:03d}.mod_{index:05d}"
+
+def getImports(index, files, fanout):
+    '''
+        Returns the indices of the modules imported by the module. The
+        modules form a tree rooted at main.py (index -1) so every module
+        is imported by exactly one parent.
+    '''
+    return list(range((index + 1) * fanout, min((index + 2) * fanout, files)))
+
+def generateBlock(depth, indent, call):
+    '''
+        Returns the lines of a block with nested branches and loops.
+    '''
+    pad = "    " * indent
+    if depth == 0:
+        return [
+            f"{pad}value = value + step",
+            f"{pad}values.append({call})",
+        ]
+
+    if depth % 2 == 0:
+        lines = [f"{pad}for step in range(2):"]
+    else:
+        lines = [f"{pad}if value % 2 == 0:"]
+    lines += generateBlock(depth - 1, indent + 1, call)
+    if depth % 2 == 1:
+        lines += [f"{pad}else:", f"{pad}    value -= 1"]
+    return lines
+
+def generateModule(index, files, functions, depth, fanout):
+    '''
+        Returns the source of the module with the given index, -1 is the
+        main module.
+    '''
+    imports = getImports(index, files, fanout)
+    lines = [f"import {getModuleName(child)}" for child in imports]
+    lines.append("")
+
+    for function in range(functions):
+        if imports:
+            child = imports[function % len(imports)]
+            call = f"{getModuleName(child)}.function_{function}(step, {depth})"
+        else:
+            call = "step * 2"
+
+        lines += [
+            f"def function_{function}(value, depth):",
+            "    '''",
+            f"        Function {function} of module {index}.",
+            "    '''",
+            "    values = []",
+            "    step = 1",
+        ]
+        lines += generateBlock(depth, 1, call)
+        lines += [
+            "    result = {'value': value, 'values': values}",
+            "    return result",
+            "",
+        ]
+
+    if index == -1:
+        lines += [
+            "def main():",
+            "    total = 0",
+            "    for i in range(3):",
+            f"        total += function_0(i, {depth})['value']",
+            "    print(total)",
+            "",
+            "main()",
+        ]
+    return "\n".join(lines) + "\n"
+
+def generateProject(directory, files=100, functions=10, depth=3, fanout=4):
+    '''
+        Writes the synthetic project into the directory and returns the path
+        of its main.py.
+
+        :param str directory: Directory to write the project to.
+        :param int files: Number of modules (not including main.py).
+        :param int functions: Number of functions per module.
+        :param int depth: Nesting depth of the branches and loops.
+        :param int fanout: Number of modules imported by each module.
+    '''
+    os.makedirs(directory, exist_ok=True)
+
+    for index in range(files):
+        path = os.path.join(directory, *getModuleName(index).split(".")) + ".py"
+        packageDirectory = os.path.dirname(path)
+        if not os.path.exists(packageDirectory):
+            os.makedirs(packageDirectory)
+            open(os.path.join(packageDirectory, "__init__.py"), "w").close()
+
+        with open(path, "w+") as f:
+            f.write(generateModule(index, files, functions, depth, fanout))
+
+    mainPath = os.path.join(directory, "main.py")
+    with open(mainPath, "w+") as f:
+        f.write(generateModule(-1, files, functions, depth, fanout))
+    return mainPath
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Generates a synthetic project to benchmark the injector on."
+    )
+    args_parser.add_argument("directory", type=str)
+    args_parser.add_argument("-files", type=int, default=100)
+    args_parser.add_argument("-functions", type=int, default=10)
+    args_parser.add_argument("-depth", type=int, default=3)
+    args_parser.add_argument("-fanout", type=int, default=4)
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    mainPath = generateProject(
+        parsed_args.directory,
+        parsed_args.files,
+        parsed_args.functions,
+        parsed_args.depth,
+        parsed_args.fanout
+    )
+    print(mainPath)
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
@@ -0,0 +1,74 @@
+'''
+    Measures the throughput of AdliLogger when many threads log at the
+    same time, with and without thread buffering (ADLI_THREAD_BUFFER).
+
+    Usage:
+        python benchmarks/thread_scaling.py [-threads 1 8 16 32] [-events 20000] [-buffer 256]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from runtime import ROOT_DIRECTORY, loadRuntime
+
+def runThreads(adli, threadCount, events):
+    '''
+        Starts the threads at the same time and returns the number of
+        events logged per second by all threads.
+    '''
+    barrier = threading.Barrier(threadCount + 1)
+
+    def work():
+        barrier.wait()
+        for i in range(events):
+            adli.logStmt(1, "global")
+            adli.logVariable(1, i, "global")
+
+    threads = [threading.Thread(target=work) for _ in range(threadCount)]
+    for thread in threads:
+        thread.start()
+
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    adli.flushThreads()
+    adli.writer.flush()
+    elapsed = time.perf_counter() - start
+
+    return threadCount * events * 2 / elapsed
+
+def main(argv):
+    args_parser = argparse.ArgumentParser(
+        description="Benchmarks AdliLogger throughput with many threads."
+    )
+    args_parser.add_argument("-threads", type=int, nargs="+", default=[1, 8, 16, 32])
+    args_parser.add_argument("-events", type=int, default=20000)
+    args_parser.add_argument("-buffer", type=int, default=256)
+    parsed_args = args_parser.parse_args(argv[1:])
+
+    os.chdir(ROOT_DIRECTORY)
+
+    with tempfile.TemporaryDirectory() as directory:
+        module = loadRuntime(directory)
+        adli = module.adli
+
+        print(f"{'threads':>8} {'unbuffered':>14} {'buffered':>14} {'speedup':>8}")
+        for threadCount in parsed_args.threads:
+            adli.threadBufferSize = 0
+            unbuffered = runThreads(adli, threadCount, parsed_args.events)
+
+            adli.threadBufferSize = parsed_args.buffer
+            buffered = runThreads(adli, threadCount, parsed_args.events)
+
+            print(f"{threadCount:>8} {unbuffered:>10.0f} ev/s {buffered:>10.0f} ev/s {buffered / unbuffered:>7.2f}x")
+
+        module.writer.close()
+
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv))
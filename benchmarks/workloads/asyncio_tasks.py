@@ -0,0 +1,19 @@
+'''
+    Asyncio workload: many tasks interleave on one event loop, each task
+    awaits between its statements.
+'''
+import asyncio
+
+async def worker(index, count):
+    total = 0
+    for i in range(count):
+        total += i * index
+        await asyncio.sleep(0)
+    return total
+
+async def main():
+    tasks = [asyncio.create_task(worker(index, 250)) for index in range(20)]
+    results = await asyncio.gather(*tasks)
+    print(sum(results))
+
+asyncio.run(main())
@@ -0,0 +1,16 @@
+'''
+    Big dict mutation: a large dict is assigned and mutated repeatedly so
+    every logged value is expensive to serialize.
+'''
+def update(table, generation):
+    for key in range(0, len(table), 97):
+        table[key] = {"generation": generation, "values": [key, key * 2, key * 3]}
+    return table
+
+def main():
+    table = {key: {"generation": 0, "values": [key]} for key in range(2000)}
+    for generation in range(30):
+        table = update(table, generation)
+    print(len(table), table[97]["generation"])
+
+main()
@@ -0,0 +1,26 @@
+'''
+    Tight numeric loops: every statement is executed many times and most
+    of them assign a small integer or float.
+'''
+def sumOfSquares(n):
+    total = 0
+    for i in range(n):
+        total += i * i
+    return total
+
+def integrate(steps):
+    width = 1.0 / steps
+    area = 0.0
+    for i in range(steps):
+        x = (i + 0.5) * width
+        area += 4.0 / (1.0 + x * x) * width
+    return area
+
+def main():
+    total = 0
+    for _ in range(10):
+        total += sumOfSquares(1000)
+    pi = integrate(5000)
+    print(total, round(pi, 6))
+
+main()
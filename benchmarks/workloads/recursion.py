@@ -0,0 +1,25 @@
+'''
+    Deep recursion: the stack captured for each statement is deep and most
+    of the calls open a new scope.
+'''
+import sys
+
+sys.setrecursionlimit(10000)
+
+def depth(n):
+    if n == 0:
+        return 0
+    return depth(n - 1) + 1
+
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+def main():
+    total = 0
+    for _ in range(10):
+        total += depth(300)
+    print(total, fib(15))
+
+main()
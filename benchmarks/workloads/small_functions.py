@@ -0,0 +1,25 @@
+'''
+    Many small functions: the program spends most of its time calling
+    functions with a few arguments and a single statement.
+'''
+def add(a, b):
+    return a + b
+
+def scale(value, factor):
+    return value * factor
+
+def clamp(value, low, high):
+    return max(low, min(value, high))
+
+def step(value, i):
+    value = add(value, i)
+    value = scale(value, 3)
+    return clamp(value, -1000, 1000)
+
+def main():
+    value = 0
+    for i in range(3000):
+        value = step(value, i)
+    print(value)
+
+main()
@@ -0,0 +1,24 @@
+'''
+    Threaded workload: several threads run the same loop at the same time
+    and log into the same CDL file.
+'''
+import threading
+
+def work(results, index, count):
+    total = 0
+    for i in range(count):
+        total += i % 7
+    results[index] = total
+
+def main():
+    results = [0] * 8
+    threads = []
+    for index in range(8):
+        thread = threading.Thread(target=work, args=(results, index, 2000))
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(sum(results))
+
+main()
@@ -1,14 +1,15 @@
 import ast
 import json
 from injector.helper import getVarLogStmt, getLtLogStmt, getAssignStmt, getAdliConfiguration, getEncodedOutputStmt, getEmptyRootNode, getUniqueIdAssignStmt, getRootUidAssign
-from injector.helper import injectRootLoggingSetup, injectLoggingSetup, getTag
+from injector.helper import injectRootLoggingSetup, injectLoggingSetup, getTag, parseSerializerLimits
+from injector.helper import containsSuspension, getLoopSummaryStmts, getTierComment, getSamplingComment, isInstrumented
 from injector.VariableCollectors.CollectAssignVarInfo import CollectAssignVarInfo
 from injector.VariableCollectors.CollectVariableDefault import CollectVariableDefault
 from injector.VariableCollectors.CollectCallVariables import CollectCallVariables
 from injector.VariableCollectors.CollectFunctionArgInfo import CollectFunctionArgInfo
 
 class LogInjector(ast.NodeTransformer):
-    def __init__(self, source, tree, logTypeCount, file, isRoot, absMap):
+    def __init__(self, source, tree, logTypeCount, file, isRoot, absMap, sampling=None, loopSummary=None, tier=None):
         self.metadata = None
         self.ltMap = {}
         self.varMap = {}
@@ -27,6 +28,29 @@ class LogInjector(ast.NodeTransformer):
         self.localDisabledVariables = []
         self.nodeVarInfo = []
 
+        # Sampling policy for the program, file and current function. Like
+        # the tier, the policy of the file or function is read before it is
+        # visited.
+        self.defaultSampling = sampling
+        self.fileSampling = getSamplingComment(tree.body)
+        self.localSampling = None
+
+        # Serializer limits of the file and the current function and the
+        # limits of variables that were named in the comment. The program
+        # limits are applied at runtime.
+        self.fileLimits = {}
+        self.localLimits = {}
+        self.globalVariableLimits = {}
+        self.localVariableLimits = {}
+
+        self.loopSummary = loopSummary
+
+        # Injection tier of the file and the current function. Unlike the
+        # other comments, the tier comment is read before the file or
+        # function is visited.
+        self.fileTier = getTierComment(tree.body) or tier or "full"
+        self.localTier = None
+
         self.abstraction_meta_stack = []
 
         self.minLogTypeCount = self.logTypeCount
@@ -90,10 +114,42 @@ class LogInjector(ast.NodeTransformer):
             "end_lineno": node.end_lineno,
             "type": type,
             "statement": ast.unparse(getEmptyRootNode(node) if "body" in node._fields else node),
-            "abstraction_meta": absMeta
+            "abstraction_meta": absMeta,
+            "sampling": self.getSampling()
         }
 
         return getLtLogStmt(self.logTypeCount)
+
+    def getTier(self):
+        '''
+            Returns the injection tier for the current node.
+        '''
+        if self.funcId != 0 and self.localTier is not None:
+            return self.localTier
+        return self.fileTier
+
+    def skipNode(self, node):
+        '''
+            Returns the node without logging it if the current tier doesn't
+            instrument it. The children are still visited since they can
+            contain functions or statements that are instrumented.
+        '''
+        if isInstrumented(self.getTier(), node):
+            return None
+        self.generic_visit(node)
+        return node
+
+    def getSampling(self):
+        '''
+            Returns the sampling policy for the current node. A policy
+            defined in the function takes precedence over a policy defined
+            in the file, which takes precedence over the program policy.
+        '''
+        if self.funcId != 0 and self.localSampling is not None:
+            return self.localSampling
+        if self.fileSampling is not None:
+            return self.fileSampling
+        return self.defaultSampling
     
     def generateVarLogStmts(self):
         '''
@@ -114,10 +170,10 @@ class LogInjector(ast.NodeTransformer):
                 continue 
 
             if variable["assignValue"] is None:
-                postLog.append(getVarLogStmt(variable["syntax"], variable["varId"]))
+                postLog.append(getVarLogStmt(variable["syntax"], variable["varId"], variable["logType"]))
             else:                
                 preLog.append(getAssignStmt(variable["name"], variable["assignValue"]))
-                preLog.append(getVarLogStmt(variable["syntax"], variable["varId"]))
+                preLog.append(getVarLogStmt(variable["syntax"], variable["varId"], variable["logType"]))
 
             ''' 
             Variables named "asp_uid" mark a function as the start of a unique trace.
@@ -127,6 +183,10 @@ class LogInjector(ast.NodeTransformer):
             if variable["name"] == "asp_uid":
                 self.ltMap[variable["funcId"]]["isUnique"] = True
 
+            limits = self.getSerializerLimits(variable)
+            if limits:
+                variable["serializerLimits"] = limits
+
             del variable["assignValue"]
             del variable["syntax"]
             self.varMap[variable["varId"]] = variable
@@ -134,6 +194,16 @@ class LogInjector(ast.NodeTransformer):
         self.nodeVarInfo= []
         return preLog, postLog
 
+    def getSerializerLimits(self, variable):
+        '''
+            Returns the serializer limits for the variable. Limits set for
+            the variable by name take precedence over limits set in the
+            function, which take precedence over limits set in the file.
+        '''
+        if variable["global"]:
+            return {**self.fileLimits, **self.globalVariableLimits.get(variable["name"], {})}
+        return {**self.fileLimits, **self.localLimits, **self.localVariableLimits.get(variable["name"], {})}
+
     def processFunctionNode(self, node, isAsync):
         '''
             This function adds a log statement to function body.
@@ -144,27 +214,47 @@ class LogInjector(ast.NodeTransformer):
         meta_tag = getTag(self.logTypeCount, "prev")
 
         self.funcId = self.logTypeCount
+        funcLogTypeId = self.logTypeCount
 
         # Update the log type map to add function specific information
         self.ltMap[self.logTypeCount]["funcid"] = self.logTypeCount
         self.ltMap[self.logTypeCount]["name"] = node.name
         self.ltMap[self.logTypeCount]["isAsync"] = isAsync
 
+        # Nested functions use the tier of the enclosing function unless
+        # they have their own tier comment.
+        outerTier = self.localTier
+        self.localTier = getTierComment(node.body) or outerTier
+        self.ltMap[self.logTypeCount]["tier"] = self.getTier()
+
         # Reset function specific variables before visiting children.
         self.localDisabledVariables = []
         self.globalsInFunc = []
+        outerSampling = self.localSampling
+        self.localSampling = getSamplingComment(node.body)
+        self.ltMap[funcLogTypeId]["sampling"] = self.getSampling()
+        self.localLimits = {}
+        self.localVariableLimits = {}
 
         self.generic_visit(node)
 
         # Add log statements for arguments. This is temporary and will be replaced.
-        self.nodeVarInfo += CollectFunctionArgInfo(node, self.logTypeCount, self.funcId).variables
-        self.nodeVarInfo += CollectCallVariables(node, self.logTypeCount, self.funcId, self.varMap).variables
+        # The arguments belong to the logtype of the function, so they are
+        # enabled and sampled with it. self.logTypeCount is the last logtype
+        # of the body and nested functions reset self.funcId, so the ids
+        # saved before visiting the children are used.
+        self.nodeVarInfo += CollectFunctionArgInfo(node, funcLogTypeId, funcLogTypeId).variables
+        self.nodeVarInfo += CollectCallVariables(node, funcLogTypeId, funcLogTypeId, self.varMap).variables
         preLog, postLog = self.generateVarLogStmts()
 
-        uidAssign = getUniqueIdAssignStmt()
+        uidAssign = getUniqueIdAssignStmt(funcLogTypeId)
         node.body = [meta_tag, uidAssign] + postLog + node.body
         
         self.funcId = 0
+        self.localSampling = outerSampling
+        self.localLimits = {}
+        self.localVariableLimits = {}
+        self.localTier = outerTier
         
         return preLog + [node]
 
@@ -179,6 +269,10 @@ class LogInjector(ast.NodeTransformer):
         '''
             Visit assign statement and extract variables from the target nodes.
         '''
+        skipped = self.skipNode(node)
+        if skipped:
+            return skipped
+
         logStmt = self.generateLtLogStmts(node, "child")
         meta_tag = getTag(self.logTypeCount, "next")
 
@@ -195,6 +289,10 @@ class LogInjector(ast.NodeTransformer):
         '''
             Visit AugAssign statement and extract variables from the target node.
         '''
+        skipped = self.skipNode(node)
+        if skipped:
+            return skipped
+
         logStmt = self.generateLtLogStmts(node, "child")
         meta_tag = getTag(self.logTypeCount, "next")
 
@@ -209,6 +307,10 @@ class LogInjector(ast.NodeTransformer):
             Visit AnnAssign statement and extract variables from target node
             if it has a value.
         '''
+        skipped = self.skipNode(node)
+        if skipped:
+            return skipped
+
         logStmt = self.generateLtLogStmts(node, "child")
         meta_tag = getTag(self.logTypeCount, "next")
 
@@ -230,6 +332,10 @@ class LogInjector(ast.NodeTransformer):
             logger.info(<var_id_n>)
     '''
     def injectLogTypesA(self, node):
+        skipped = self.skipNode(node)
+        if skipped:
+            return skipped
+
         logStmt = self.generateLtLogStmts(node, "child")
         meta_tag = getTag(self.logTypeCount, "next")
         self.generic_visit(node)
@@ -251,6 +357,16 @@ class LogInjector(ast.NodeTransformer):
                 self.globalDisabledVariables += parsed["value"]
             else:
                 self.localDisabledVariables += parsed["value"]
+        elif (parsed and parsed["type"] == "adli_serializer_limits"):
+            limits = parseSerializerLimits(parsed["value"])
+            variableLimits = self.globalVariableLimits if self.funcId == 0 else self.localVariableLimits
+            if "variables" in parsed:
+                for name in parsed["variables"]:
+                    variableLimits[name] = {**variableLimits.get(name, {}), **limits}
+            elif (self.funcId == 0):
+                self.fileLimits = {**self.fileLimits, **limits}
+            else:
+                self.localLimits = {**self.localLimits, **limits}
         elif (parsed and parsed["type"] == "adli_metadata"):
             self.metadata = parsed["value"]
         elif (parsed and parsed["type"] == "adli_encode_output"):
@@ -316,6 +432,10 @@ class LogInjector(ast.NodeTransformer):
                 logger.info(<var_id_n>)
     '''
     def injectLogTypesB(self, node):
+        skipped = self.skipNode(node)
+        if skipped:
+            return skipped
+
         logStmt = self.generateLtLogStmts(node, "child")
         meta_tag = getTag(self.logTypeCount, "next")
         self.generic_visit(node)
@@ -345,6 +465,10 @@ class LogInjector(ast.NodeTransformer):
                 logger.info(<var_id_n>):
     '''
     def injectLogTypesC(self, node):
+        skipped = self.skipNode(node)
+        if skipped:
+            return skipped
+
         logStmt = self.generateLtLogStmts(node, "child")
         meta_tag = getTag(self.logTypeCount, "prev")
         self.generic_visit(node)
@@ -378,16 +502,32 @@ class LogInjector(ast.NodeTransformer):
                 logger.info(<var_id_n>)
                 ...
                 logger.info(<logtype_id>)
+
+        If loops are summarized, the loop is wrapped so that only the
+        first and last iterations are logged in full (see getLoopSummaryStmts).
+        Loops that can be suspended (yield, await, async for) are not
+        summarized because other code can run during an iteration.
     '''    
     def injectLogTypesD(self, node):
+        skipped = self.skipNode(node)
+        if skipped:
+            return skipped
+
         logStmt = self.generateLtLogStmts(node, "child")
+        logTypeId = self.logTypeCount
         meta_tag = getTag(self.logTypeCount, "next")
         self.generic_visit(node)
         self.nodeVarInfo += CollectVariableDefault(node, self.logTypeCount, self.funcId).variables
         self.nodeVarInfo += CollectCallVariables(node, self.logTypeCount, self.funcId, self.varMap).variables
         preLog, postLog = self.generateVarLogStmts()
         node.body = postLog + node.body + [logStmt]
-        return preLog + [logStmt, meta_tag, node]
+
+        isSuspendable = isinstance(node, ast.AsyncFor) or containsSuspension(node)
+        if self.loopSummary is None or isSuspendable:
+            return preLog + [logStmt, meta_tag, node]
+
+        self.ltMap[logTypeId]["loopSummary"] = self.loopSummary
+        return preLog + [logStmt] + getLoopSummaryStmts(logTypeId, node, meta_tag, self.loopSummary)
     
     def visit_For(self, node):
         return self.injectLogTypesD(node)
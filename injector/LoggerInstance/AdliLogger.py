@@ -1,6 +1,9 @@
 import logging
 from pathlib import Path
 from clp_logging.handlers import ClpKeyValuePairStreamHandler
+from AdliWriters import SyncWriter, AsyncWriter, ClpWriter, BinaryWriter, JsonLinesWriter, SocketWriter, MemoryWriter
+from AdliWriters import SegmentedWriter, DeltaRecord
+from AdliSerializer import DEFAULT_LIMITS, parseSerializerLimits, serialize, registerSummarizer
 
 import traceback
 import threading
@@ -9,81 +12,1724 @@ import json
 import time
 import os
 import uuid
+import itertools
+import atexit
+import collections
+import hashlib
+import importlib
+import signal
+import contextvars
 
 ADLI_EXECUTION_ID = str(uuid.uuid4())
 
-path = Path(os.path.dirname(__file__)) / f"{ADLI_EXECUTION_ID}.clp.zst"
-clp_handler = ClpKeyValuePairStreamHandler(open(path, "wb"))
-logger = logging.getLogger("adli")
-logger.setLevel(logging.INFO)
-logger.addHandler(clp_handler)
+# Programs started by an instrumented program (multiprocessing children,
+# subprocesses) inherit the execution id of their parent through the
+# environment so they can be linked to it.
+ADLI_PARENT_EXECUTION_ID = os.environ.get("ADLI_PARENT_EXECUTION_ID")
+os.environ["ADLI_PARENT_EXECUTION_ID"] = ADLI_EXECUTION_ID
+
+# Forked children (pool workers, pre-fork servers) are often terminated or
+# exit with os._exit, without running the exit handlers. Their output is
+# flushed every ADLI_FORK_FLUSH_INTERVAL seconds so the records logged
+# before they exit are kept. 0 disables it.
+ADLI_FORK_FLUSH_INTERVAL = float(os.environ.get("ADLI_FORK_FLUSH_INTERVAL", "1"))
+
+# Frames are only included in the stack if they belong to the project.
+# The project root is resolved once at startup instead of on every log.
+ADLI_BASE_PATH = os.getcwd()
+ADLI_PROJECT_ROOTS = (ADLI_BASE_PATH,)
+
+# "interned" logs a stack id with each execution and defines each distinct
+# stack once, "full" logs the complete stack with each execution and "none"
+# doesn't log the stack. The call tree can be rebuilt from the adli_scope
+# records in every mode.
+ADLI_STACK_MODE = os.environ.get("ADLI_STACK_MODE", "interned")
+
+# Overrides the sampling policy that was set at injection time for every
+# logtype. "N" logs 1 in N executions, "K:N" logs the first K executions
+# and then 1 in N executions and "off" logs every execution.
+ADLI_SAMPLING = os.environ.get("ADLI_SAMPLING")
+
+# Overrides the number of iterations logged in full at the start and end
+# of summarized loops ("N" or "F:L"). "off" logs every iteration.
+ADLI_LOOP_SUMMARY = os.environ.get("ADLI_LOOP_SUMMARY")
+
+# Records that are counted instead of logged in the omitted iterations
+# of a summarized loop. Other records are always logged.
+LOOP_SUMMARIZED_TYPES = {"adli_execution": "value", "adli_variable": "varid"}
+
+# Number of records buffered by each thread before they are written as a
+# batch. 0 writes each record when it is logged.
+ADLI_THREAD_BUFFER = int(os.environ.get("ADLI_THREAD_BUFFER", "0"))
+
+# Sequence numbers are allocated to each thread in blocks of this size.
+SEQUENCE_BLOCK_SIZE = 1024
+
+# Number of frames of instrumented functions each thread maps to their
+# scope id, see AdliLogger.getCallerScope. The map is cleared once it has
+# more entries, the scope of a frame that isn't mapped is read from its
+# locals.
+MAX_FRAME_SCOPES = 1 << 16
+
+# Number of (logtype or varid, scope) executions counts each thread keeps
+# for the first K phase of sampling. The counts are cleared once there are
+# more, so a scope which is still running may log K more executions.
+MAX_SCOPE_HITS = 1 << 14
+
+# "sync" writes each record in the thread that logged it. "async" adds the
+# records to a bounded queue which is written by a background thread. The
+# overflow policy (block, drop or spill) applies when the queue is full.
+ADLI_WRITER = os.environ.get("ADLI_WRITER", "sync")
+ADLI_QUEUE_SIZE = int(os.environ.get("ADLI_QUEUE_SIZE", "10000"))
+ADLI_OVERFLOW = os.environ.get("ADLI_OVERFLOW", "block")
+
+# Overrides the serializer limits that were set at injection time for every
+# variable, for example "depth=8,elements=1000,string=10000,nodes=10000".
+ADLI_SERIALIZER_LIMITS = os.environ.get("ADLI_SERIALIZER_LIMITS")
+
+# Comma separated list of modules imported when the program starts. They
+# can call AdliSerializer.registerSummarizer to summarize their own types.
+ADLI_SUMMARIZERS = os.environ.get("ADLI_SUMMARIZERS")
+
+# "off" (default) logs the full value of every variable. "unchanged" logs
+# an unchanged marker instead of the value if it didn't change since the
+# last log of the same varid in the same scope. "diff" also logs the keys
+# that changed if the value is a dictionary. The last value of each
+# (varid, scope) is cached per thread in a cache of ADLI_DELTA_CACHE
+# entries, the least recently logged entry is evicted once it is full.
+ADLI_DELTA = os.environ.get("ADLI_DELTA", "off")
+ADLI_DELTA_CACHE = int(os.environ.get("ADLI_DELTA_CACHE", "1024"))
+
+# Measures the time spent logging statements, variables and scopes. "N"
+# times 1 in N calls (1 times every call), the totals are estimated from
+# the timed calls. An adli_overhead record is logged and a report is
+# printed to stderr when the program exits. Unset or "off" disables it.
+ADLI_OVERHEAD = os.environ.get("ADLI_OVERHEAD", "off")
+
+# "clp" writes the records as CLP key-value IR. "binary" writes them in the
+# compact format described in AdliWriters.BinaryWriter, which can be
+# converted back to CLP key-value IR with adli_decode.py.
+ADLI_FORMAT = os.environ.get("ADLI_FORMAT", "clp")
+
+# "direct" encodes the CLP key-value IR records with AdliWriters.ClpWriter.
+# "logging" writes them through the "adli" logger and its
+# ClpKeyValuePairStreamHandler. Both write the same stream.
+ADLI_CLP_ENCODER = os.environ.get("ADLI_CLP_ENCODER", "direct")
+
+# Where the records are written:
+# - "file" (default): A CDL file in ADLI_FORMAT next to this module.
+# - "jsonl": An uncompressed <execution_id>.cdl.jsonl file.
+# - "memory": The last ADLI_SINK_CAPACITY records are kept in memory in
+#   adli.writer.records (with the sync writer).
+# - "socket": JSON lines streamed to the Unix domain socket at
+#   ADLI_SINK_SOCKET. If the socket can't be opened, the records are
+#   written to a file instead.
+ADLI_SINK = os.environ.get("ADLI_SINK", "file")
+ADLI_SINK_CAPACITY = int(os.environ.get("ADLI_SINK_CAPACITY", "100000"))
+ADLI_SINK_SOCKET = os.environ.get("ADLI_SINK_SOCKET")
+
+# The CDL file is split into segments once a segment reaches
+# ADLI_SEGMENT_SIZE compressed bytes (for example "64M"), is older than
+# ADLI_SEGMENT_SECONDS or has ADLI_SEGMENT_RECORDS records. If
+# ADLI_SEGMENT_RETAIN is set, only the last N segments are kept. The
+# output isn't segmented if none of the limits are set.
+ADLI_SEGMENT_SIZE = os.environ.get("ADLI_SEGMENT_SIZE")
+ADLI_SEGMENT_SECONDS = float(os.environ.get("ADLI_SEGMENT_SECONDS", "0"))
+ADLI_SEGMENT_RECORDS = int(os.environ.get("ADLI_SEGMENT_RECORDS", "0"))
+ADLI_SEGMENT_RETAIN = int(os.environ.get("ADLI_SEGMENT_RETAIN", "0"))
+
+# The CDL file is written as chunks which can be decoded on their own,
+# with an index of the offset, sequence numbers, time range, threads,
+# scopes and logtypes of each chunk (<execution_id>.index.json). A new
+# chunk is started once the chunk reaches ADLI_CHUNK_SIZE compressed bytes
+# or has ADLI_CHUNK_RECORDS records. Segments take precedence if both are
+# set.
+ADLI_CHUNK_SIZE = os.environ.get("ADLI_CHUNK_SIZE")
+ADLI_CHUNK_RECORDS = int(os.environ.get("ADLI_CHUNK_RECORDS", "0"))
+
+# Logtypes can be enabled and disabled while the program runs. The control
+# file (JSON, see AdliLogger.applyControl) is checked for changes every
+# ADLI_CONTROL_INTERVAL seconds. ADLI_CONTROL_SIGNAL (for example "SIGUSR1")
+# reloads the control file or, if there is none, disables every logtype
+# if any is enabled and enables every logtype otherwise.
+ADLI_CONTROL_FILE = os.environ.get("ADLI_CONTROL_FILE")
+ADLI_CONTROL_INTERVAL = float(os.environ.get("ADLI_CONTROL_INTERVAL", "1"))
+ADLI_CONTROL_SIGNAL = os.environ.get("ADLI_CONTROL_SIGNAL")
+
+# Keeps the last ADLI_FLIGHT_RECORDER statements, variables and scopes of
+# each thread in memory instead of writing them. They are written when an
+# exception is logged, when ADLI_FLIGHT_SIGNAL (for example "SIGUSR2") is
+# received or when adli.dumpFlightRecorder is called. 0 (default) writes
+# every record when it is logged.
+ADLI_FLIGHT_RECORDER = int(os.environ.get("ADLI_FLIGHT_RECORDER", "0"))
+ADLI_FLIGHT_SIGNAL = os.environ.get("ADLI_FLIGHT_SIGNAL")
+FINISHED_FLIGHT_THREADS = 64
+
+# Kinds of the events kept by the flight recorder, see getFlightRecord.
+FLIGHT_STMT = 0
+FLIGHT_VARIABLE = 1
+FLIGHT_SCOPE = 2
+
+# Tracks the asyncio task running each instrumented async function. A
+# task is identified the first time it enters an instrumented async
+# function and an adli_task_switch record is logged each time a thread
+# starts logging for a different task. "off" disables the tracking.
+ADLI_TASKS = os.environ.get("ADLI_TASKS", "on")
+
+outputDirectory = Path(os.path.dirname(__file__))
+
+def parseSize(size):
+    '''
+        Converts a size in bytes with an optional K, M or G suffix to
+        the number of bytes.
+    '''
+    if not size:
+        return 0
+    size = size.strip().upper().rstrip("B")
+    multipliers = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if size and size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+ADLI_SEGMENT_BYTES = parseSize(ADLI_SEGMENT_SIZE)
+ADLI_CHUNK_BYTES = parseSize(ADLI_CHUNK_SIZE)
+
+SINKS = ("file", "jsonl", "memory", "socket")
+
+if ADLI_SINK not in SINKS:
+    print(f"ADLI: Unknown sink {ADLI_SINK}, writing to a file instead", file=sys.stderr)
+    ADLI_SINK = "file"
+
+def getExtension():
+    '''
+        Returns the extension of the files written by the sink.
+    '''
+    if ADLI_SINK == "jsonl":
+        return ".cdl.jsonl"
+    return ".adlib.zst" if ADLI_FORMAT == "binary" else ".clp.zst"
+
+def openTarget(path, append=False):
+    '''
+        Opens the CDL file at the given path and returns its writer.
+
+        :param path: Path of the CDL file.
+        :param bool append: True to append a new chunk to the file.
+    '''
+    if ADLI_SINK == "jsonl":
+        return JsonLinesWriter(path, append)
+
+    if ADLI_FORMAT == "binary":
+        return BinaryWriter(path, append)
+
+    if ADLI_CLP_ENCODER == "direct":
+        return ClpWriter(path, append)
+
+    outputFile = open(path, "ab" if append else "wb")
+    logger = logging.getLogger("adli")
+    logger.setLevel(logging.INFO)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(ClpKeyValuePairStreamHandler(outputFile))
+    return SyncWriter(logger, outputFile)
+
+def openSink(executionId):
+    '''
+        Opens the writer of the sink of the given execution. Falls back to
+        a file if the socket can't be opened.
+    '''
+    global ADLI_SINK
+
+    if ADLI_SINK == "memory":
+        return MemoryWriter(ADLI_SINK_CAPACITY)
+
+    if ADLI_SINK == "socket":
+        try:
+            return SocketWriter(ADLI_SINK_SOCKET)
+        except (OSError, TypeError) as e:
+            print(f"ADLI: Unable to connect to {ADLI_SINK_SOCKET}, writing to a file instead: {e}", file=sys.stderr)
+            ADLI_SINK = "file"
+
+    extension = getExtension()
+
+    if ADLI_SEGMENT_BYTES or ADLI_SEGMENT_SECONDS or ADLI_SEGMENT_RECORDS:
+        return SegmentedWriter(
+            openTarget,
+            outputDirectory,
+            executionId,
+            extension,
+            maxBytes=ADLI_SEGMENT_BYTES,
+            maxSeconds=ADLI_SEGMENT_SECONDS,
+            maxRecords=ADLI_SEGMENT_RECORDS,
+            retain=ADLI_SEGMENT_RETAIN,
+            deltas=ADLI_DELTA != "off"
+        )
+
+    if ADLI_CHUNK_BYTES or ADLI_CHUNK_RECORDS:
+        return SegmentedWriter(
+            openTarget,
+            outputDirectory,
+            executionId,
+            extension,
+            maxBytes=ADLI_CHUNK_BYTES,
+            maxRecords=ADLI_CHUNK_RECORDS,
+            deltas=ADLI_DELTA != "off",
+            chunked=True
+        )
+
+    return openTarget(outputDirectory / f"{executionId}{extension}")
+
+def createWriter(executionId):
+    '''
+        Creates the writer of the CDL file (or segments) of the given execution.
+    '''
+    target = openSink(executionId)
+
+    if ADLI_WRITER == "async":
+        spillPath = outputDirectory / f"{executionId}.spill.jsonl"
+        return AsyncWriter(target, ADLI_QUEUE_SIZE, ADLI_OVERFLOW, spillPath)
+
+    return target
+
+def detachFile(f):
+    '''
+        Points the file descriptor of the file to /dev/null. This is used
+        in a forked child so that the writer it inherited from its parent
+        can never write to the CDL file of the parent, even when it is
+        garbage collected or closed at exit.
+    '''
+    if f is None or getattr(f, "closed", False) or f.fileno() < 0:
+        return
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull, f.fileno())
+    finally:
+        os.close(devnull)
+
+writer = createWriter(ADLI_EXECUTION_ID)
+
+def parseSamplingPolicy(policy):
+    '''
+        Converts a sampling policy from the header ({"first": K, "every": N})
+        or from the environment ("N", "K:N" or "off") to a (first, every)
+        tuple. Returns None if every execution should be logged.
+    '''
+    if policy is None or policy == "off":
+        return None
+
+    if isinstance(policy, dict):
+        first, every = policy.get("first", 0), policy.get("every", 1)
+    else:
+        parts = str(policy).split(":")
+        first, every = (0, parts[0]) if len(parts) == 1 else parts
+
+    first, every = int(first), int(every)
+    if first == 0 and every == 1:
+        return None
+    return (first, every)
+
+def addHits(total, hits):
+    '''
+        Adds the hit counts of a thread to the total hit counts.
+    '''
+    for (key, count) in hits.items():
+        total[key] = total.get(key, 0) + count
+
+def isSameValue(old, new):
+    '''
+        Returns True if the values are equal and have the same JSON
+        encoding. 1, 1.0 and True are equal in Python but are different
+        values in the trace.
+    '''
+    return old == new and json.dumps(old) == json.dumps(new)
+
+def diffValues(old, new, path, changed, removed):
+    '''
+        Adds the [path, value] of each key that was added or changed in the
+        new dictionary to changed and the path of each removed key to
+        removed. Nested dictionaries are compared recursively.
+    '''
+    for key, value in new.items():
+        if key in old:
+            previous = old[key]
+            if isSameValue(previous, value):
+                continue
+            if isinstance(previous, dict) and isinstance(value, dict):
+                diffValues(previous, value, path + [key], changed, removed)
+                continue
+        changed.append([path + [key], value])
+
+    for key in old:
+        if key not in new:
+            removed.append(path + [key])
+
+def getOverlay(changed):
+    '''
+        Returns the [path, value] pairs of diffValues as nested dictionaries
+        with the changed values at their paths. Encoders like CLP write the
+        integral floats of arrays as integers, the values of the overlay
+        are written like the values of a full record.
+    '''
+    overlay = {}
+    for (path, value) in changed:
+        target = overlay
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+    return overlay
+
+class LoopState:
+    '''
+        Tracks the iterations of a summarized loop. The records of the
+        first iterations are logged directly. The records of the other
+        iterations are buffered so that the last iterations can be logged
+        when the loop exits and the records of the iterations in between
+        are counted.
+    '''
+    __slots__ = ("logTypeId", "scope_uid", "first", "last", "iteration", "current", "recent", "counts", "omitted", "ended")
+
+    def __init__(self, logTypeId, scope_uid, first, last):
+        self.logTypeId = logTypeId
+        self.scope_uid = scope_uid
+        self.first = first
+        self.last = last
+        self.iteration = 0
+        self.current = None
+        self.recent = []
+        self.counts = {}
+        self.omitted = 0
+        self.ended = False
+
+    def omit(self, records):
+        '''
+            Counts the records of an omitted iteration and returns the
+            records that must still be logged.
+        '''
+        self.omitted += 1
+        kept = []
+        for record in records:
+            idKey = LOOP_SUMMARIZED_TYPES.get(record["type"])
+            if idKey is None:
+                kept.append(record)
+                continue
+            counts = self.counts.setdefault(record["type"], {})
+            key = str(record[idKey])
+            counts[key] = counts.get(key, 0) + 1
+        return kept
+
+class SequenceAllocator:
+    '''
+        Hands out blocks of sequence numbers. Each thread numbers its
+        records from its own block so the lock is only taken once per
+        block. Sequence numbers are unique and increase within a thread.
+    '''
+    def __init__(self, blockSize):
+        self.lock = threading.Lock()
+        self.next = 1
+        self.blockSize = blockSize
+
+    def allocate(self):
+        with self.lock:
+            start = self.next
+            self.next += self.blockSize
+        return start, start + self.blockSize
+
+class OverheadTracker:
+    '''
+        Accumulates the time spent in the logger by record type and by
+        logtype. Only one in every calls of each record type is timed so
+        the timer calls don't add to the overhead being measured. Each timed call adds the time
+        spent capturing the stack (or finding the caller scope), serializing
+        the value, writing the record (encoding and writing, or buffering
+        it) and the total time of the call.
+    '''
+    PHASES = ("stack", "serialize", "write", "total")
+
+    def __init__(self, every):
+        self.every = every
+        self.calls = collections.defaultdict(lambda: itertools.count(1))
+        self.lock = threading.Lock()
+        self.recordTypes = {}
+        self.logtypes = {}
+
+    def sample(self, recordType):
+        '''
+            Returns True if the current call should be timed.
+
+            :param str recordType: Type of the record being logged.
+        '''
+        return next(self.calls[recordType]) % self.every == 0
+
+    def add(self, recordType, logtype, stack, serialize, write, total):
+        '''
+            Adds the times (in nanoseconds) of a timed call.
+        '''
+        with self.lock:
+            for (table, key) in ((self.recordTypes, recordType), (self.logtypes, logtype)):
+                times = table.get(key)
+                if times is None:
+                    times = table[key] = [0, 0, 0, 0, 0]
+                times[0] += 1
+                times[1] += stack
+                times[2] += serialize
+                times[3] += write
+                times[4] += total
+
+    def getTotals(self, table):
+        '''
+            Returns the number of timed calls and the estimated time of
+            each phase for every key of the table.
+        '''
+        with self.lock:
+            items = [(key, list(times)) for (key, times) in table.items()]
+
+        totals = {}
+        for (key, times) in items:
+            totals[str(key)] = {
+                "timed": times[0],
+                **{f"{phase}Ns": times[i + 1] * self.every for (i, phase) in enumerate(OverheadTracker.PHASES)}
+            }
+        return totals
+
+class TaskContext:
+    '''
+        The asyncio task a context belongs to. It is stored in the
+        currentTask context variable, which asyncio copies into each new
+        task, so a task first sees the context of the task that created it.
+        key is the id() of the asyncio task, which tells the two apart.
+    '''
+    __slots__ = ("id", "parent", "key", "scope")
+
+    def __init__(self, taskId, parent, key, scope):
+        self.id = taskId
+        self.parent = parent
+        self.key = key
+        self.scope = scope
+
+currentTask = contextvars.ContextVar("adli_task", default=None)
+
+class ThreadState:
+    '''
+        Holds the state that is only modified by one thread: its counters,
+        its block of sequence numbers, its buffered records and the loops
+        it is summarizing. The buffer is a deque so records can be taken
+        from it by another thread while the owner is appending.
+
+        In flight recorder mode, the thread's events are kept in the flight
+        ring, a preallocated list used as a ring buffer. flightDumped is the
+        sequence number of the last event that was written so the next
+        dump only writes newer events.
+
+        task is the id of the asyncio task of the last record written by
+        the thread.
+
+        frameScopes maps the id of the frames of the instrumented functions
+        running in the thread to their scope id.
+
+        stmtHits and variableHits count the executions of the sampled
+        logtypes and variables of the thread, stmtScopeHits and
+        variableScopeHits count them per scope (see AdliLogger.isSampled).
+    '''
+    __slots__ = ("thread", "ident", "nextSeq", "endSeq", "buffer", "loops", "deltas", "deltaDrops", "flight", "flightIndex",
+                 "flightDumped", "task", "frameScopes", "stmtHits", "variableHits", "stmtScopeHits", "variableScopeHits", "count",
+                 "stmtLogCount", "variableLogCount", "exceptionLogCount", "inputCount", "outputCount")
+
+    COUNTERS = ("count", "stmtLogCount", "variableLogCount", "exceptionLogCount", "inputCount", "outputCount")
+
+    def __init__(self, flightSize=0):
+        self.thread = threading.current_thread()
+        self.ident = threading.get_ident()
+        self.nextSeq = 0
+        self.endSeq = 0
+        self.buffer = collections.deque()
+        self.loops = []
+        self.deltas = collections.OrderedDict()
+        self.deltaDrops = 0
+        self.resetFlight(flightSize)
+        self.task = None
+        self.frameScopes = {}
+        self.resetHits()
+        for counter in ThreadState.COUNTERS:
+            setattr(self, counter, 0)
+
+    def resetHits(self):
+        self.stmtHits = {}
+        self.variableHits = {}
+        self.stmtScopeHits = {}
+        self.variableScopeHits = {}
+
+    def resetFlight(self, flightSize):
+        self.flight = [None] * flightSize
+        self.flightIndex = 0
+        self.flightDumped = -1
+
+    def nextSequence(self, allocator):
+        '''
+            Returns the next sequence number, allocating a new block if
+            the current block is used up.
+        '''
+        if self.nextSeq == self.endSeq:
+            self.nextSeq, self.endSeq = allocator.allocate()
+        seq = self.nextSeq
+        self.nextSeq += 1
+        return seq
 
 class AdliLogger:
     '''
         This class holds all the logging functions used by the ADLI 
-        tool during runtime. It maintains a count of the number of 
-        logged executions so that each logged instruction can be 
-        uniquely identified.
+        tool during runtime. Each logged record is assigned a sequence
+        number so that each logged instruction can be uniquely identified.
     '''
 
     def __init__(self):
-        self.count = 0
-        self.variableLogCount = 0
-        self.stmtLogCount = 0
-        self.exceptionLogCount = 0
-        self.inputCount = 0
-        self.outputCount = 0
-        self.traceback = traceback
-
-    def processLevel(self, o, k, depth, max_depth):
-        if isinstance(o, (str, int, float, bool)) or o is None:
-            return o
-        
-        # TODO: Improve identifying circular references so we can remove max depth check.
-        # obj_id = id(o)
-        # if obj_id in self.visited:
-        #     return "<Circular Reference Detected>"
-        # self.visited.add(obj_id)
-
-        if depth > max_depth:
-            return '<Max Depth Reached>'
-        
-        if isinstance(o, dict):
-            return {str(k): self.processLevel(v, str(k), depth + 1, max_depth) for (k, v) in o.items()}
-        elif isinstance(o, (list, tuple, set)):
-            return [self.processLevel(item, str(k), depth + 1, max_depth) for item in o]
-        elif hasattr(o, '__dict__'):
-            return {k: self.processLevel(v, str(k), depth + 1, max_depth) for (k, v) in vars(o).items()}
+        self.writer = writer
+
+        # State of each thread, see ThreadState. Counters of threads that
+        # finished are added to finishedCounts.
+        self.local = threading.local()
+        self.threadStates = []
+        self.threadStatesLock = threading.Lock()
+        self.threadBufferSize = ADLI_THREAD_BUFFER
+        self.sequences = SequenceAllocator(SEQUENCE_BLOCK_SIZE)
+        self.finishedCounts = dict.fromkeys(ThreadState.COUNTERS, 0)
+
+        self.projectFiles = {}
+        self.frameIds = {}
+        self.stackIds = {}
+        self.frameIdCounter = itertools.count(1)
+        self.stackIdCounter = itertools.count(1)
+
+        # Scope ids are unique in the execution. The root scope of each
+        # module is "global".
+        self.scopeIds = itertools.count(1)
+
+        # Task ids are unique in the execution. Async functions are
+        # loaded from the header in configureTasks.
+        self.trackTasks = ADLI_TASKS != "off"
+        self.taskIds = itertools.count(1)
+        self.asyncFunctions = frozenset()
+
+        # Sampling policies keyed by logtype and varid, populated from the
+        # header in logHeader. The hits are counted by each thread, the hits
+        # of threads that finished are added to stmtHits and variableHits.
+        self.varLogTypes = {}
+        self.stmtSampling = {}
+        self.variableSampling = {}
+        self.stmtHits = {}
+        self.variableHits = {}
+
+        # Logtypes which are logged, indexed by logtype id. The injected
+        # code checks the table before calling the logger, so the table is
+        # only updated in place. It is sized in configureControl.
+        self.enabled = []
+        self.fileLogTypes = {}
+        self.functionLogTypes = {}
+        self.controlEvent = threading.Event()
+        self.controlThread = None
+
+        # Serializer limits of the program and of the varids with their
+        # own limits. They are populated from the header in logHeader.
+        try:
+            self.serializerOverride = parseSerializerLimits(ADLI_SERIALIZER_LIMITS)
+        except ValueError as e:
+            print(f"ADLI: Ignoring ADLI_SERIALIZER_LIMITS: {e}", file=sys.stderr)
+            self.serializerOverride = {}
+        self.serializerLimits = DEFAULT_LIMITS._replace(**self.serializerOverride)
+        self.variableLimits = {}
+        self.loadSummarizers()
+
+        self.loopSummary = None
+        if ADLI_LOOP_SUMMARY is not None and ADLI_LOOP_SUMMARY != "off":
+            parts = ADLI_LOOP_SUMMARY.split(":")
+            self.loopSummary = (int(parts[0]), int(parts[-1]))
+
+        if ADLI_DELTA not in ("off", "unchanged", "diff"):
+            raise ValueError(f"Invalid delta mode: {ADLI_DELTA}")
+        self.deltaMode = None if ADLI_DELTA == "off" else ADLI_DELTA
+        self.deltaCacheSize = ADLI_DELTA_CACHE
+
+        # The header is saved so it can be logged again by forked children.
+        self.header = None
+        self.parentExecution = None
+        if ADLI_PARENT_EXECUTION_ID is not None:
+            self.parentExecution = {
+                "executionId": ADLI_PARENT_EXECUTION_ID,
+                "forkSeq": None,
+                "pid": os.getppid()
+            }
+        self.forkChildId = None
+        self.forkSeq = None
+        self.closed = False
+
+        self.overhead = None
+        if ADLI_OVERHEAD not in ("", "off"):
+            self.overhead = OverheadTracker(max(1, int(ADLI_OVERHEAD)))
+
+        # Flight recorder (see ADLI_FLIGHT_RECORDER). The rings of threads
+        # that finished are kept until they are dumped, up to
+        # FINISHED_FLIGHT_THREADS threads.
+        self.flightSize = max(ADLI_FLIGHT_RECORDER, 0)
+        self.finishedFlights = collections.deque(maxlen=FINISHED_FLIGHT_THREADS)
+        self.flightEvent = threading.Event()
+        self.flightThread = None
+        if self.flightSize and ADLI_FLIGHT_SIGNAL:
+            try:
+                signal.signal(getattr(signal, ADLI_FLIGHT_SIGNAL), self.handleFlightSignal)
+                self.startFlightThread()
+            except (AttributeError, ValueError, OSError) as e:
+                print(f"ADLI: Unable to handle {ADLI_FLIGHT_SIGNAL}: {e}", file=sys.stderr)
+
+        atexit.register(self.close)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(
+                before=self.beforeFork,
+                after_in_parent=self.afterForkInParent,
+                after_in_child=self.afterForkInChild
+            )
+
+    def close(self):
+        '''
+            Logs the sample counts, writes the buffered records and closes
+            the writer. This is called when the interpreter exits (or when a
+            multiprocessing child exits).
+        '''
+        if self.closed:
+            return
+        self.logOverhead()
+        self.logSampleCounts()
+        self.flushThreads()
+        self.writer.close()
+        self.closed = True
+
+    def beforeFork(self):
+        '''
+            Writes the buffered records before the process forks so they
+            are only written by the parent. The execution id of the child
+            is created here so that the parent can log it.
+        '''
+        if self.closed:
+            return
+        self.flushThreads()
+        self.writer.flush()
+
+        state = self.getThreadState()
+        self.forkChildId = str(uuid.uuid4())
+        self.forkSeq = state.nextSequence(self.sequences)
+
+    def afterForkInParent(self):
+        '''
+            Logs an adli_fork record with the execution id of the child.
+        '''
+        if self.closed:
+            return
+        state = self.getThreadState()
+        self.writeRecord({
+            "type": "adli_fork",
+            "thread": state.ident,
+            "childExecutionId": self.forkChildId,
+            "seq": self.forkSeq
+        }, state)
+
+    def afterForkInChild(self):
+        '''
+            Starts a new execution in the forked child. The child writes to
+            its own CDL file and logs the header again with a link to the
+            execution of its parent. Only the thread that forked exists in
+            the child, so the state of the other threads is discarded.
+        '''
+        global ADLI_EXECUTION_ID, writer
+
+        if self.closed:
+            return
+
+        detachFile(self.writer.file)
+        detachFile(getattr(self.writer, "spillFile", None))
+
+        self.parentExecution = {
+            "executionId": ADLI_EXECUTION_ID,
+            "forkSeq": self.forkSeq,
+            "pid": os.getppid()
+        }
+        ADLI_EXECUTION_ID = self.forkChildId
+        os.environ["ADLI_PARENT_EXECUTION_ID"] = ADLI_EXECUTION_ID
+        writer = createWriter(ADLI_EXECUTION_ID)
+        self.writer = writer
+
+        state = self.getThreadState()
+        state.nextSeq = state.endSeq = 0
+        state.buffer.clear()
+        state.deltas.clear()
+        state.deltaDrops = 0
+        state.resetFlight(self.flightSize)
+        state.task = None
+        state.resetHits()
+        self.finishedFlights.clear()
+        for counter in ThreadState.COUNTERS:
+            setattr(state, counter, 0)
+
+        self.threadStates = [state]
+        self.threadStatesLock = threading.Lock()
+        self.sequences = SequenceAllocator(SEQUENCE_BLOCK_SIZE)
+        self.finishedCounts = dict.fromkeys(ThreadState.COUNTERS, 0)
+
+        # Definitions are logged again in the new file.
+        self.frameIds = {}
+        self.stackIds = {}
+        self.frameIdCounter = itertools.count(1)
+        self.stackIdCounter = itertools.count(1)
+
+        self.stmtHits = {}
+        self.variableHits = {}
+
+        if self.overhead is not None:
+            self.overhead = OverheadTracker(self.overhead.every)
+
+        if self.header is not None:
+            self.writeHeader()
+            self.writer.flush()
+
+        # The threads watching the control file and waiting for the flight
+        # recorder signal don't exist in the child.
+        if self.controlThread is not None:
+            self.controlEvent = threading.Event()
+            self.startControlThread()
+
+        if self.flightThread is not None:
+            self.flightEvent = threading.Event()
+            self.startFlightThread()
+
+        # multiprocessing children exit with os._exit, which doesn't run
+        # the exit handlers, so the output is closed by its finalizers.
+        util = sys.modules.get("multiprocessing.util")
+        if util is not None:
+            util.register_after_fork(self, AdliLogger.registerFinalizer)
+
+        # Children of os.fork usually end with os._exit and terminated
+        # pool workers don't run their finalizers.
+        os._exit = exitAfterClose
+        if ADLI_FORK_FLUSH_INTERVAL > 0:
+            self.startForkFlushThread()
+
+    def startForkFlushThread(self):
+        thread = threading.Thread(target=self.flushPeriodically, name="adli-flush", daemon=True)
+        thread.start()
+
+    def flushPeriodically(self):
+        '''
+            Writes the buffered records and flushes the writer every
+            ADLI_FORK_FLUSH_INTERVAL seconds until the output is closed.
+        '''
+        while True:
+            time.sleep(ADLI_FORK_FLUSH_INTERVAL)
+            if self.closed:
+                return
+            try:
+                self.flushThreads()
+                self.writer.flush()
+            except Exception as e:
+                print(f"ADLI: Unable to flush the output: {e}", file=sys.stderr)
+                return
+
+    def registerFinalizer(self):
+        '''
+            Closes the output when the multiprocessing child exits.
+        '''
+        util = sys.modules["multiprocessing.util"]
+        util.Finalize(self, self.close, exitpriority=0)
+
+    def variableToJson(self, obj, limits=None):
+        '''
+            Returns the value as a JSON compatible value, see AdliSerializer.
+
+            :param obj: The value to serialize.
+            :param SerializerLimits limits: The limits to enforce, the program limits if None.
+        '''
+        return serialize(obj, limits or self.serializerLimits)
+
+    def getThreadState(self):
+        '''
+            Returns the state of the current thread.
+        '''
+        try:
+            return self.local.state
+        except AttributeError:
+            return self.registerThread()
+
+    def registerThread(self):
+        '''
+            Creates the state of the current thread. Threads that finished
+            are flushed and removed so the list of states stays small.
+        '''
+        state = ThreadState(self.flightSize)
+        self.local.state = state
+
+        with self.threadStatesLock:
+            threadStates = [state]
+            for other in self.threadStates:
+                if other.thread.is_alive():
+                    threadStates.append(other)
+                    continue
+                self.flushThread(other)
+                if self.flightSize:
+                    self.finishedFlights.append(other)
+                for counter in ThreadState.COUNTERS:
+                    self.finishedCounts[counter] += getattr(other, counter)
+                addHits(self.stmtHits, other.stmtHits)
+                addHits(self.variableHits, other.variableHits)
+            self.threadStates = threadStates
+
+        return state
+
+    def flushThread(self, state):
+        '''
+            Writes the records buffered by the given thread as a batch.
+        '''
+        buffer = state.buffer
+        records = []
+        try:
+            for _ in range(len(buffer)):
+                records.append(buffer.popleft())
+        except IndexError:
+            # Another thread flushed the buffer at the same time.
+            pass
+
+        if records:
+            self.writer.writeBatch(records)
+
+    def flushThreads(self):
+        '''
+            Writes the records buffered by every thread.
+        '''
+        with self.threadStatesLock:
+            for state in self.threadStates:
+                self.flushThread(state)
+
+    def getCounts(self):
+        '''
+            Returns the number of records logged by all threads by type.
+        '''
+        counts = dict(self.finishedCounts)
+        with self.threadStatesLock:
+            for state in self.threadStates:
+                for counter in ThreadState.COUNTERS:
+                    counts[counter] += getattr(state, counter)
+        return counts
+
+    def writeRecord(self, record, state=None):
+        '''
+            Assigns a sequence number to the record and writes it to the
+            CDL file. If a summarized loop in the thread is buffering its
+            iteration, the record is added to the iteration instead. If
+            thread buffering is enabled, the record is added to the buffer
+            of the thread and the buffer is written once it is full.
+
+            :param dict record: The record to write.
+            :param ThreadState state: State of the current thread if known.
+        '''
+        if state is None:
+            state = self.getThreadState()
+
+        if self.trackTasks:
+            context = currentTask.get()
+            task = context.id if context is not None else None
+            if task != state.task:
+                self.logTaskSwitch(state, task)
+
+        if "seq" not in record:
+            record["seq"] = state.nextSequence(self.sequences)
+
+        if state.loops:
+            for loop in reversed(state.loops):
+                if loop is not None and loop.current is not None:
+                    loop.current.append(record)
+                    return
+
+        if self.deltaMode is not None and record["type"] == "adli_variable":
+            record = self.encodeDelta(record, state)
+
+        if self.threadBufferSize:
+            state.buffer.append(record)
+            if len(state.buffer) >= self.threadBufferSize:
+                self.flushThread(state)
+            return
+
+        self.writer.write(record)
+
+    def encodeDelta(self, record, state):
+        '''
+            Returns the variable record to write in delta mode. The value
+            is compared with the last value written for the same varid and
+            scope in this thread. If it is unchanged, the value is replaced
+            by an unchanged marker. In diff mode, if only some keys of a
+            dictionary changed, the value is replaced by the changed keys.
+            The base key of a delta is the sequence number of the record it
+            refers to.
+
+            This is called when the record is about to be written, so the
+            records omitted from summarized loops are not cached. Readers
+            resolve the deltas using the same cache, see reader/DeltaResolver.py.
+
+            If the writer dropped records (ADLI_OVERFLOW=drop), the record a
+            cached value was written with may be lost, so the cache of the
+            thread is cleared and the next records are written in full.
+
+            :param dict record: The adli_variable record with the full value.
+            :param ThreadState state: State of the thread writing the record.
+        '''
+        cache = state.deltas
+        dropped = getattr(self.writer, "dropped", 0)
+        if dropped != state.deltaDrops:
+            state.deltaDrops = dropped
+            cache.clear()
+
+        key = (record["varid"], record["scope_uid"])
+        value = record["value"]
+        cached = key in cache
+        (baseSeq, previous) = cache.pop(key, (None, None))
+
+        if self.deltaMode == "unchanged":
+            # Only the hash of the value is cached.
+            current = hashlib.blake2b(json.dumps(value).encode("utf-8"), digest_size=16).digest()
         else:
-            return str(o)
+            current = value
+
+        cache[key] = (record["seq"], current)
+        if len(cache) > self.deltaCacheSize:
+            cache.popitem(last=False)
 
-    def variableToJson(self, obj, max_depth=8):
-        # self.visited = set()
-        return self.processLevel(obj, "", 0, max_depth)
+        if not cached:
+            return record
 
+        delta = None
+        if previous == current if self.deltaMode == "unchanged" else isSameValue(previous, current):
+            delta = {"delta": "unchanged", "base": baseSeq}
+        elif self.deltaMode == "diff" and isinstance(previous, dict) and isinstance(value, dict):
+            changed, removed = [], []
+            diffValues(previous, value, [], changed, removed)
+            if len(changed) + len(removed) <= max(1, len(value) // 2):
+                delta = {"delta": "diff", "base": baseSeq, "set": getOverlay(changed), "remove": removed}
 
-    def getStack(self, fullStack):
+        if delta is None:
+            return record
+
+        deltaRecord = DeltaRecord((name, v) for name, v in record.items() if name != "value")
+        deltaRecord.update(delta)
+        deltaRecord.full = record
+        return deltaRecord
+
+    def enterLoop(self, logTypeId, scope_uid, first, last):
         '''
-            Get the current stack. Only include functions
-            that are in the local directory.
+            Starts summarizing the loop with the given logtype id.
 
-            Remove the last two functions from the stack because
-            they are used to generate the runtime log.        
+            :param int logTypeId: The logtype id of the loop.
+            :param scope_uid: Unique id of the scope the loop is running in.
+            :param int first: Number of iterations to log at the start of the loop.
+            :param int last: Number of iterations to log at the end of the loop.
         '''
-        stack = {}
-        base_path = os.getcwd()
-        stackCount = 0
-        for frame in fullStack:
-            if frame.filename.startswith(base_path):
-                stack[str(stackCount)] = {
-                    "name": frame.name,
-                    "filename": os.path.relpath(frame.filename, base_path),
-                    "lineno": frame.lineno
-                }
-                stackCount += 1
+        loops = self.getThreadState().loops
+
+        if ADLI_LOOP_SUMMARY == "off":
+            loops.append(None)
+            return
+
+        if self.loopSummary is not None:
+            first, last = self.loopSummary
+
+        loops.append(LoopState(logTypeId, scope_uid, first, last))
+
+    def nextIteration(self):
+        '''
+            Marks the start of an iteration of the innermost summarized loop.
+        '''
+        state = self.getThreadState().loops[-1]
+        if state is None:
+            return
+
+        state.iteration += 1
+        if state.iteration <= state.first:
+            return
+
+        if state.current is not None:
+            state.recent.append(state.current)
+            if len(state.recent) > state.last:
+                kept = state.omit(state.recent.pop(0))
+                if kept:
+                    self.writeLoopRecords(state, kept)
+        state.current = []
+
+    def writeLoopRecords(self, state, records):
+        '''
+            Writes records that were buffered by the given loop state,
+            bypassing its buffer. They are added to the iteration of an
+            outer loop if it is buffering.
+        '''
+        current = state.current
+        state.current = None
+        for record in records:
+            self.writeRecord(record)
+        state.current = current
 
+    def endIterations(self):
+        '''
+            Stops summarizing the innermost loop when its else block starts,
+            so the records of the else block aren't added to the last
+            iteration. The loop is removed by exitLoop.
+        '''
+        threadState = self.getThreadState()
+        state = threadState.loops[-1]
+        if state is not None and not state.ended:
+            self.writeLoopSummary(threadState, state)
+
+    def exitLoop(self):
+        '''
+            Stops summarizing the innermost loop unless its iterations were
+            already ended by endIterations.
+        '''
+        threadState = self.getThreadState()
+        state = threadState.loops.pop()
+        if state is not None and not state.ended:
+            self.writeLoopSummary(threadState, state)
+
+    def writeLoopSummary(self, threadState, state):
+        '''
+            Logs the summary of the omitted iterations of the loop followed
+            by its last iterations.
+        '''
+        state.ended = True
+        if state.current is not None:
+            state.recent.append(state.current)
+            state.current = None
+
+        while len(state.recent) > state.last:
+            for record in state.omit(state.recent.pop(0)):
+                self.writeRecord(record)
+
+        if state.omitted:
+            self.writeRecord({
+                "type": "adli_loop_summary",
+                "thread": threadState.ident,
+                "scope_uid": state.scope_uid,
+                "value": state.logTypeId,
+                "iterations": state.iteration,
+                "omittedIterations": state.omitted,
+                "counts": state.counts
+            })
+
+        for records in state.recent:
+            for record in records:
+                self.writeRecord(record)
+
+    def getProjectFile(self, filename):
+        '''
+            Returns the path of the file relative to the base path if it
+            belongs to the project and None if it doesn't. The result is
+            cached so each file is only resolved once.
+
+            :param str filename: The filename of the code object.
+        '''
+        try:
+            return self.projectFiles[filename]
+        except KeyError:
+            pass
+
+        if filename.startswith(ADLI_PROJECT_ROOTS):
+            projectFile = os.path.relpath(filename, ADLI_BASE_PATH)
+        else:
+            projectFile = None
+
+        self.projectFiles[filename] = projectFile
+        return projectFile
+
+    def captureStack(self, frame):
+        '''
+            Walks the frames starting from the given frame and returns the
+            frames that belong to the project as a tuple of (filename, name,
+            lineno) tuples, ordered from the outermost frame.
+
+            Unlike traceback.extract_stack, this doesn't create FrameSummary
+            objects or read the source lines from linecache.
+
+            :param frame: The innermost frame to include in the stack.
+        '''
+        frames = []
+        projectFiles = self.projectFiles
+        while frame is not None:
+            code = frame.f_code
+            filename = projectFiles.get(code.co_filename, False)
+            if filename is False:
+                filename = self.getProjectFile(code.co_filename)
+            if filename is not None:
+                frames.append((filename, code.co_name, frame.f_lineno))
+            frame = frame.f_back
+
+        frames.reverse()
+        return tuple(frames)
+
+    def formatStack(self, frames):
+        '''
+            Converts the captured frames into the stack object that is
+            logged with each execution.
+
+            :param tuple frames: Frames returned by captureStack.
+        '''
+        stack = {}
+        for index, (filename, name, lineno) in enumerate(frames):
+            stack[str(index)] = {
+                "name": name,
+                "filename": filename,
+                "lineno": lineno
+            }
         return stack
 
+    def getStackId(self, frames):
+        '''
+            Returns the id of the given stack. The first time a stack is seen,
+            a definition record is logged for it (and for any frames that were
+            not seen before) so that readers can expand the id.
+
+            Definitions are never buffered or omitted by loop summaries,
+            so they are written directly.
+
+            Definitions are logged before the id is shared so that a record
+            never references a stack that hasn't been defined yet.
+
+            :param tuple frames: Frames returned by captureStack.
+        '''
+        stackId = self.stackIds.get(frames)
+        if stackId is not None:
+            return stackId
+
+        frameIds = []
+        for frame in frames:
+            frameId = self.frameIds.get(frame)
+            if frameId is None:
+                frameId = next(self.frameIdCounter)
+                self.writer.write({
+                    "type": "adli_stack_frame",
+                    "id": frameId,
+                    "filename": frame[0],
+                    "name": frame[1],
+                    "lineno": frame[2]
+                }, required=True)
+                self.frameIds[frame] = frameId
+            frameIds.append(frameId)
+
+        stackId = next(self.stackIdCounter)
+        self.writer.write({
+            "type": "adli_stack",
+            "id": stackId,
+            "frames": frameIds
+        }, required=True)
+        self.stackIds[frames] = stackId
+        return stackId
+
+    def isSampled(self, policy, hits, scopeHits, key, scope_uid):
+        '''
+            Counts the execution and returns True if it should be logged.
+            Executions are only counted if a sampling policy applies to
+            them, otherwise the number of records is the hit count. The
+            counts belong to the current thread, so no lock is needed.
+
+            With a K:N policy, the first K executions in each scope (each
+            call of the function) are logged and then 1 in N executions of
+            the scope. With an N policy, 1 in N executions of the thread
+            are logged.
+
+            :param tuple policy: The (first, every) sampling policy.
+            :param dict hits: Hit counts of the thread keyed by logtype or varid.
+            :param dict scopeHits: Hit counts of the thread keyed by
+            (logtype or varid, scope).
+            :param int key: The logtype or varid being logged.
+            :param scope_uid: Unique id of the scope being logged.
+        '''
+        count = hits.get(key, 0) + 1
+        hits[key] = count
+
+        first, every = policy
+        if first:
+            scopeKey = (key, scope_uid)
+            count = scopeHits.get(scopeKey, 0) + 1
+            if count == 1 and len(scopeHits) >= MAX_SCOPE_HITS:
+                scopeHits.clear()
+            scopeHits[scopeKey] = count
+            if count <= first:
+                return True
+        return every > 0 and (count - first - 1) % every == 0
+
+    def configureSampling(self, header):
+        '''
+            Loads the sampling policy of each logtype from the header. A
+            variable is sampled using the policy of its logtype. The
+            ADLI_SAMPLING environment variable overrides the header.
+
+            :param dict header: Dictionary representing the header of the CDL file.
+        '''
+        self.varLogTypes = {int(varid): var["logType"] for (varid, var) in header["varMap"].items()}
+
+        for (ltId, lt) in header["ltMap"].items():
+            policy = ADLI_SAMPLING if ADLI_SAMPLING is not None else lt.get("sampling")
+            self.setSampling(policy, [int(ltId)])
+
+    def configureSerializer(self, header):
+        '''
+            Loads the serializer limits of the program and of each variable
+            from the header. The ADLI_SERIALIZER_LIMITS environment variable
+            overrides the header, it is ignored if it isn't valid.
+
+            :param dict header: Dictionary representing the header of the CDL file.
+        '''
+        override = self.serializerOverride
+        programLimits = parseSerializerLimits(header.get("adliInfo", {}).get("serializerLimits"))
+        self.serializerLimits = DEFAULT_LIMITS._replace(**{**programLimits, **override})
+
+        self.variableLimits = {}
+        for (varid, var) in header["varMap"].items():
+            limits = parseSerializerLimits(var.get("serializerLimits"))
+            if limits:
+                self.variableLimits[int(varid)] = self.serializerLimits._replace(**{**limits, **override})
+
+    def setSerializerLimits(self, limits, varids=None):
+        '''
+            Sets the serializer limits for the program or for the given
+            variables while the program is running.
+
+            :param limits: "depth=8,elements=100" or {"depth": 8, "elements": 100}.
+            :param list varids: The varids to update, the program limits if None.
+        '''
+        limits = parseSerializerLimits(limits)
+        if varids is None:
+            self.serializerLimits = self.serializerLimits._replace(**limits)
+            return
+        for varid in varids:
+            self.variableLimits[varid] = self.variableLimits.get(varid, self.serializerLimits)._replace(**limits)
+
+    def registerSummarizer(self, cls, summarizer):
+        '''
+            Registers a function which summarizes values of the given type
+            instead of serializing them, see AdliSerializer.registerSummarizer.
+
+            :param cls: The type or its "module.QualifiedName".
+            :param summarizer: Function accepting the value and the Serializer.
+        '''
+        registerSummarizer(cls, summarizer)
+
+    def loadSummarizers(self):
+        '''
+            Imports the modules listed in ADLI_SUMMARIZERS. A module that
+            can't be imported is reported and skipped so the program runs.
+        '''
+        if not ADLI_SUMMARIZERS:
+            return
+        for name in ADLI_SUMMARIZERS.split(","):
+            try:
+                importlib.import_module(name.strip())
+            except Exception as e:
+                print(f"ADLI: Unable to import summarizers from {name}: {e}", file=sys.stderr)
+
+    def setSampling(self, policy, logtypes=None):
+        '''
+            Sets the sampling policy for the given logtypes and their
+            variables while the program is running.
+
+            :param policy: "N", "K:N", {"first": K, "every": N} or None to log every execution.
+            :param list logtypes: The logtype ids to update, all logtypes if None.
+        '''
+        policy = parseSamplingPolicy(policy)
+        if logtypes is None:
+            logtypes = set(self.stmtSampling) | set(self.varLogTypes.values())
+        logtypes = set(logtypes)
+
+        for ltId in logtypes:
+            if policy is None:
+                self.stmtSampling.pop(ltId, None)
+            else:
+                self.stmtSampling[ltId] = policy
+
+        for (varid, ltId) in self.varLogTypes.items():
+            if ltId not in logtypes:
+                continue
+            if policy is None:
+                self.variableSampling.pop(varid, None)
+            else:
+                self.variableSampling[varid] = policy
+
+    def configureControl(self, header):
+        '''
+            Sizes the enable table for the logtypes in the header and indexes
+            the logtypes by file and function. Nothing is written, the
+            control file is applied by startControl once the header has
+            been written.
+
+            :param dict header: Dictionary representing the header of the CDL file.
+        '''
+        ltMap = header["ltMap"]
+        size = max((int(ltId) for ltId in ltMap), default=0) + 1
+        self.enabled[:] = [True] * size
+
+        self.fileLogTypes = {}
+        self.functionLogTypes = {}
+        functionNames = {}
+        for (ltId, lt) in ltMap.items():
+            self.fileLogTypes.setdefault(lt["file"], []).append(int(ltId))
+            if lt["type"] == "function":
+                functionNames[int(ltId)] = lt["name"]
+        for (ltId, lt) in ltMap.items():
+            name = functionNames.get(lt["funcid"])
+            if name is not None:
+                self.functionLogTypes.setdefault(name, []).append(int(ltId))
+
+    def startControl(self):
+        '''
+            If a control file is set, it is applied and watched for changes.
+            If a control signal is set, its handler is installed. This is
+            called after the header is written since applying the control
+            file logs an adli_control record.
+        '''
+        if ADLI_CONTROL_FILE:
+            self.loadControlFile("file")
+
+        if ADLI_CONTROL_SIGNAL:
+            try:
+                signal.signal(getattr(signal, ADLI_CONTROL_SIGNAL), self.handleControlSignal)
+            except (AttributeError, ValueError, OSError) as e:
+                print(f"ADLI: Unable to handle {ADLI_CONTROL_SIGNAL}: {e}", file=sys.stderr)
+
+        if (ADLI_CONTROL_FILE or ADLI_CONTROL_SIGNAL) and self.controlThread is None:
+            self.startControlThread()
+
+    def configureTasks(self, header):
+        '''
+            Loads the async functions from the header. Tasks are only looked
+            up when one of them is called.
+
+            :param dict header: Dictionary representing the header of the CDL file.
+        '''
+        self.asyncFunctions = frozenset(int(ltId) for (ltId, lt) in header["ltMap"].items() if lt.get("isAsync"))
+
+    def startControlThread(self):
+        self.controlThread = threading.Thread(target=self.watchControl, name="adli-control", daemon=True)
+        self.controlThread.start()
+
+    def watchControl(self):
+        '''
+            Applies the control file when it changes or when the control
+            signal is received.
+        '''
+        lastModified = self.getControlFileModified()
+        while True:
+            signaled = self.controlEvent.wait(ADLI_CONTROL_INTERVAL)
+            if signaled:
+                self.controlEvent.clear()
+                if not ADLI_CONTROL_FILE:
+                    self.setEnabled(not any(self.enabled), source="signal")
+                    continue
+
+            modified = self.getControlFileModified()
+            if signaled or modified != lastModified:
+                lastModified = modified
+                if modified is not None:
+                    self.loadControlFile("signal" if signaled else "file")
+
+    def getControlFileModified(self):
+        if not ADLI_CONTROL_FILE:
+            return None
+        try:
+            return os.stat(ADLI_CONTROL_FILE).st_mtime_ns
+        except OSError:
+            return None
+
+    def handleControlSignal(self, signum, frame):
+        '''
+            Wakes the control thread. The table isn't updated in the signal
+            handler since the interrupted code can hold the writer's lock.
+        '''
+        self.controlEvent.set()
+
+    def loadControlFile(self, source):
+        '''
+            Applies the control file. A file that can't be read or parsed
+            is reported and the enable table isn't changed.
+        '''
+        try:
+            with open(ADLI_CONTROL_FILE, "r") as f:
+                control = json.load(f)
+            self.applyControl(control, source)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"ADLI: Unable to apply the control file {ADLI_CONTROL_FILE}: {e}", file=sys.stderr)
+
+    def applyControl(self, control, source="api"):
+        '''
+            Replaces the enable table. Every logtype is set to the default
+            and the rules are then applied in order, for example:
+
+            {
+                "enabled": false,
+                "rules": [
+                    {"enabled": true, "files": ["app/db.py"]},
+                    {"enabled": true, "functions": ["handleRequest"]},
+                    {"enabled": false, "logtypes": [12, 13]}
+                ]
+            }
+
+            :param dict control: The default and the rules.
+            :param str source: What changed the table, logged in the adli_control record.
+        '''
+        table = [bool(control.get("enabled", True))] * len(self.enabled)
+        for rule in control.get("rules", []):
+            enabled = bool(rule.get("enabled", True))
+            for ltId in self.selectLogTypes(rule.get("logtypes"), rule.get("files"), rule.get("functions")):
+                table[ltId] = enabled
+        self.updateEnabled(table, source)
+
+    def setEnabled(self, enabled, logtypes=None, files=None, functions=None, source="api"):
+        '''
+            Enables or disables logtypes while the program is running. The
+            logtypes of a function include its statements and variables.
+
+            :param bool enabled: True to log the logtypes.
+            :param list logtypes: The logtype ids to update.
+            :param list files: Files (relative to the program root) whose logtypes are updated.
+            :param list functions: Names of the functions whose logtypes are updated.
+            If logtypes, files and functions are None, every logtype is updated.
+        '''
+        table = list(self.enabled)
+        for ltId in self.selectLogTypes(logtypes, files, functions):
+            table[ltId] = bool(enabled)
+        self.updateEnabled(table, source)
+
+    def selectLogTypes(self, logtypes, files, functions):
+        '''
+            Returns the logtype ids given directly or through their file or
+            function. Every logtype is returned if none are given.
+        '''
+        if logtypes is None and files is None and functions is None:
+            return range(1, len(self.enabled))
+
+        selected = set()
+        for ltId in logtypes or []:
+            if 0 < int(ltId) < len(self.enabled):
+                selected.add(int(ltId))
+        for file in files or []:
+            selected.update(self.fileLogTypes.get(file, []))
+        for name in functions or []:
+            selected.update(self.functionLogTypes.get(name, []))
+        return selected
+
+    def updateEnabled(self, table, source):
+        '''
+            Replaces the enable table in place and logs the logtypes that
+            were enabled or disabled in an adli_control record.
+        '''
+        enabled = [ltId for ltId in range(1, len(table)) if table[ltId] and not self.enabled[ltId]]
+        disabled = [ltId for ltId in range(1, len(table)) if not table[ltId] and self.enabled[ltId]]
+        if not enabled and not disabled:
+            return
+
+        self.enabled[:] = table
+
+        state = self.getThreadState()
+        self.writeRecord({
+            "type": "adli_control",
+            "thread": state.ident,
+            "source": source,
+            "enabled": enabled,
+            "disabled": disabled
+        }, state)
+
+    def recordFlight(self, state, event):
+        '''
+            Adds the event to the flight ring of the thread, replacing its
+            oldest event once the ring is full.
+
+            :param ThreadState state: State of the current thread.
+            :param tuple event: The event, see getFlightRecord.
+        '''
+        index = state.flightIndex
+        state.flight[index] = event
+        index += 1
+        state.flightIndex = 0 if index == self.flightSize else index
+
+    def getFlightRecord(self, thread, event):
+        '''
+            Returns the record of an event of the flight recorder. Events are
+            tuples starting with their kind and sequence number and ending
+            with the TaskContext they were logged in:
+            - FLIGHT_STMT: (kind, seq, stmtId, scope_uid, task)
+            - FLIGHT_VARIABLE: (kind, seq, varid, scope_uid, value, task)
+            - FLIGHT_SCOPE: (kind, seq, scopeId, parent, funcId, task)
+
+            Variables are serialized here, so a mutable value is logged as
+            it is when the recorder is dumped. Since the events are written
+            without task switches, their records have a task key instead.
+        '''
+        kind = event[0]
+        if kind == FLIGHT_STMT:
+            record = {"type": "adli_execution", "thread": thread, "scope_uid": event[3], "value": event[2],
+                      "seq": event[1]}
+        elif kind == FLIGHT_SCOPE:
+            record = {"type": "adli_scope", "thread": thread, "id": event[2], "parent": event[3], "funcid": event[4],
+                      "seq": event[1]}
+        else:
+            (_, seq, varid, scope_uid, value, _) = event
+            record = {"type": "adli_variable", "varid": varid, "thread": thread, "scope_uid": scope_uid, "seq": seq}
+            try:
+                record["value"] = self.variableToJson(value, self.variableLimits.get(varid))
+            except Exception as e:
+                record["value"] = str(value)
+                record["serialization_error"] = str(e)
+
+        if event[-1] is not None:
+            record["task"] = event[-1].id
+        return record
+
+    def dumpFlightRecorder(self, reason="api"):
+        '''
+            Writes the events kept by the flight recorder of every thread
+            that weren't written by a previous dump. An adli_flight_dump
+            record with the reason and the number of events is written
+            before the events of the threads. Returns the number of events
+            that were written.
+
+            :param str reason: Why the recorder was dumped (exception,
+            signal or api).
+        '''
+        if not self.flightSize or self.closed:
+            return 0
+
+        # The records buffered by the threads are written first.
+        self.flushThreads()
+
+        with self.threadStatesLock:
+            states = list(self.finishedFlights) + self.threadStates
+            self.finishedFlights.clear()
+
+        records = []
+        for state in states:
+            # The ring is copied at once, the owner may be adding events.
+            events = [event for event in list(state.flight) if event is not None and event[1] > state.flightDumped]
+            if not events:
+                continue
+            events.sort(key=lambda event: event[1])
+            state.flightDumped = events[-1][1]
+            records.extend(self.getFlightRecord(state.ident, event) for event in events)
+
+        state = self.getThreadState()
+        self.writer.write({
+            "type": "adli_flight_dump",
+            "thread": state.ident,
+            "reason": reason,
+            "events": len(records),
+            "seq": state.nextSequence(self.sequences)
+        }, required=True)
+        if records:
+            self.writer.writeBatch(records)
+        self.writer.flush()
+
+        return len(records)
+
+    def startFlightThread(self):
+        self.flightThread = threading.Thread(target=self.watchFlightSignal, name="adli-flight", daemon=True)
+        self.flightThread.start()
+
+    def watchFlightSignal(self):
+        '''
+            Dumps the flight recorder each time ADLI_FLIGHT_SIGNAL is received.
+        '''
+        event = self.flightEvent
+        while True:
+            event.wait()
+            event.clear()
+            try:
+                self.dumpFlightRecorder("signal")
+            except Exception as e:
+                print(f"ADLI: Unable to dump the flight recorder: {e}", file=sys.stderr)
+
+    def handleFlightSignal(self, signum, frame):
+        '''
+            Wakes the flight recorder thread. The recorder isn't dumped in
+            the signal handler since the interrupted code can hold the
+            writer's lock.
+        '''
+        self.flightEvent.set()
+
+    def logOverhead(self):
+        '''
+            Logs the estimated time spent in the logger in an adli_overhead
+            record and prints a report to stderr. This is called when the
+            interpreter exits.
+        '''
+        if self.overhead is None:
+            return
+
+        record = {
+            "type": "adli_overhead",
+            "thread": threading.get_ident(),
+            "every": self.overhead.every,
+            "counts": self.getCounts(),
+            "recordTypes": self.overhead.getTotals(self.overhead.recordTypes),
+            "logtypes": self.overhead.getTotals(self.overhead.logtypes)
+        }
+        self.writeRecord(record)
+
+        try:
+            print(self.formatOverheadReport(record), file=sys.stderr)
+        except Exception:
+            pass
+
+    def formatOverheadReport(self, record, limit=10):
+        '''
+            Returns the overhead record as a human readable report listing
+            the time spent per record type and the most expensive logtypes.
+
+            :param dict record: The adli_overhead record.
+            :param int limit: Number of logtypes to list.
+        '''
+        def ms(ns):
+            return f"{ns / 1e6:10.2f}ms"
+
+        lines = [f"ADLI overhead (estimated from 1 in {record['every']} calls):"]
+        lines.append(f"  {'record type':<16}{'timed':>8}{'stack':>12}{'serialize':>12}{'write':>12}{'total':>12}")
+        for (recordType, totals) in sorted(record["recordTypes"].items(), key=lambda item: -item[1]["totalNs"]):
+            lines.append(f"  {recordType:<16}{totals['timed']:>8}{ms(totals['stackNs'])}{ms(totals['serializeNs'])}"
+                         f"{ms(totals['writeNs'])}{ms(totals['totalNs'])}")
+
+        ltMap = self.header["ltMap"] if self.header is not None else {}
+        logtypes = sorted(record["logtypes"].items(), key=lambda item: -item[1]["totalNs"])[:limit]
+        if logtypes:
+            lines.append("  Most expensive logtypes:")
+        for (ltId, totals) in logtypes:
+            lt = ltMap.get(ltId, {})
+            location = f"{lt.get('file', '?')}:{lt.get('lineno', '?')}"
+            statement = str(lt.get("statement", "")).split("\n")[0][:40]
+            lines.append(f"  {ltId:>6} {location:<30}{ms(totals['totalNs'])}  {statement}")
+        return "\n".join(lines)
+
+    def logSampleCounts(self):
+        '''
+            Logs the number of times each sampled logtype and variable was
+            executed, including the executions that were not logged. This
+            is called when the interpreter exits.
+        '''
+        stmtHits = dict(self.stmtHits)
+        variableHits = dict(self.variableHits)
+        with self.threadStatesLock:
+            for state in self.threadStates:
+                # Copying the dictionary doesn't release the GIL, so it is
+                # safe while the thread is still counting.
+                addHits(stmtHits, dict(state.stmtHits))
+                addHits(variableHits, dict(state.variableHits))
+
+        if not stmtHits and not variableHits:
+            return
+
+        self.writeRecord({
+            "type": "adli_sample_counts",
+            "thread": threading.get_ident(),
+            "stmt": {str(k): v for (k, v) in stmtHits.items()},
+            "variable": {str(k): v for (k, v) in variableHits.items()}
+        })
+
     def logVariable(self, varid, value, scope_uid):
         '''
             Logs the given varid and value. It also checks to see if the variable
@@ -92,65 +1738,138 @@ class AdliLogger:
             :param int varid: A number representing the mapped variable index in varMap.   
             :param value: Value of the variable being encoded.
         '''
-        self.count += 1
-        self.variableLogCount += 1
+        policy = self.variableSampling.get(varid)
+        if policy is not None:
+            state = self.getThreadState()
+            if not self.isSampled(policy, state.variableHits, state.variableScopeHits, varid, scope_uid):
+                return self.decodeInput(value)
+
+        if self.flightSize:
+            state = self.getThreadState()
+            state.count += 1
+            state.variableLogCount += 1
+            self.recordFlight(state, (FLIGHT_VARIABLE, state.nextSequence(self.sequences), varid, scope_uid, value,
+                                      currentTask.get()))
+            return self.decodeInput(value)
+
+        timed = self.overhead is not None and self.overhead.sample("adli_variable")
+        if timed:
+            start = time.perf_counter_ns()
+
+        state = self.getThreadState()
+        state.count += 1
+        state.variableLogCount += 1
 
         try:
             # Try to serialize the variable
-            adliValue = self.variableToJson(value)
+            adliValue = self.variableToJson(value, self.variableLimits.get(varid))
+            if timed:
+                serialized = time.perf_counter_ns()
             varObj = {
                 "type": "adli_variable",
                 "varid": varid,
-                "thread": threading.get_ident(),
+                "thread": state.ident,
                 "value": adliValue,
-                "scope_uid": str(scope_uid),
+                "scope_uid": scope_uid,
             }
-            logger.info(varObj)
+            self.writeRecord(varObj, state)
         except Exception as e:
+            if timed:
+                serialized = time.perf_counter_ns()
             # Fallback to string if serialization fails.
             varObj = {
                 "type": "adli_variable",
                 "varid": varid,
-                "thread": threading.get_ident(),
+                "thread": state.ident,
                 "value": str(value),
-                "scope_uid": str(scope_uid),
+                "scope_uid": scope_uid,
                 "serialization_error": str(e)
             }
-            logger.info(varObj)
+            self.writeRecord(varObj, state)
+
+        if timed:
+            end = time.perf_counter_ns()
+            self.overhead.add("adli_variable", self.varLogTypes.get(varid, varid),
+                              0, serialized - start, end - serialized, end - start)
 
         return self.decodeInput(value)
 
-    def logStmt(self, stmtId, scope_uid, fullStack):
+    def logStmt(self, stmtId, scope_uid):
         '''
             Logs the statement id. This corresponds to a statement in the source
             code. For example: a = 1 can be mapped to stmtId 4.
 
+            The stack is captured starting from the frame of the caller.
+
             :param int stmtId: A number representing the mapped statement index in ltMap.
+            :param scope_uid: Unique id of the scope the statement was executed in.
         '''
-        self.count += 1
-        self.stmtLogCount += 1
+        policy = self.stmtSampling.get(stmtId)
+        if policy is not None:
+            state = self.getThreadState()
+            if not self.isSampled(policy, state.stmtHits, state.stmtScopeHits, stmtId, scope_uid):
+                return
+
+        if self.flightSize:
+            state = self.getThreadState()
+            state.count += 1
+            state.stmtLogCount += 1
+            self.recordFlight(state, (FLIGHT_STMT, state.nextSequence(self.sequences), stmtId, scope_uid,
+                                      currentTask.get()))
+            return
+
+        timed = self.overhead is not None and self.overhead.sample("adli_execution")
+        if timed:
+            start = time.perf_counter_ns()
+
+        state = self.getThreadState()
+        state.count += 1
+        state.stmtLogCount += 1
+
         stmtObj = {
             "type": "adli_execution",
-            "thread": threading.get_ident(),
-            "scope_uid": str(scope_uid),
-            "stack": self.getStack(fullStack),
+            "thread": state.ident,
+            "scope_uid": scope_uid,
             "value": stmtId
         }
-        logger.info(stmtObj)
+
+        if ADLI_STACK_MODE == "full":
+            stmtObj["stack"] = self.formatStack(self.captureStack(sys._getframe(1)))
+        elif ADLI_STACK_MODE != "none":
+            stmtObj["stack"] = self.getStackId(self.captureStack(sys._getframe(1)))
+
+        if timed:
+            captured = time.perf_counter_ns()
+            self.writeRecord(stmtObj, state)
+            end = time.perf_counter_ns()
+            self.overhead.add("adli_execution", stmtId, captured - start, 0, end - captured, end - start)
+            return
+
+        self.writeRecord(stmtObj, state)
 
     def logException(self):
         '''
             Logs the exception using the traceback.
         '''
-        self.count += 1
-        self.exceptionLogCount += 1
+        # The events leading up to the exception are written before it.
+        if self.flightSize:
+            self.dumpFlightRecorder("exception")
+
+        state = self.getThreadState()
+        state.count += 1
+        state.exceptionLogCount += 1
 
         exceptionObj = {
             "type": "adli_exception",
-            "thread": threading.get_ident(),
+            "thread": state.ident,
             "value": traceback.format_exc()
         }
-        logger.info(exceptionObj)
+        self.writeRecord(exceptionObj, state)
+
+        # Make sure the records leading up to the exception are written
+        # even if the process doesn't exit cleanly.
+        self.flushThreads()
+        self.writer.flush()
 
     def logHeader(self):
         '''
@@ -158,15 +1877,68 @@ class AdliLogger:
 
             :param dict header: Dictionary representing the header of the CDL file.
         '''
-        self.count += 1
+        state = self.getThreadState()
+        state.count += 1
 
         with open("header.json", "r") as f:
             header = json.loads(f.read())
 
+        self.configureSampling(header)
+        self.configureSerializer(header)
+        self.configureControl(header)
+        self.configureTasks(header)
+
+        self.header = header
+        self.writeHeader()
+        self.startControl()
+
+    def getSegmentInfo(self):
+        '''
+            Returns the limits of the segments (or chunks) of the output or
+            None if it isn't segmented.
+        '''
+        target = getattr(self.writer, "target", self.writer)
+        if not isinstance(target, SegmentedWriter):
+            return None
+        return {
+            "maxBytes": target.maxBytes,
+            "maxSeconds": target.maxSeconds,
+            "maxRecords": target.maxRecords,
+            "retain": target.retain,
+            "chunked": target.chunked
+        }
+
+    def writeHeader(self):
+        '''
+            Writes the header with the information of the current execution.
+        '''
+        state = self.getThreadState()
+        header = dict(self.header)
+
         # Add execution information to header
         header["execInfo"] = {
             "programExecutionId": ADLI_EXECUTION_ID,
+            "parentExecution": self.parentExecution,
+            "pid": os.getpid(),
             "timestamp": str(time.time()),
+            "stackMode": ADLI_STACK_MODE,
+            "sink": ADLI_SINK,
+            "format": ADLI_FORMAT,
+            "clpEncoder": ADLI_CLP_ENCODER if ADLI_SINK == "file" and ADLI_FORMAT != "binary" else None,
+            "delta": ADLI_DELTA,
+            "deltaCacheSize": ADLI_DELTA_CACHE,
+            "samplingOverride": ADLI_SAMPLING,
+            "overhead": self.overhead.every if self.overhead is not None else None,
+            "tasks": ADLI_TASKS,
+            "flightRecorder": {
+                "size": self.flightSize,
+                "signal": ADLI_FLIGHT_SIGNAL
+            } if self.flightSize else None,
+            "control": {
+                "file": ADLI_CONTROL_FILE,
+                "signal": ADLI_CONTROL_SIGNAL
+            },
+            "segments": self.getSegmentInfo(),
         }
 
         header["basePath"] = os.getcwd()
@@ -175,10 +1947,10 @@ class AdliLogger:
         # an error.
         logInfo = {
             "type": "adli_header",
-            "thread": threading.get_ident(),
+            "thread": state.ident,
             "header": header
         }
-        logger.info(logInfo)
+        self.writer.write(logInfo, required=True)
 
     def encodeOutput(self, variableName, value):
         '''
@@ -187,23 +1959,30 @@ class AdliLogger:
             :param str variableName: Name of the variable being encoded.
             :param value: Value of the variable being encoded.
         '''
-        self.count += 1
-        self.outputCount += 1
+        state = self.getThreadState()
+        state.count += 1
+        state.outputCount += 1
+
+        # The sequence number of the output record identifies the output.
+        seq = state.nextSequence(self.sequences)
 
         logInfo = {
             "type": "adli_output",
             "outputName": variableName,
-            "thread": threading.get_ident(),
+            "thread": state.ident,
             "adliExecutionId": ADLI_EXECUTION_ID,
-            "adliExecutionIndex": self.count + 1,
-            "adliValue": value
+            "adliExecutionIndex": seq,
+            "adliValue": self.variableToJson(value),
+            "seq": seq
         }
         
-        logger.info(logInfo)
+        # The value is serialized before it is written because the
+        # writer can encode the record after the program modified it.
+        self.writeRecord(logInfo, state)
 
         return {
             "adliExecutionId": ADLI_EXECUTION_ID,
-            "adliExecutionIndex": self.count + 1,
+            "adliExecutionIndex": seq,
             "adliValue": value
         }
     
@@ -216,28 +1995,178 @@ class AdliLogger:
             :param value: Value of the variable being inspected. 
         '''
         if isinstance(value, dict) and "adliExecutionId" in value and "adliExecutionIndex" in value:
-            self.count += 1
-            self.inputCount += 1
+            state = self.getThreadState()
+            state.count += 1
+            state.inputCount += 1
 
             logInfo = {
                 "type": "adli_input",
-                "thread": threading.get_ident(),
+                "thread": state.ident,
                 "adliExecutionId": value["adliExecutionId"],
                 "adliExecutionIndex": value["adliExecutionIndex"],
-                "adliValue": value["adliValue"]
+                "adliValue": self.variableToJson(value["adliValue"])
             }
 
-            logger.info(logInfo)
+            self.writeRecord(logInfo, state)
 
             return value["adliValue"]
         
         return value
     
-    def getUniqueId(self):
+    def getUniqueId(self, funcId=None):
+        '''
+            Returns a new scope id for a call to an instrumented function and
+            logs an adli_scope record with the scope id of its caller, so the
+            call tree can be rebuilt from the scope ids. Scope ids are unique
+            in the execution and increase with each call.
+
+            :param int funcId: The logtype id of the function.
+        '''
+        scopeId = next(self.scopeIds)
+        frame = sys._getframe(1)
+        state = self.getThreadState()
+        frameScopes = state.frameScopes
+        if len(frameScopes) >= MAX_FRAME_SCOPES:
+            frameScopes.clear()
+        frameScopes[id(frame)] = scopeId
+
+        if funcId is not None and funcId < len(self.enabled) and not self.enabled[funcId]:
+            return scopeId
+
+        if funcId in self.asyncFunctions and self.trackTasks:
+            self.enterTask(scopeId)
+
+        if self.flightSize:
+            parent = self.getCallerScope(frame.f_back, frameScopes)
+            self.recordFlight(state, (FLIGHT_SCOPE, state.nextSequence(self.sequences), scopeId, parent, funcId,
+                                      currentTask.get()))
+            return scopeId
+
+        timed = self.overhead is not None and self.overhead.sample("adli_scope")
+        if timed:
+            start = time.perf_counter_ns()
+
+        parent = self.getCallerScope(frame.f_back, frameScopes)
+
+        if timed:
+            found = time.perf_counter_ns()
+
+        self.writeRecord({
+            "type": "adli_scope",
+            "thread": state.ident,
+            "id": scopeId,
+            "parent": parent,
+            "funcid": funcId
+        }, state)
+
+        if timed:
+            end = time.perf_counter_ns()
+            self.overhead.add("adli_scope", funcId, found - start, 0, end - found, end - start)
+
+        return scopeId
+
+    def enterTask(self, scopeId):
         '''
-            Returns a unique id during runtime.
+            Called when an async function is entered. If it runs in an
+            asyncio task that wasn't seen before, the task is assigned an id
+            and an adli_task record is logged with its parent task (the task
+            that created it, None if it was created outside of a task), its
+            name and the scope of the function, which is the root scope of
+            the task. The thread then logs for the new task.
+
+            :param int scopeId: The scope id of the call.
         '''
-        return uuid.uuid4()
+        # There can't be a running task if asyncio wasn't imported.
+        asyncio = sys.modules.get("asyncio")
+        if asyncio is None:
+            return
+
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            return
+        if task is None:
+            return
+
+        context = currentTask.get()
+        if context is not None and context.key == id(task):
+            return
+
+        parent = context.id if context is not None else None
+        context = TaskContext(next(self.taskIds), parent, id(task), scopeId)
+        currentTask.set(context)
+
+        state = self.getThreadState()
+        state.task = context.id
+        self.writeRecord({
+            "type": "adli_task",
+            "thread": state.ident,
+            "id": context.id,
+            "parent": parent,
+            "name": task.get_name(),
+            "scope_uid": scopeId
+        }, state)
+
+    def logTaskSwitch(self, state, task):
+        '''
+            Logs an adli_task_switch record when the thread starts logging
+            for a different task. The records that follow it in the thread,
+            up to the next switch, are logged by that task (None outside of
+            tasks).
+
+            :param ThreadState state: State of the current thread.
+            :param int task: The id of the task, None outside of tasks.
+        '''
+        state.task = task
+        self.writeRecord({
+            "type": "adli_task_switch",
+            "thread": state.ident,
+            "task": task
+        }, state)
+
+    def getCallerScope(self, frame, frameScopes):
+        '''
+            Returns the scope id of the closest instrumented frame starting
+            from the given frame or None if there is none (for example, the
+            first call in a thread).
+
+            getUniqueId maps the frame of each instrumented call to its scope
+            id, so the caller's locals aren't read (reading f_locals copies
+            every local of the frame into a dictionary). A frame running in
+            the thread was mapped when it started and no other frame can
+            have its id while it runs. Frames which aren't mapped (the map
+            was cleared or a generator was resumed in another thread) are
+            read from their locals.
+
+            :param frame: The frame of the caller of the instrumented function.
+            :param dict frameScopes: The frame map of the current thread.
+        '''
+        while frame is not None:
+            code = frame.f_code
+            if "adli_uid" in code.co_varnames:
+                scopeId = frameScopes.get(id(frame))
+                if scopeId is None:
+                    scopeId = frame.f_locals.get("adli_uid")
+                return scopeId
+            if code.co_name == "<module>" and "adli_uid" in frame.f_globals:
+                return frame.f_globals["adli_uid"]
+            frame = frame.f_back
+        return None
+
+realExit = os._exit
+
+def exitAfterClose(status):
+    '''
+        Replaces os._exit in forked children so that the output is closed
+        before the process exits without running the exit handlers.
+    '''
+    try:
+        adli.close()
+    finally:
+        realExit(status)
 
+adli = AdliLogger()
 
-adli = AdliLogger()
\ No newline at end of file
+# The enable table is imported by injected modules so checking it doesn't
+# require an attribute lookup.
+adli_enabled = adli.enabled
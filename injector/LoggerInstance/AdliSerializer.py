@@ -0,0 +1,331 @@
+import array
+import collections
+import itertools
+import sys
+import zlib
+
+# Limits applied when serializing a variable value:
+# - depth: Maximum depth of nested containers and objects.
+# - elements: Maximum number of items serialized per container.
+# - string: Maximum length of strings and bytes.
+# - nodes: Maximum number of values serialized per variable value.
+SerializerLimits = collections.namedtuple("SerializerLimits", ["depth", "elements", "string", "nodes"])
+
+DEFAULT_LIMITS = SerializerLimits(depth=8, elements=1000, string=10000, nodes=10000)
+
+MAX_DEPTH = "<Max Depth Reached>"
+MAX_NODES = "<Max Nodes Reached>"
+CIRCULAR_REFERENCE = "<Circular Reference>"
+
+# Items of these exact types are added to containers without a call to
+# Serializer.process since they are returned unchanged.
+SCALAR_TYPES = frozenset((int, float, bool, type(None)))
+
+# Number of items included in the head and the tail of a summary.
+SUMMARY_SAMPLE = 8
+
+# Bytes and bytearrays up to this length are logged as strings, longer
+# ones are summarized.
+SUMMARY_MIN_BYTES = 64
+
+def parseSerializerLimits(limits):
+    '''
+        Converts serializer limits from the header ({"depth": 8, ...}) or
+        from the environment ("depth=8,elements=100") to a dictionary.
+        Only the limits that were given are included. Raises ValueError if
+        a limit is unknown, isn't an integer or is negative. The injector
+        validates the limits of comments and arguments with this function.
+    '''
+    if limits is None:
+        return {}
+
+    if not isinstance(limits, dict):
+        pairs = {}
+        for pair in str(limits).split(","):
+            if not pair.strip():
+                continue
+            parts = pair.split("=")
+            if len(parts) != 2:
+                raise ValueError(f"Invalid serializer limits: {limits}")
+            pairs[parts[0].strip()] = parts[1].strip()
+    else:
+        pairs = limits
+
+    parsed = {}
+    for (name, value) in pairs.items():
+        if name not in SerializerLimits._fields:
+            raise ValueError(f"Unknown serializer limit: {name}")
+        try:
+            parsed[name] = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid serializer limits: {limits}")
+        if parsed[name] < 0:
+            raise ValueError(f"Serializer limits must not be negative: {limits}")
+    return parsed
+
+def getContentHash(buffer):
+    '''
+        Returns the CRC32 of the memory of the buffer without copying it,
+        or None if the memory is not contiguous.
+    '''
+    try:
+        return zlib.crc32(buffer)
+    except (BufferError, TypeError, ValueError):
+        return None
+
+def getSample(sequence, length):
+    '''
+        Returns slices with the first and last SUMMARY_SAMPLE items of the
+        sequence. If the sequence is short, the head contains every item.
+    '''
+    if length <= 2 * SUMMARY_SAMPLE:
+        return sequence[:length], sequence[:0]
+    return sequence[:SUMMARY_SAMPLE], sequence[length - SUMMARY_SAMPLE:]
+
+def summarizeNumpyArray(value, serializer):
+    '''
+        Summarizes a numpy array. The statistics are computed by numpy
+        and only the sampled items are copied.
+    '''
+    summary = {
+        "adli_summary": "numpy.ndarray",
+        "shape": list(value.shape),
+        "dtype": str(value.dtype),
+        "size": int(value.size),
+        "crc32": getContentHash(value) if value.dtype.kind != "O" else None
+    }
+
+    # Statistics of numbers and booleans, other dtypes are only sampled.
+    if value.size and value.dtype.kind in "biuf":
+        summary["min"] = value.min().item()
+        summary["max"] = value.max().item()
+        summary["mean"] = float(value.mean())
+
+    head, tail = getSample(value.flat, int(value.size))
+    summary["head"] = [serializer.process(item, 0) for item in head.tolist()]
+    summary["tail"] = [serializer.process(item, 0) for item in tail.tolist()]
+    return summary
+
+def summarizeNumpyScalar(value, serializer):
+    '''
+        Logs a numpy scalar as the equivalent Python value.
+    '''
+    return serializer.process(value.item(), 0)
+
+def summarizeArray(value, serializer):
+    '''
+        Summarizes an array.array. If numpy was imported by the program,
+        the statistics are computed on a view of the array.
+    '''
+    summary = {
+        "adli_summary": "array.array",
+        "typecode": value.typecode,
+        "itemsize": value.itemsize,
+        "length": len(value),
+        "crc32": getContentHash(value)
+    }
+
+    if len(value) and value.typecode not in ("u", "w"):
+        numpy = sys.modules.get("numpy")
+        if numpy is not None:
+            view = numpy.frombuffer(value, dtype=value.typecode)
+            summary["min"] = view.min().item()
+            summary["max"] = view.max().item()
+            summary["mean"] = float(view.mean())
+        else:
+            summary["min"] = min(value)
+            summary["max"] = max(value)
+            summary["mean"] = sum(value) / len(value)
+
+    head, tail = getSample(value, len(value))
+    summary["head"] = head.tolist()
+    summary["tail"] = tail.tolist()
+    return summary
+
+def summarizeBytes(value, serializer):
+    '''
+        Logs short bytes as strings and summarizes long bytes.
+    '''
+    if len(value) <= SUMMARY_MIN_BYTES:
+        return serializer.truncateString(str(value))
+
+    return {
+        "adli_summary": type(value).__name__,
+        "length": len(value),
+        "crc32": getContentHash(value),
+        "head": value[:SUMMARY_SAMPLE].hex(),
+        "tail": value[-SUMMARY_SAMPLE:].hex()
+    }
+
+def summarizeMemoryview(value, serializer):
+    '''
+        Summarizes a memoryview without copying the memory it refers to.
+    '''
+    summary = {
+        "adli_summary": "memoryview",
+        "format": value.format,
+        "itemsize": value.itemsize,
+        "shape": list(value.shape or []),
+        "nbytes": value.nbytes,
+        "readonly": value.readonly,
+        "crc32": None
+    }
+
+    if value.c_contiguous:
+        summary["crc32"] = getContentHash(value)
+        raw = value.cast("B")
+        summary["head"] = raw[:SUMMARY_SAMPLE].hex()
+        summary["tail"] = raw[-SUMMARY_SAMPLE:].hex() if value.nbytes > SUMMARY_SAMPLE else ""
+    return summary
+
+# Summarizers keyed by type or by "module.QualifiedName" so that types of
+# libraries that weren't imported can be registered. A summarizer accepts
+# the value and the Serializer and returns a JSON compatible value.
+SUMMARIZERS = {
+    "numpy.ndarray": summarizeNumpyArray,
+    "numpy.generic": summarizeNumpyScalar,
+    array.array: summarizeArray,
+    bytes: summarizeBytes,
+    bytearray: summarizeBytes,
+    memoryview: summarizeMemoryview,
+}
+
+# Summarizer (or None) found for each type that was serialized.
+summarizerCache = {}
+
+def registerSummarizer(cls, summarizer):
+    '''
+        Registers a function which summarizes values of the given type and
+        of its subclasses instead of serializing them.
+
+        :param cls: The type or its "module.QualifiedName".
+        :param summarizer: Function accepting the value and the Serializer.
+    '''
+    SUMMARIZERS[cls] = summarizer
+    summarizerCache.clear()
+
+def getSummarizer(cls):
+    '''
+        Returns the summarizer for the type, the summarizer of its closest
+        base class or None if the type isn't summarized.
+    '''
+    try:
+        return summarizerCache[cls]
+    except KeyError:
+        pass
+
+    summarizer = None
+    for base in cls.__mro__:
+        summarizer = SUMMARIZERS.get(base) or SUMMARIZERS.get(f"{base.__module__}.{base.__qualname__}")
+        if summarizer is not None:
+            break
+
+    summarizerCache[cls] = summarizer
+    return summarizer
+
+class Serializer:
+    '''
+        Converts a value to a JSON compatible value while enforcing the
+        serializer limits. References to an object that is being serialized
+        (cycles) are replaced by a marker and the output is truncated once
+        a limit is reached:
+        - Strings and bytes longer than the limit end with "<Truncated N characters>".
+        - Lists longer than the limit end with "<Truncated N items>".
+        - Dictionaries and objects with more keys than the limit have a
+          "<Truncated>" key with the number of keys that were omitted.
+
+        Values with a registered summarizer (numpy arrays, array.array,
+        bytes and memoryview by default) are replaced by their summary.
+    '''
+    __slots__ = ("limits", "nodes", "ancestors")
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.nodes = limits.nodes
+        self.ancestors = set()
+
+    def truncateString(self, value):
+        limit = self.limits.string
+        if len(value) <= limit:
+            return value
+        return f"{value[:limit]}<Truncated {len(value) - limit} characters>"
+
+    def process(self, o, depth):
+        if self.nodes <= 0:
+            return MAX_NODES
+        self.nodes -= 1
+
+        if isinstance(o, str):
+            return self.truncateString(o)
+
+        if o is None or isinstance(o, (bool, int, float)):
+            return o
+
+        summarizer = getSummarizer(type(o))
+        if summarizer is not None:
+            return summarizer(o, self)
+
+        if depth > self.limits.depth:
+            return MAX_DEPTH
+
+        if isinstance(o, dict):
+            items = o.items()
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            items = None
+        elif hasattr(o, '__dict__'):
+            items = vars(o).items()
+        else:
+            return self.truncateString(str(o))
+
+        objectId = id(o)
+        if objectId in self.ancestors:
+            return CIRCULAR_REFERENCE
+        self.ancestors.add(objectId)
+
+        try:
+            if items is None:
+                return self.processList(o, depth)
+            return self.processItems(items, depth)
+        finally:
+            self.ancestors.discard(objectId)
+
+    def processList(self, o, depth):
+        result = []
+        for item in itertools.islice(o, self.limits.elements):
+            if self.nodes <= 0:
+                break
+            if type(item) in SCALAR_TYPES:
+                self.nodes -= 1
+                result.append(item)
+            else:
+                result.append(self.process(item, depth + 1))
+
+        if len(result) < len(o):
+            result.append(f"<Truncated {len(o) - len(result)} items>")
+        return result
+
+    def processItems(self, items, depth):
+        result = {}
+        processed = 0
+        for (k, v) in itertools.islice(items, self.limits.elements):
+            if self.nodes <= 0:
+                break
+            if type(v) in SCALAR_TYPES:
+                self.nodes -= 1
+                result[str(k)] = v
+            else:
+                result[str(k)] = self.process(v, depth + 1)
+            processed += 1
+
+        if processed < len(items):
+            result["<Truncated>"] = len(items) - processed
+        return result
+
+def serialize(value, limits=DEFAULT_LIMITS):
+    '''
+        Returns the value as a JSON compatible value.
+
+        :param value: The value to serialize.
+        :param SerializerLimits limits: The limits to enforce.
+    '''
+    return Serializer(limits).process(value, 0)
@@ -0,0 +1,1039 @@
+import collections
+import json
+import linecache
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+class DeltaRecord(dict):
+    '''
+        A variable record logged as a delta (see AdliLogger.encodeDelta).
+        The record with the full value is kept so that SegmentedWriter can
+        write it instead if the value the delta refers to was written in
+        a previous segment.
+    '''
+    __slots__ = ("full",)
+
+class SyncWriter:
+    '''
+        Writes each record to the logger in the thread that logged it.
+    '''
+    def __init__(self, logger, file=None):
+        '''
+            :param logger: Logger with the CLP handler.
+            :param file: The file the CLP handler writes to.
+        '''
+        self.logger = logger
+        self.file = file
+        self.lock = threading.Lock()
+
+    def write(self, record, required=False):
+        '''
+            Writes the record.
+
+            :param dict record: The record to write.
+            :param bool required: Unused, records are never dropped.
+        '''
+        self.logger.info(record)
+
+    def writeBatch(self, records):
+        '''
+            Writes the records. The lock is held for the whole batch so that
+            threads writing batches only contend once per batch.
+
+            :param list records: The records to write.
+        '''
+        with self.lock:
+            for record in records:
+                self.logger.info(record)
+
+    def flush(self):
+        '''
+            Flushes the handlers of the logger.
+        '''
+        for handler in self.logger.handlers:
+            handler.flush()
+
+    def close(self):
+        '''
+            Flushes and closes the handlers of the logger.
+        '''
+        for handler in self.logger.handlers:
+            handler.close()
+
+class AsyncWriter:
+    '''
+        Writes records to the target writer from a background thread so the
+        program thread doesn't pay for encoding, compression and file I/O.
+
+        Records are added to a bounded queue. When the queue is full, the
+        overflow policy decides what happens to the record:
+        - block: Wait until there is space in the queue.
+        - drop: Drop the record. The writer thread logs an adli_dropped_records
+          record with the number of records that were dropped.
+        - spill: Append the record to a spill file. Once the queue is empty,
+          the writer thread writes the spilled records in order.
+
+        Records that are required (definitions, the header) are never dropped.
+        A batch of records is added to the queue as a single item. dropped
+        is the number of records dropped so far, AdliLogger writes variables
+        in full after it changes (see AdliLogger.encodeDelta). Variable
+        deltas are spilled as their full record, since the spill file only
+        keeps the JSON of the records.
+    '''
+    POLICIES = ("block", "drop", "spill")
+
+    def __init__(self, target, maxSize, policy, spillPath):
+        if policy not in AsyncWriter.POLICIES:
+            raise ValueError(f"Invalid overflow policy: {policy}")
+
+        self.target = target
+        self.policy = policy
+        self.queue = queue.Queue(maxSize)
+
+        self.dropLock = threading.Lock()
+        self.dropped = 0
+        self.reportedDrops = 0
+
+        self.spillPath = spillPath
+        self.spillLock = threading.Lock()
+        self.spillFile = None
+        self.spilling = False
+
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="adli-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, record, required=False):
+        '''
+            Adds the record to the queue.
+
+            :param dict record: The record to write.
+            :param bool required: If True, the record is never dropped.
+        '''
+        # Records logged after the writer was closed (for example by
+        # other exit handlers) are written directly.
+        if self.closed:
+            self.target.write(record)
+            return
+
+        if self.policy == "spill":
+            with self.spillLock:
+                if not self.spilling:
+                    try:
+                        self.queue.put_nowait(record)
+                        return
+                    except queue.Full:
+                        self.spilling = True
+                self.spill(record)
+            return
+
+        if self.policy == "drop" and not required:
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                with self.dropLock:
+                    self.dropped += 1
+            return
+
+        self.queue.put(record)
+
+    def writeBatch(self, records):
+        '''
+            Adds the batch of records to the queue as a single item.
+
+            :param list records: The records to write.
+        '''
+        if self.closed:
+            self.target.writeBatch(records)
+            return
+
+        if self.policy == "spill":
+            with self.spillLock:
+                if not self.spilling:
+                    try:
+                        self.queue.put_nowait(records)
+                        return
+                    except queue.Full:
+                        self.spilling = True
+                for record in records:
+                    self.spill(record)
+            return
+
+        if self.policy == "drop":
+            try:
+                self.queue.put_nowait(records)
+            except queue.Full:
+                with self.dropLock:
+                    self.dropped += len(records)
+            return
+
+        self.queue.put(records)
+
+    @property
+    def file(self):
+        return self.target.file
+
+    def spill(self, record):
+        '''
+            Appends the record to the spill file. Must be called with the
+            spill lock held.
+        '''
+        if self.spillFile is None:
+            self.spillFile = open(self.spillPath, "a+", encoding="utf-8")
+        record = getattr(record, "full", record)
+        self.spillFile.write(json.dumps(record))
+        self.spillFile.write("\n")
+
+    def drainSpill(self):
+        '''
+            Writes the spilled records to the target once the queue is empty
+            and deletes the spill file. Records logged while the spill file
+            is being written are added to the spill file, so the order of
+            the records is preserved.
+        '''
+        with self.spillLock:
+            if not self.spilling or not self.queue.empty():
+                return
+
+            self.spillFile.seek(0)
+            for line in self.spillFile:
+                self.target.write(json.loads(line))
+
+            self.spillFile.close()
+            self.spillFile = None
+            os.remove(self.spillPath)
+            self.spilling = False
+
+    def reportDrops(self):
+        '''
+            Logs the number of records that were dropped since the last report.
+        '''
+        dropped = self.dropped
+        if dropped == self.reportedDrops:
+            return
+        self.target.write({
+            "type": "adli_dropped_records",
+            "thread": threading.get_ident(),
+            "count": dropped - self.reportedDrops
+        })
+        self.reportedDrops = dropped
+
+    def run(self):
+        '''
+            Writes records from the queue until the writer is closed.
+        '''
+        while True:
+            try:
+                record = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                self.drainSpill()
+                self.reportDrops()
+                continue
+
+            try:
+                if record is None:
+                    self.reportDrops()
+                    return
+                if isinstance(record, list):
+                    self.target.writeBatch(record)
+                else:
+                    self.target.write(record)
+                self.reportDrops()
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        '''
+            Blocks until every record logged so far has been written.
+        '''
+        if self.closed:
+            return
+        self.queue.join()
+        self.drainSpill()
+        self.target.flush()
+
+    def close(self):
+        '''
+            Writes the remaining records and stops the writer thread.
+        '''
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        self.target.close()
+
+def getLoggerCallLocation(function):
+    '''
+        Returns the path and line of the logger.info call in the function.
+        This is the source location ClpKeyValuePairStreamHandler writes for
+        the records logged by the function.
+
+        :param function: A SyncWriter method.
+    '''
+    code = function.__code__
+    line = code.co_firstlineno
+    while True:
+        text = linecache.getline(code.co_filename, line)
+        if not text or "self.logger.info(" in text:
+            break
+        line += 1
+    return {"path": code.co_filename, "line": line if text else 0}
+
+class ClpWriter:
+    '''
+        Encodes records straight into a CLP key-value IR stream, without
+        the logging module. The stream is the same as the one written by
+        ClpKeyValuePairStreamHandler through a SyncWriter: each record has
+        the same auto-generated key-value pairs (timestamp, level and
+        source location), but no LogRecord is created and the level,
+        filters and handler lock of the logger are skipped. The source
+        location is the logger.info call in SyncWriter.write for single
+        records and in SyncWriter.writeBatch for batches, as with the
+        handler.
+
+        The records are packed with msgpack before the lock is taken. The
+        auto-generated key-value pairs are only packed again when the
+        timestamp (in milliseconds) changes.
+    '''
+    LEVEL = 20
+    LEVEL_NAME = "INFO"
+    WRITE_LOCATION = getLoggerCallLocation(SyncWriter.write)
+    BATCH_LOCATION = getLoggerCallLocation(SyncWriter.writeBatch)
+
+    def __init__(self, path, append=False):
+        import msgpack
+        from clp_ffi_py.ir import Serializer
+        from zstandard import ZstdCompressor
+
+        self.file = open(path, "ab" if append else "wb")
+        self.serializer = Serializer(ZstdCompressor().stream_writer(self.file))
+        self.pack = msgpack.packb
+        self.lock = threading.Lock()
+        self.timestamp = None
+        self.autoPairs = None
+        self.closed = False
+
+    def getAutoPairs(self, batch=False):
+        '''
+            Returns the packed auto-generated key-value pairs of a record
+            written now. This is called while holding the lock.
+
+            :param bool batch: True for the records of a batch.
+        '''
+        now = time.time()
+        timestamp = int(now * 1000)
+        if timestamp != self.timestamp:
+            self.timestamp = timestamp
+            self.autoPairs = tuple(
+                self.pack({
+                    "timestamp": {
+                        "unix_millisecs": timestamp,
+                        "utc_offset_secs": time.localtime(now).tm_gmtoff
+                    },
+                    "level": {"num": ClpWriter.LEVEL, "name": ClpWriter.LEVEL_NAME},
+                    "source_location": location
+                })
+                for location in (ClpWriter.WRITE_LOCATION, ClpWriter.BATCH_LOCATION)
+            )
+        return self.autoPairs[batch]
+
+    def write(self, record, required=False):
+        '''
+            Encodes the record.
+
+            :param dict record: The record to write.
+            :param bool required: Unused, records are never dropped.
+        '''
+        packed = self.pack(record)
+        with self.lock:
+            if not self.closed:
+                self.serializer.serialize_log_event_from_msgpack_map(self.getAutoPairs(), packed)
+
+    def writeBatch(self, records):
+        '''
+            Encodes the records while holding the lock once.
+
+            :param list records: The records to write.
+        '''
+        packed = [self.pack(record) for record in records]
+        with self.lock:
+            if self.closed:
+                return
+            autoPairs = self.getAutoPairs(True)
+            for userPairs in packed:
+                self.serializer.serialize_log_event_from_msgpack_map(autoPairs, userPairs)
+
+    def flush(self):
+        '''
+            Writes the records buffered by the serializer to the stream.
+        '''
+        with self.lock:
+            if not self.closed:
+                self.serializer.flush()
+
+    def close(self):
+        '''
+            Closes the serializer, which closes the compressed stream and
+            the file.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.serializer.close()
+
+class BinaryWriter:
+    '''
+        Writes records in a compact binary format instead of CLP key-value
+        IR. Execution records are fixed-width structs and variable records
+        have a fixed-width prefix followed by the JSON encoded value. The
+        thread and scope of these records are replaced with small integer
+        indices which are defined once. Other records, and the records
+        with a task key written by the flight recorder, are JSON encoded.
+
+        The records are packed into a bytearray which is written to the
+        zstd compressed stream once it is larger than BUFFER_SIZE. See
+        reader/BinaryDecoder.py to convert the records back to CDL records.
+
+        Format (little endian), after the MAGIC bytes each record starts
+        with a one byte tag:
+        - TAG_EXECUTION: thread index, scope index, stack id (0 if the stack
+          wasn't logged), logtype, seq (IIIIQ)
+        - TAG_VARIABLE: thread index, scope index, varid, seq, value length (IIIQI), value
+        - TAG_THREAD: thread index, thread ident (IQ)
+        - TAG_SCOPE: scope index, length (II), utf-8 scope uid
+        - TAG_SCOPE_ID: scope index, integer scope id (IQ)
+        - TAG_SCOPE_RESET: Forget all scope indices (no payload)
+        - TAG_JSON: length (I), utf-8 JSON record
+        - TAG_SCOPE_RECORD: an adli_scope record: thread index, scope index,
+          parent scope index, funcid, seq (IIIIQ). The parent and funcid are
+          NONE if they are None.
+    '''
+    MAGIC = b"ADLIB\x01"
+
+    TAG_EXECUTION = 1
+    TAG_VARIABLE = 2
+    TAG_THREAD = 3
+    TAG_SCOPE = 4
+    TAG_SCOPE_RESET = 5
+    TAG_JSON = 6
+    TAG_SCOPE_ID = 7
+    TAG_SCOPE_RECORD = 8
+
+    NONE = 0xFFFFFFFF
+
+    EXECUTION = struct.Struct("<BIIIIQ")
+    VARIABLE = struct.Struct("<BIIIQI")
+    THREAD = struct.Struct("<BIQ")
+    SCOPE = struct.Struct("<BII")
+    SCOPE_ID = struct.Struct("<BIQ")
+    JSON = struct.Struct("<BI")
+    SCOPE_RECORD = struct.Struct("<BIIIIQ")
+
+    BUFFER_SIZE = 1 << 16
+
+    # The scope indices are reset once this many scopes were defined so
+    # that the writer and the reader use a bounded amount of memory.
+    MAX_SCOPES = 1 << 16
+
+    def __init__(self, path, append=False):
+        from zstandard import ZstdCompressor
+
+        self.file = open(path, "ab" if append else "wb")
+        self.stream = ZstdCompressor().stream_writer(self.file)
+        self.lock = threading.Lock()
+        self.buffer = bytearray(BinaryWriter.MAGIC)
+        self.threads = {}
+        self.scopes = {}
+        self.nextScope = 0
+        self.closed = False
+
+    def getThreadIndex(self, ident):
+        index = self.threads.get(ident)
+        if index is None:
+            index = len(self.threads)
+            self.threads[ident] = index
+            self.buffer += BinaryWriter.THREAD.pack(BinaryWriter.TAG_THREAD, index, ident)
+        return index
+
+    def getScopeIndex(self, scope):
+        index = self.scopes.get(scope)
+        if index is None:
+            if len(self.scopes) >= BinaryWriter.MAX_SCOPES:
+                self.scopes.clear()
+                self.buffer.append(BinaryWriter.TAG_SCOPE_RESET)
+            index = self.nextScope
+            self.nextScope += 1
+            self.scopes[scope] = index
+            if isinstance(scope, int):
+                self.buffer += BinaryWriter.SCOPE_ID.pack(BinaryWriter.TAG_SCOPE_ID, index, scope)
+            else:
+                encoded = scope.encode("utf-8")
+                self.buffer += BinaryWriter.SCOPE.pack(BinaryWriter.TAG_SCOPE, index, len(encoded))
+                self.buffer += encoded
+        return index
+
+    def encode(self, record):
+        '''
+            Appends the encoded record to the buffer.
+        '''
+        recordType = record["type"]
+
+        if recordType == "adli_execution" and isinstance(record.get("stack", 0), int) and "task" not in record:
+            self.buffer += BinaryWriter.EXECUTION.pack(
+                BinaryWriter.TAG_EXECUTION,
+                self.getThreadIndex(record["thread"]),
+                self.getScopeIndex(record["scope_uid"]),
+                record.get("stack", 0),
+                record["value"],
+                record.get("seq", 0)
+            )
+        elif recordType == "adli_variable" and "value" in record and "serialization_error" not in record \
+                and "task" not in record:
+            value = json.dumps(record["value"]).encode("utf-8")
+            self.buffer += BinaryWriter.VARIABLE.pack(
+                BinaryWriter.TAG_VARIABLE,
+                self.getThreadIndex(record["thread"]),
+                self.getScopeIndex(record["scope_uid"]),
+                record["varid"],
+                record.get("seq", 0),
+                len(value)
+            )
+            self.buffer += value
+        elif recordType == "adli_scope" and "task" not in record:
+            # Both scopes must be defined after a reset of the scope indices.
+            if len(self.scopes) >= BinaryWriter.MAX_SCOPES - 1:
+                self.scopes.clear()
+                self.buffer.append(BinaryWriter.TAG_SCOPE_RESET)
+            parent = record["parent"]
+            funcId = record["funcid"]
+            self.buffer += BinaryWriter.SCOPE_RECORD.pack(
+                BinaryWriter.TAG_SCOPE_RECORD,
+                self.getThreadIndex(record["thread"]),
+                self.getScopeIndex(record["id"]),
+                BinaryWriter.NONE if parent is None else self.getScopeIndex(parent),
+                BinaryWriter.NONE if funcId is None else funcId,
+                record.get("seq", 0)
+            )
+        else:
+            encoded = json.dumps(record).encode("utf-8")
+            self.buffer += BinaryWriter.JSON.pack(BinaryWriter.TAG_JSON, len(encoded))
+            self.buffer += encoded
+
+        if len(self.buffer) >= BinaryWriter.BUFFER_SIZE:
+            self.stream.write(self.buffer)
+            self.buffer.clear()
+
+    def write(self, record, required=False):
+        '''
+            Encodes the record.
+
+            :param dict record: The record to write.
+            :param bool required: Unused, records are never dropped.
+        '''
+        with self.lock:
+            self.encode(record)
+
+    def writeBatch(self, records):
+        '''
+            Encodes the records while holding the lock once.
+
+            :param list records: The records to write.
+        '''
+        with self.lock:
+            for record in records:
+                self.encode(record)
+
+    def flush(self):
+        '''
+            Writes the buffer and flushes the compressed stream.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.stream.write(self.buffer)
+            self.buffer.clear()
+            self.stream.flush()
+
+    def close(self):
+        '''
+            Writes the buffer and closes the compressed stream.
+        '''
+        self.flush()
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.stream.close()
+
+class JsonLinesWriter:
+    '''
+        Writes records as uncompressed JSON lines, which is useful to look
+        at the records of a run without a decoder. The lines are buffered
+        and written once the buffer is larger than BUFFER_SIZE.
+    '''
+    BUFFER_SIZE = 1 << 16
+
+    def __init__(self, path, append=False):
+        self.file = open(path, "ab" if append else "wb")
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.closed = False
+
+    def send(self, data):
+        '''
+            Writes the encoded records. This is called while holding the lock.
+        '''
+        self.file.write(data)
+
+    def write(self, record, required=False):
+        '''
+            Encodes the record.
+
+            :param dict record: The record to write.
+            :param bool required: Unused, records are never dropped.
+        '''
+        line = json.dumps(record).encode("utf-8") + b"\n"
+        with self.lock:
+            self.buffer += line
+            if len(self.buffer) >= JsonLinesWriter.BUFFER_SIZE and not self.closed:
+                self.send(self.buffer)
+                self.buffer.clear()
+
+    def writeBatch(self, records):
+        '''
+            Encodes the records while holding the lock once.
+
+            :param list records: The records to write.
+        '''
+        lines = b"".join(json.dumps(record).encode("utf-8") + b"\n" for record in records)
+        with self.lock:
+            self.buffer += lines
+            if len(self.buffer) >= JsonLinesWriter.BUFFER_SIZE and not self.closed:
+                self.send(self.buffer)
+                self.buffer.clear()
+
+    def flush(self):
+        '''
+            Writes the buffer.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.send(self.buffer)
+            self.buffer.clear()
+            self.file.flush()
+
+    def close(self):
+        '''
+            Writes the buffer and closes the file.
+        '''
+        self.flush()
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.file.close()
+
+class SocketWriter(JsonLinesWriter):
+    '''
+        Streams records as JSON lines to a local collector listening on a
+        Unix domain socket (see adli_collect.py). Each process opens its own
+        connection and starts it with its header. If the collector closes
+        the connection, the error is reported once and the following records
+        are dropped.
+    '''
+    def __init__(self, path):
+        import socket
+
+        self.file = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.file.connect(str(path))
+        except OSError:
+            self.file.close()
+            raise
+        self.path = path
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.closed = False
+        self.broken = False
+
+    def send(self, data):
+        if self.broken:
+            return
+        try:
+            self.file.sendall(data)
+        except OSError as e:
+            self.broken = True
+            print(f"ADLI: Unable to send records to {self.path}: {e}", file=sys.stderr)
+
+    def flush(self):
+        '''
+            Sends the buffer.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.send(self.buffer)
+            self.buffer.clear()
+
+class MemoryWriter:
+    '''
+        Keeps the last capacity records in memory instead of writing them,
+        for example to check the records logged by a program in a test. The
+        records are in the records attribute.
+    '''
+    def __init__(self, capacity):
+        self.file = None
+        self.records = collections.deque(maxlen=capacity)
+
+    def write(self, record, required=False):
+        '''
+            Keeps the record, the oldest record is dropped once the buffer
+            is full.
+        '''
+        self.records.append(record)
+
+    def writeBatch(self, records):
+        '''
+            Keeps the records.
+        '''
+        self.records.extend(records)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+def toRanges(values):
+    '''
+        Returns the values as a sorted list where consecutive integers are
+        collapsed into [first, last] ranges. Other values (the "global"
+        scope) are kept as they are after the ranges.
+
+        :param values: Set of integers and strings.
+    '''
+    ranges = []
+    others = []
+    for value in sorted(v for v in values if isinstance(v, int)):
+        if ranges and ranges[-1][1] + 1 == value:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    for value in values:
+        if not isinstance(value, int):
+            others.append(value)
+    return ranges + sorted(others, key=str)
+
+class SegmentedWriter:
+    '''
+        Writes the records to a sequence of segment files instead of a single
+        CDL file. A new segment is started once the current segment reaches
+        the maximum size (compressed bytes), age (seconds) or number of
+        records. Size and age are checked every CHECK_INTERVAL records, so
+        segments can be slightly larger or older than the limits.
+
+        Each segment can be read on its own. It starts with the header, an
+        adli_segment record and the frame and stack definitions logged in
+        the previous segments, and ends with an adli_segment_end record with
+        the first and last sequence number, the time range and the number of
+        records of the segment. The same information is kept in an index
+        file (<execution_id>.segments.json) which is rewritten each time a
+        segment is started or ended. If retain is set, only the last retain
+        segments are kept.
+
+        The index also lists the threads, scopes and logtypes of the records
+        of each segment (see toRanges), so a reader only decodes the
+        segments which may contain the records of a thread, a call or a
+        logtype.
+
+        If chunked is True, the segments are chunks appended to a single
+        CDL file (<execution_id><extension>) and the index
+        (<execution_id>.index.json) has the offset and length of each chunk.
+        Each chunk is a complete compressed stream (one zstd frame) which
+        can be decoded from its offset. The header is only written in the
+        first chunk and chunks are never deleted.
+
+        Variable deltas (ADLI_DELTA) only refer to values written in the
+        same segment. A delta whose variable wasn't written yet in the
+        segment is replaced by the record with the full value.
+    '''
+    DEFINITION_TYPES = ("adli_stack_frame", "adli_stack")
+    CHECK_INTERVAL = 64
+
+    # The variables written in the segment are forgotten once there are
+    # this many, the following deltas are then written with full values.
+    MAX_VARIABLES = 1 << 16
+
+    def __init__(self, openTarget, directory, executionId, extension,
+                 maxBytes=0, maxSeconds=0, maxRecords=0, retain=0, deltas=False, chunked=False):
+        '''
+            :param openTarget: Function which accepts the path of a segment
+            and whether to append to it, and returns a writer with a file
+            attribute.
+            :param directory: Directory of the segments and the index.
+            :param str executionId: Execution id used to name the segments.
+            :param str extension: Extension of the segments.
+            :param int maxBytes: Maximum size of a segment (0 for no limit).
+            :param float maxSeconds: Maximum age of a segment (0 for no limit).
+            :param int maxRecords: Maximum records per segment (0 for no limit).
+            :param int retain: Number of segments to keep (0 keeps every segment).
+            :param bool deltas: True if variables are logged as deltas.
+            :param bool chunked: True to write the segments as chunks of a single file.
+        '''
+        self.openTarget = openTarget
+        self.directory = directory
+        self.executionId = executionId
+        self.extension = extension
+        self.maxBytes = maxBytes
+        self.maxSeconds = maxSeconds
+        self.maxRecords = maxRecords
+        self.retain = 0 if chunked else retain
+        self.deltas = deltas
+        self.chunked = chunked
+        indexName = f"{executionId}.index.json" if chunked else f"{executionId}.segments.json"
+        self.indexPath = os.path.join(directory, indexName)
+
+        self.lock = threading.Lock()
+        self.header = None
+        self.definitions = []
+        self.segments = []
+        self.segment = -1
+        self.closed = False
+        self.startSegment()
+
+    @property
+    def file(self):
+        return self.target.file
+
+    def startSegment(self):
+        '''
+            Opens the next segment and writes the header and definitions.
+        '''
+        self.segment += 1
+        self.variables = set()
+        self.threads = set()
+        self.scopes = set()
+        self.logTypes = set()
+        self.info = {
+            "segment": self.segment,
+            "file": None,
+            "firstSeq": None,
+            "lastSeq": None,
+            "startTime": time.time(),
+            "endTime": None,
+            "records": 0,
+            "threads": [],
+            "scopes": [],
+            "logtypes": []
+        }
+
+        if self.chunked:
+            name = f"{self.executionId}{self.extension}"
+            path = os.path.join(self.directory, name)
+            append = self.segment > 0
+            self.info["offset"] = os.path.getsize(path) if append else 0
+            self.info["length"] = None
+            self.target = self.openTarget(path, append)
+        else:
+            name = f"{self.executionId}.{self.segment:06d}{self.extension}"
+            self.target = self.openTarget(os.path.join(self.directory, name), False)
+
+        self.info["file"] = name
+        self.segments.append(self.info)
+        self.startedAt = time.monotonic()
+        self.nextCheck = SegmentedWriter.CHECK_INTERVAL
+
+        if self.header is not None:
+            if not self.chunked:
+                self.target.write(self.header)
+            self.writeSegmentRecord()
+        for definition in self.definitions:
+            self.target.write(definition)
+
+        self.removeOldSegments()
+        self.writeIndex()
+
+    def writeSegmentRecord(self):
+        self.target.write({
+            "type": "adli_segment",
+            "executionId": self.executionId,
+            "segment": self.segment,
+            "startTime": self.info["startTime"]
+        })
+
+    def updateInfo(self):
+        '''
+            Copies the threads, scopes and logtypes of the current segment
+            into its index entry.
+        '''
+        info = self.info
+        info["threads"] = sorted(self.threads)
+        info["scopes"] = toRanges(self.scopes)
+        info["logtypes"] = toRanges(self.logTypes)
+
+    def endSegment(self):
+        '''
+            Writes the adli_segment_end record and closes the segment.
+        '''
+        info = self.info
+        info["endTime"] = time.time()
+        self.target.write({
+            "type": "adli_segment_end",
+            "executionId": self.executionId,
+            "segment": info["segment"],
+            "firstSeq": info["firstSeq"],
+            "lastSeq": info["lastSeq"],
+            "startTime": info["startTime"],
+            "endTime": info["endTime"],
+            "records": info["records"]
+        })
+        self.target.close()
+        self.updateInfo()
+        if self.chunked:
+            info["length"] = os.path.getsize(os.path.join(self.directory, info["file"])) - info["offset"]
+
+    def removeOldSegments(self):
+        '''
+            Deletes the oldest segments until retain segments are left.
+        '''
+        while self.retain and len(self.segments) > self.retain:
+            oldest = self.segments.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, oldest["file"]))
+            except FileNotFoundError:
+                pass
+
+    def writeIndex(self):
+        '''
+            Replaces the index file with the current list of segments.
+        '''
+        index = {
+            "executionId": self.executionId,
+            "chunked": self.chunked,
+            "segments": self.segments
+        }
+        path = self.indexPath + ".tmp"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(path, self.indexPath)
+
+    def add(self, record):
+        '''
+            Writes the record to the current segment. Must be called with
+            the lock held.
+        '''
+        recordType = record["type"]
+        if recordType == "adli_header":
+            self.header = record
+            self.target.write(record)
+            self.writeSegmentRecord()
+            return
+
+        if recordType in SegmentedWriter.DEFINITION_TYPES:
+            self.definitions.append(record)
+        elif self.deltas and recordType == "adli_variable":
+            key = (record["thread"], record["varid"], record["scope_uid"])
+            if key not in self.variables:
+                if len(self.variables) >= SegmentedWriter.MAX_VARIABLES:
+                    self.variables.clear()
+                self.variables.add(key)
+                if "delta" in record:
+                    record = getattr(record, "full", record)
+        self.target.write(record)
+
+        thread = record.get("thread")
+        if thread is not None:
+            self.threads.add(thread)
+        scope = record.get("scope_uid")
+        if scope is not None:
+            self.scopes.add(scope)
+        if recordType == "adli_scope":
+            self.scopes.add(record["id"])
+        elif recordType == "adli_execution":
+            self.logTypes.add(record["value"])
+
+        info = self.info
+        info["records"] += 1
+        seq = record.get("seq")
+        if seq is not None:
+            if info["firstSeq"] is None or seq < info["firstSeq"]:
+                info["firstSeq"] = seq
+            if info["lastSeq"] is None or seq > info["lastSeq"]:
+                info["lastSeq"] = seq
+
+    def shouldRotate(self):
+        records = self.info["records"]
+        if self.maxRecords and records >= self.maxRecords:
+            return True
+        if records < self.nextCheck:
+            return False
+
+        self.nextCheck = records + SegmentedWriter.CHECK_INTERVAL
+        if self.maxBytes and self.target.file.tell() - self.info.get("offset", 0) >= self.maxBytes:
+            return True
+        if self.maxSeconds and time.monotonic() - self.startedAt >= self.maxSeconds:
+            return True
+        return False
+
+    def rotate(self):
+        self.endSegment()
+        self.startSegment()
+
+    def write(self, record, required=False):
+        '''
+            Writes the record and starts a new segment if the current
+            segment is full.
+
+            :param dict record: The record to write.
+            :param bool required: Unused, records are never dropped.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.add(record)
+            if self.shouldRotate():
+                self.rotate()
+
+    def writeBatch(self, records):
+        '''
+            Writes the records. A batch is never split between segments.
+
+            :param list records: The records to write.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            for record in records:
+                self.add(record)
+            if self.shouldRotate():
+                self.rotate()
+
+    def flush(self):
+        '''
+            Flushes the current segment and updates the index.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.target.flush()
+            self.updateInfo()
+            self.writeIndex()
+
+    def close(self):
+        '''
+            Ends the current segment and writes the final index.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.endSegment()
+            self.writeIndex()
@@ -2,15 +2,30 @@ import ast
 import os
 from pathlib import Path
 
+# Modules that are copied to the output directory with the injected
+# program. AdliLogger.py imports the other modules.
+RUNTIME_MODULES = ["AdliLogger.py", "AdliWriters.py", "AdliSerializer.py"]
+
 def getLoggerInstance():
     '''
         Given a uniqueid, this function sets the unique id of
         AdliLogger.py and returns the unparsed source.
     '''
-    path = Path(os.path.dirname(__file__)) / "AdliLogger.py"
+    return getRuntimeModule("AdliLogger.py")
+
+def getRuntimeModule(fileName):
+    '''
+        Returns the unparsed source of the given runtime module.
+    '''
+    path = Path(os.path.dirname(__file__)) / fileName
     with open(path, "r") as f:
         source = f.read()
         tree = ast.parse(source)
         return ast.unparse(tree)
 
-
+def getRuntimeModules():
+    '''
+        Returns a dictionary with the unparsed source of every runtime
+        module keyed by its file name.
+    '''
+    return {fileName: getRuntimeModule(fileName) for fileName in RUNTIME_MODULES}
@@ -8,7 +8,7 @@ from pathlib import Path
 from injector import helper
 from injector.FindLocalImports import findLocalImports
 from injector.LogInjector import LogInjector
-from injector.LoggerInstance.getLoggerInstance import getLoggerInstance
+from injector.LoggerInstance.getLoggerInstance import getRuntimeModules
 from injector.LoadDesignConfiguration import getAbsMapFile, getSdgFile, getSdgMetaFile
 
 class ProgramProcessor:
@@ -17,17 +17,24 @@ class ProgramProcessor:
         imports found using the log injector. It then writes the injected
         source files to the output directory.
     '''
-    def __init__(self, sourceFile, workingDirectory, sysinfo):
+    def __init__(self, sourceFile, workingDirectory, sysinfo, sampling=None, loopSummary=None, serializerLimits=None, tier=None):
         self.sourceFile = os.path.abspath(sourceFile)
         self.fileName = Path(self.sourceFile).stem
         self.sourceFileDirectory = os.path.dirname(self.sourceFile)                
         self.outputDirectory = os.path.join(workingDirectory, "output", self.fileName)
 
         self.sysinfo = sysinfo
+        self.sampling = sampling
+        self.loopSummary = loopSummary
+        self.tier = tier or "full"
         # Create header object
         self.adliInfo = {
             "adliExecutionId": str(uuid.uuid4()),
-            "timestamp": str(time.time())
+            "timestamp": str(time.time()),
+            "sampling": sampling,
+            "loopSummary": loopSummary,
+            "serializerLimits": serializerLimits,
+            "tier": self.tier
         }
 
         if os.path.exists(self.outputDirectory):
@@ -63,7 +70,7 @@ class ProgramProcessor:
 
             currAst = ast.parse(source)
             isRoot = (self.sourceFile == currFilePath)
-            injector = LogInjector(source, currAst, logTypeCount, currRelPath, isRoot, abs_map)
+            injector = LogInjector(source, currAst, logTypeCount, currRelPath, isRoot, abs_map, self.sampling, self.loopSummary, self.tier)
 
             if(injector.metadata):
                 programMetadata = injector.metadata
@@ -79,16 +86,17 @@ class ProgramProcessor:
             fileTree[currRelPath] = {
                 "source": source,
                 "minLt": injector.minLogTypeCount,
-                "maxLt": injector.maxLogTypeCount
+                "maxLt": injector.maxLogTypeCount,
+                "tier": injector.fileTier
             }
 
             with open(outputFilePath, 'w+') as f:
                 f.write(ast.unparse(injector.tree))
 
-        # Add AdliLogger.py to output directory
-        source = getLoggerInstance()
-        with open(Path(self.outputDirectory) / "AdliLogger.py", "w+") as f:
-            f.write(source)     
+        # Add AdliLogger.py and the modules it uses to output directory
+        for (fileName, source) in getRuntimeModules().items():
+            with open(Path(self.outputDirectory) / fileName, "w+") as f:
+                f.write(source)
         
         # Save header to output folder
         header = {
@@ -10,7 +10,9 @@ class CollectFunctionArgInfo(ast.NodeVisitor, VariableCollectorBase):
 
     def __init__(self, node, logTypeId, funcId):
         VariableCollectorBase.__init__(self, logTypeId, funcId)
-        self.generic_visit(node)
+        # Only the signature is visited, the arguments of nested functions
+        # and lambdas belong to their own logtype.
+        self.generic_visit(node.args)
     
     def visit_arg(self, node):
         self.getVarInfo(node.arg, [], node.arg, None)
@@ -1,17 +1,19 @@
 import ast
 import copy
 import json
+from injector.LoggerInstance.AdliSerializer import parseSerializerLimits as parseLimits
 
 
 def getInjectedImports():
     """
-        Imports the adliLogger instance
+        Imports the adliLogger instance and its enable table
     """
     return [
         ast.ImportFrom(
             module="AdliLogger",
             names = [
-                ast.alias(name="adli")
+                ast.alias(name="adli"),
+                ast.alias(name="adli_enabled")
             ],
             level=0
         )
@@ -58,42 +60,54 @@ def getHeaderLogStmt():
         )
     )
 
+def getEnabledCheck(logTypeId):
+    '''
+        Returns an expression which is True if the logtype is enabled
+        in the runtime enable table (adli_enabled[<logtype_id>]).
+    '''
+    return ast.Subscript(
+        value=ast.Name(id='adli_enabled', ctx=ast.Load()),
+        slice=ast.Constant(value=logTypeId),
+        ctx=ast.Load()
+    )
+
 def getLtLogStmt(logTypeId):
     '''
         This function returns a logger.info statement with the 
-        provided logtype id.
+        provided logtype id. The logger is only called if the
+        logtype is enabled.
+
+        if adli_enabled[<logtype_id>]:
+            adli.logStmt(<logtype_id>, adli_uid)
     '''
-    return ast.Expr(
-        value=ast.Call(
-            func=ast.Attribute(
-                value=ast.Name(id='adli', ctx=ast.Load()),
-                attr='logStmt',
-                ctx=ast.Load()
-            ),
-            args=[
-                ast.Constant(value=logTypeId),
-                ast.Name(id="adli_uid", ctx=ast.Load()),
-                ast.Call(
+    return ast.If(
+        test=getEnabledCheck(logTypeId),
+        body=[
+            ast.Expr(
+                value=ast.Call(
                     func=ast.Attribute(
-                        value= ast.Attribute(
-                            value=ast.Name(id='adli', ctx=ast.Load()),
-                            attr='traceback',
-                            ctx=ast.Load()
-                        ),
-                        attr='extract_stack',
+                        value=ast.Name(id='adli', ctx=ast.Load()),
+                        attr='logStmt',
                         ctx=ast.Load()
                     ),
-                    args=[],
+                    args=[
+                        ast.Constant(value=logTypeId),
+                        ast.Name(id="adli_uid", ctx=ast.Load())
+                    ],
                     keywords=[]
                 )
-            ],
-            keywords=[]
-        )
+            )
+        ],
+        orelse=[]
     )
 
-def getVarLogStmt(name, varId):
+def getVarLogStmt(name, varId, logTypeId):
     '''
-        Returns a function call to log the given variables.
+        Returns a function call to log the given variables. If the
+        logtype of the variable is disabled, the value is only checked
+        for an encoded input.
+
+        <name> = adli.logVariable(<var_id>, <name>, adli_uid) if adli_enabled[<logtype_id>] else adli.decodeInput(<name>)
     '''
     logVariableCall = ast.Call(
         func=ast.Attribute(
@@ -109,7 +123,23 @@ def getVarLogStmt(name, varId):
         keywords=[]
     )
 
-    return getAssignStmt(name, logVariableCall)
+    decodeInputCall = ast.Call(
+        func=ast.Attribute(
+            value=ast.Name(id='adli', ctx=ast.Load()),
+            attr='decodeInput',
+            ctx=ast.Load()
+        ),
+        args=[
+            ast.Name(id=name, ctx=ast.Load())
+        ],
+        keywords=[]
+    )
+
+    return getAssignStmt(name, ast.IfExp(
+        test=getEnabledCheck(logTypeId),
+        body=logVariableCall,
+        orelse=decodeInputCall
+    ))
 
 def getAssignStmt(name, value):
     '''
@@ -201,6 +231,25 @@ def getAdliConfiguration(node):
             "value":["parsed_args", "uid"]
         }
         '''
+        '''
+        {
+            "type":"adli_sampling",
+            "value":{"first": 10, "every": 100}
+        }
+        '''
+        '''
+        {
+            "type":"adli_tier",
+            "value":"control-flow"
+        }
+        '''
+        '''
+        {
+            "type":"adli_serializer_limits",
+            "value":{"elements": 100, "string": 1000},
+            "variables":["buffer"]
+        }
+        '''
         '''
             {
                 "type": "adli_metadata",
@@ -215,7 +264,7 @@ def getAdliConfiguration(node):
         '''
     """
 
-    validCommentTypes = ["adli_disable_variable","adli_metadata","adli_encode_output"]   
+    validCommentTypes = ["adli_disable_variable","adli_metadata","adli_encode_output","adli_sampling","adli_serializer_limits","adli_tier"]   
 
     if "value" in node._fields and isinstance(node.value, ast.Constant):     
         comment = node.value.value
@@ -234,12 +283,235 @@ def getAdliConfiguration(node):
         return None
     
 
-def getUniqueIdAssignStmt():
+def parseSampling(value):
+    '''
+        Parses a sampling policy and returns it as a dictionary. The policy
+        can be a string ("N" or "K:N") or a dictionary with the keys first
+        and every. Returns None if every execution should be logged.
+
+        "N"   : Log 1 in N executions.
+        "K:N" : Log the first K executions in each scope and then 1 in N
+                executions of the scope.
+
+        :param value: The sampling policy to parse.
+    '''
+    if value is None:
+        return None
+
+    if isinstance(value, dict):
+        first = value.get("first", 0)
+        every = value.get("every", 1)
+    else:
+        parts = str(value).split(":")
+        if len(parts) == 1:
+            first, every = 0, parts[0]
+        elif len(parts) == 2:
+            first, every = parts
+        else:
+            raise ValueError(f"Invalid sampling policy: {value}")
+
+    try:
+        first = int(first)
+        every = int(every)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid sampling policy: {value}")
+
+    if first < 0 or every < 0:
+        raise ValueError(f"Sampling values must not be negative: {value}")
+
+    # Logging every execution is the same as not sampling.
+    if first == 0 and every == 1:
+        return None
+
+    return {"first": first, "every": every}
+
+def parseSerializerLimits(value):
+    '''
+        Parses the limits used when serializing variable values and returns
+        them as a dictionary. The limits can be a string ("depth=8,elements=100")
+        or a dictionary. Only the limits that were given are included.
+
+        depth    : Maximum depth of nested containers and objects.
+        elements : Maximum number of items serialized per container.
+        string   : Maximum length of strings and bytes.
+        nodes    : Maximum number of values serialized per variable value.
+
+        The limits are validated by AdliSerializer.parseSerializerLimits,
+        which the runtime also uses for ADLI_SERIALIZER_LIMITS.
+
+        :param value: The serializer limits to parse.
+    '''
+    if value is None:
+        return None
+    return parseLimits(value)
+
+def parseLoopSummary(value):
+    '''
+        Parses the loop summary option and returns it as a dictionary
+        with the number of iterations to log in full at the start (first)
+        and at the end (last) of a loop. Returns None if loops should not
+        be summarized.
+
+        "N"   : Log the first N and last N iterations.
+        "F:L" : Log the first F and last L iterations.
+
+        :param value: The loop summary option to parse.
+    '''
+    if value is None:
+        return None
+
+    parts = str(value).split(":")
+    if len(parts) == 1:
+        first = last = parts[0]
+    elif len(parts) == 2:
+        first, last = parts
+    else:
+        raise ValueError(f"Invalid loop summary: {value}")
+
+    try:
+        first = int(first)
+        last = int(last)
+    except ValueError:
+        raise ValueError(f"Invalid loop summary: {value}")
+
+    if first < 0 or last < 0:
+        raise ValueError(f"Loop summary values must not be negative: {value}")
+
+    return {"first": first, "last": last}
+
+# Statements instrumented in each injection tier in addition to functions,
+# which are instrumented in every tier. None instruments every statement.
+TIERS = {
+    "functions": frozenset(),
+    "control-flow": frozenset(["If", "For", "AsyncFor", "While", "Try", "ExceptHandler", "Return"]),
+    "full": None
+}
+
+def parseTier(value):
+    '''
+        Validates the injection tier and returns it.
+
+        "functions"    : Only log function calls and their arguments.
+        "control-flow" : Also log branches, loops, try statements and returns.
+        "full"         : Log every statement.
+
+        :param str value: The injection tier to parse.
+    '''
+    if value not in TIERS:
+        raise ValueError(f"Invalid injection tier: {value}, expected one of {', '.join(TIERS)}")
+    return value
+
+def getTierComment(body):
+    '''
+        Returns the tier set by an adli_tier comment in the given body or
+        None if there is no comment. The body is searched before it is
+        visited since the tier applies to the statements before the comment.
+
+        :param list body: Statements of a module or function.
+    '''
+    for node in body:
+        if isinstance(node, ast.Expr):
+            parsed = getAdliConfiguration(node)
+            if parsed and parsed["type"] == "adli_tier":
+                return parseTier(parsed["value"])
+    return None
+
+def getSamplingComment(body):
+    '''
+        Returns the sampling policy set by an adli_sampling comment in the
+        given body or None if there is no comment. The body is searched
+        before it is visited since the policy applies to the statements
+        before the comment. A policy of "1" disables sampling.
+
+        :param list body: Statements of a module or function.
+    '''
+    for node in body:
+        if isinstance(node, ast.Expr):
+            parsed = getAdliConfiguration(node)
+            if parsed and parsed["type"] == "adli_sampling":
+                return parseSampling(parsed["value"]) or {"first": 0, "every": 1}
+    return None
+
+def isInstrumented(tier, node):
+    '''
+        Returns True if the statement is instrumented in the given tier.
+    '''
+    statements = TIERS[tier]
+    return statements is None or type(node).__name__ in statements
+
+def containsSuspension(node):
+    '''
+        Returns True if the body of the node contains a yield or await
+        expression outside of nested functions and classes. The thread
+        can run other code while the node is suspended.
+    '''
+    nodes = list(node.body) + list(getattr(node, "orelse", []))
+    while nodes:
+        child = nodes.pop()
+        if isinstance(child, (ast.Yield, ast.YieldFrom, ast.Await)):
+            return True
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)):
+            continue
+        nodes.extend(ast.iter_child_nodes(child))
+    return False
+
+def getLoopSummaryStmts(logTypeId, node, metaTag, loopSummary):
+    '''
+        Wraps the loop so that AdliLogger summarizes its iterations. The
+        first and last iterations are logged in full and the records of
+        the other iterations are counted.
+
+        adli.enterLoop(<logtype_id>, adli_uid, <first>, <last>)
+        try:
+            for <expression>:
+                adli.nextIteration()
+                ...
+            else:
+                adli.endIterations()
+                ...
+        finally:
+            adli.exitLoop()
+
+        The else block is only wrapped if the loop has one. Its records
+        are logged after the summary instead of in the last iteration.
+    '''
+    enterLoop = ast.Expr(
+        value=ast.Call(
+            func=ast.Attribute(
+                value=ast.Name(id='adli', ctx=ast.Load()),
+                attr='enterLoop',
+                ctx=ast.Load()
+            ),
+            args=[
+                ast.Constant(value=logTypeId),
+                ast.Name(id="adli_uid", ctx=ast.Load()),
+                ast.Constant(value=loopSummary["first"]),
+                ast.Constant(value=loopSummary["last"])
+            ],
+            keywords=[]
+        )
+    )
+
+    node.body = ast.parse("adli.nextIteration()").body + node.body
+    if node.orelse:
+        node.orelse = ast.parse("adli.endIterations()").body + node.orelse
+
+    loopTry = ast.Try(
+        body=[metaTag, node],
+        handlers=[],
+        orelse=[],
+        finalbody=ast.parse("adli.exitLoop()").body
+    )
+
+    return [enterLoop, loopTry]
+
+def getUniqueIdAssignStmt(funcId):
     '''
-        This function returns an assign statement generates a unique
-        and saves it in a variable named asp_uid.
+        This function returns an assign statement which generates a
+        scope id for the function call and saves it in a variable
+        named adli_uid.
 
-        adli_uid = uuid.uuid4()
+        adli_uid = adli.getUniqueId(<function logtype id>)
     '''
 
     getUidCall = ast.Call(
@@ -248,7 +520,7 @@ def getUniqueIdAssignStmt():
             attr='getUniqueId',
             ctx=ast.Load()
         ),
-        args=[],
+        args=[ast.Constant(value=funcId)],
         keywords=[]
     )
     
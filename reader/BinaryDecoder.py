@@ -0,0 +1,167 @@
+import io
+import json
+import struct
+
+from zstandard import ZstdDecompressor
+from reader.ZstdFrames import FrameReader
+
+# These values must match AdliWriters.BinaryWriter.
+MAGIC = b"ADLIB\x01"
+
+TAG_EXECUTION = 1
+TAG_VARIABLE = 2
+TAG_THREAD = 3
+TAG_SCOPE = 4
+TAG_SCOPE_RESET = 5
+TAG_JSON = 6
+TAG_SCOPE_ID = 7
+TAG_SCOPE_RECORD = 8
+
+NONE = 0xFFFFFFFF
+
+EXECUTION = struct.Struct("<IIIIQ")
+VARIABLE = struct.Struct("<IIIQI")
+THREAD = struct.Struct("<IQ")
+SCOPE = struct.Struct("<II")
+SCOPE_ID = struct.Struct("<IQ")
+JSON = struct.Struct("<I")
+SCOPE_RECORD = struct.Struct("<IIIIQ")
+
+class BinaryDecoder:
+    '''
+        This class decodes a CDL file written with ADLI_FORMAT=binary and
+        returns the records in the same shape as the records in a CLP
+        key-value IR CDL file.
+    '''
+    def __init__(self, stream, allowIncomplete=False, compressed=True):
+        '''
+            :param stream: Binary stream of the compressed CDL file.
+            :param bool allowIncomplete: If True, a truncated file (for example
+            from a process that was killed) ends at the last complete record.
+            :param bool compressed: False if the stream is already
+            decompressed (a ZstdFrame).
+        '''
+        if compressed:
+            stream = ZstdDecompressor().stream_reader(stream)
+        self.stream = io.BufferedReader(stream)
+        self.threads = {}
+        self.scopes = {}
+        self.allowIncomplete = allowIncomplete
+        self.empty = False
+
+        magic = self.readExact(len(MAGIC))
+        if magic is None and allowIncomplete:
+            self.empty = True
+        elif magic != MAGIC:
+            raise ValueError("The stream is not a binary CDL file.")
+
+    def readExact(self, size):
+        '''
+            Reads exactly size bytes from the stream. Returns None if the
+            end of the stream was reached before any bytes were read.
+        '''
+        data = self.stream.read(size)
+        if not data:
+            return None
+        while len(data) < size:
+            chunk = self.stream.read(size - len(data))
+            if not chunk:
+                raise EOFError("The binary CDL file is truncated.")
+            data += chunk
+        return data
+
+    def readStruct(self, layout):
+        data = self.readExact(layout.size)
+        if data is None:
+            raise EOFError("The binary CDL file is truncated.")
+        return layout.unpack(data)
+
+    def readRecord(self):
+        '''
+            Returns the next record or None at the end of the stream.
+            Thread and scope definitions are consumed without being
+            returned.
+        '''
+        while True:
+            tag = self.readExact(1)
+            if tag is None:
+                return None
+            tag = tag[0]
+
+            if tag == TAG_EXECUTION:
+                thread, scope, stack, value, seq = self.readStruct(EXECUTION)
+                record = {
+                    "type": "adli_execution",
+                    "thread": self.threads[thread],
+                    "scope_uid": self.scopes[scope],
+                    "stack": stack,
+                    "value": value,
+                    "seq": seq
+                }
+                # Stack ids start at 1, 0 means the stack wasn't logged.
+                if not stack:
+                    del record["stack"]
+                return record
+            elif tag == TAG_VARIABLE:
+                thread, scope, varid, seq, length = self.readStruct(VARIABLE)
+                return {
+                    "type": "adli_variable",
+                    "varid": varid,
+                    "thread": self.threads[thread],
+                    "value": json.loads(self.readExact(length)),
+                    "scope_uid": self.scopes[scope],
+                    "seq": seq
+                }
+            elif tag == TAG_SCOPE_RECORD:
+                thread, scope, parent, funcId, seq = self.readStruct(SCOPE_RECORD)
+                return {
+                    "type": "adli_scope",
+                    "thread": self.threads[thread],
+                    "id": self.scopes[scope],
+                    "parent": None if parent == NONE else self.scopes[parent],
+                    "funcid": None if funcId == NONE else funcId,
+                    "seq": seq
+                }
+            elif tag == TAG_JSON:
+                length, = self.readStruct(JSON)
+                return json.loads(self.readExact(length))
+            elif tag == TAG_THREAD:
+                index, ident = self.readStruct(THREAD)
+                self.threads[index] = ident
+            elif tag == TAG_SCOPE:
+                index, length = self.readStruct(SCOPE)
+                self.scopes[index] = self.readExact(length).decode("utf-8") if length else ""
+            elif tag == TAG_SCOPE_ID:
+                index, scopeId = self.readStruct(SCOPE_ID)
+                self.scopes[index] = scopeId
+            elif tag == TAG_SCOPE_RESET:
+                self.scopes.clear()
+            else:
+                raise ValueError(f"Unknown record tag: {tag}")
+
+    def __iter__(self):
+        if self.empty:
+            return
+        while True:
+            try:
+                record = self.readRecord()
+            except EOFError:
+                if self.allowIncomplete:
+                    return
+                raise
+            if record is None:
+                return
+            yield record
+
+def readBinaryRecords(path, allowIncomplete=False):
+    '''
+        Yields the records of a binary CDL file in the order they were
+        written. Each chunk of a chunked file is decoded on its own.
+
+        :param path: Path to the binary CDL file.
+        :param bool allowIncomplete: If True, a truncated file is read up to
+        its last complete record.
+    '''
+    with open(path, "rb") as f:
+        for frame in FrameReader(f):
+            yield from BinaryDecoder(frame, allowIncomplete, compressed=False)
@@ -0,0 +1,109 @@
+import io
+import json
+import logging
+from reader.BinaryDecoder import readBinaryRecords
+from reader.ZstdFrames import FrameReader
+
+CLP_EXTENSION = ".clp.zst"
+BINARY_EXTENSION = ".adlib.zst"
+JSONL_EXTENSION = ".cdl.jsonl"
+
+def isCdlFile(path):
+    return path.endswith(CLP_EXTENSION) or path.endswith(BINARY_EXTENSION) or path.endswith(JSONL_EXTENSION)
+
+def readClpRecords(path, allowIncomplete=False):
+    '''
+        Yields the records of a CLP key-value IR CDL file. Each chunk of a
+        chunked file is a complete IR stream and is decoded on its own.
+
+        :param path: Path to the CDL file.
+        :param bool allowIncomplete: If True, a truncated file is read up to
+        its last complete record.
+    '''
+    with open(path, "rb") as f:
+        for frame in FrameReader(f):
+            yield from readClpFrame(frame, allowIncomplete)
+
+def readClpFrame(frame, allowIncomplete=False):
+    '''
+        Yields the records of one CLP key-value IR stream.
+
+        :param ZstdFrame frame: The decompressed stream.
+        :param bool allowIncomplete: If True, a truncated stream is read up
+        to its last complete record.
+    '''
+    from clp_ffi_py.ir import Deserializer
+
+    try:
+        deserializer = Deserializer(
+            io.BufferedReader(frame),
+            allow_incomplete_stream=allowIncomplete
+        )
+    except Exception:
+        # The file is empty or its preamble was never flushed.
+        if allowIncomplete:
+            return
+        raise
+
+    while True:
+        event = deserializer.deserialize_log_event()
+        if event is None:
+            return
+        auto, user = event.to_dict()
+        yield user
+
+def readJsonLinesRecords(path, allowIncomplete=False):
+    '''
+        Yields the records of a CDL file written by the jsonl or socket
+        sink (ADLI_SINK).
+
+        :param path: Path to the .cdl.jsonl file.
+        :param bool allowIncomplete: If True, a truncated last line is
+        skipped.
+    '''
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n") and allowIncomplete:
+                return
+            yield json.loads(line)
+
+def readCdlRecords(path, allowIncomplete=False):
+    '''
+        Yields the records of a CDL file written in any format.
+
+        :param path: Path to a .clp.zst, .adlib.zst or .cdl.jsonl CDL file.
+        :param bool allowIncomplete: If True, a truncated file is read up to
+        its last complete record.
+    '''
+    if path.endswith(BINARY_EXTENSION):
+        return readBinaryRecords(path, allowIncomplete)
+    if path.endswith(JSONL_EXTENSION):
+        return readJsonLinesRecords(path, allowIncomplete)
+    return readClpRecords(path, allowIncomplete)
+
+def writeClp(records, outputPath):
+    '''
+        Writes the records to a CLP key-value IR CDL file.
+    '''
+    from clp_logging.handlers import ClpKeyValuePairStreamHandler
+
+    handler = ClpKeyValuePairStreamHandler(open(outputPath, "wb"))
+    logger = logging.getLogger("adli_reader")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for record in records:
+            logger.info(record)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+def writeJsonLines(records, outputPath):
+    '''
+        Writes the records to a JSON lines file.
+    '''
+    with open(outputPath, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record))
+            f.write("\n")
@@ -0,0 +1,90 @@
+import json
+import os
+from reader.CdlFile import readCdlRecords
+from reader.MergeExecutions import findCdlFiles
+from reader.SegmentIndex import readChunk
+
+HEADER_FILE = "header.json"
+
+def readHeaderFile(path):
+    '''
+        Returns the header written by the injector (header.json).
+
+        :param path: Path to the header.json file.
+    '''
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+class CdlStream:
+    '''
+        This class streams the records of CDL files one at a time, so a
+        trace of any size is read in constant memory. Each file is paired
+        with the header of the program that wrote it: the adli_header
+        record logged at the start of the file or, if the file doesn't
+        start with one (the process was killed before it was flushed), the
+        header.json written next to it by the injector.
+
+        While iterating, header is the header of the current file (None if
+        it has none), executionId is the id of its execution and path is
+        the path of the file. readFile reads a single file or chunk, which
+        is how ParallelDecode splits the files between processes.
+    '''
+    def __init__(self, paths, headerPath=None):
+        '''
+            :param paths: Paths of CDL files or of directories containing them.
+            :param headerPath: Path of the header.json to use for every file,
+            by default the one next to each file is used.
+        '''
+        self.paths = findCdlFiles(paths)
+        self.headerPath = headerPath
+        self.headerFiles = {}
+        self.header = None
+        self.executionId = None
+        self.path = None
+
+    def getHeaderFile(self, path):
+        '''
+            Returns the header.json paired with the CDL file or None if there
+            is none. Headers are cached since the files of a program share
+            their header.
+        '''
+        headerPath = self.headerPath or os.path.join(os.path.dirname(path), HEADER_FILE)
+        if headerPath not in self.headerFiles:
+            self.headerFiles[headerPath] = readHeaderFile(headerPath) if os.path.exists(headerPath) else None
+        return self.headerFiles[headerPath]
+
+    def readFile(self, path, chunk=None, executionId=None):
+        '''
+            Yields the records of a CDL file, or of one chunk of a chunked
+            CDL file, and updates header, executionId and path.
+
+            :param path: Path of the CDL file.
+            :param dict chunk: Entry of the chunk in the chunk index, the
+            whole file is read if None.
+            :param str executionId: Execution id of the file, for the
+            chunks which don't start with the header.
+        '''
+        self.path = path
+        self.header = None
+        self.executionId = executionId
+
+        if chunk is None:
+            records = readCdlRecords(path, allowIncomplete=True)
+        else:
+            records = readChunk(path, chunk)
+
+        # Only the first chunk of a chunked file has the header, the
+        # header of the other chunks is added by the reader of the first.
+        first = chunk is None or chunk["offset"] == 0
+        for record in records:
+            if record.get("type") == "adli_header":
+                self.header = record["header"]
+                self.executionId = self.header.get("execInfo", {}).get("programExecutionId")
+            elif first:
+                self.header = self.getHeaderFile(path)
+            first = False
+            yield record
+
+    def __iter__(self):
+        for path in self.paths:
+            yield from self.readFile(path)
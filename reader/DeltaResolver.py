@@ -0,0 +1,167 @@
+import collections
+import copy
+
+class DeltaResolver:
+    '''
+        This class restores the values of adli_variable records that were
+        logged in delta mode (ADLI_DELTA). It mirrors the cache used by
+        AdliLogger: the last value of each (varid, scope) is cached per
+        thread with the sequence number of its record and the least
+        recently logged entry is evicted once the cache is full.
+
+        A delta refers to the record it was computed from with its base
+        sequence number. If that record isn't the cached one (it was
+        dropped, ADLI_OVERFLOW=drop) the value is unknown: the record is
+        returned with a None value and "delta_unresolved": true, and the
+        following deltas of the variable are unknown until its value is
+        logged in full. Deltas written without a base (older CDL files)
+        are unknown if their value was cached before records were dropped.
+    '''
+    def __init__(self, cacheSize=None):
+        '''
+            :param int cacheSize: Size of the cache used by AdliLogger. If
+            None, the size is read from the header.
+        '''
+        self.cacheSize = cacheSize
+        self.caches = {}
+        self.enabled = True
+        self.unresolved = 0
+
+    def readHeader(self, record):
+        '''
+            Saves the cache size of the execution if the record is the
+            header. Once records were dropped, the cached values written
+            before the drop can't be trusted by deltas without a base.
+        '''
+        recordType = record.get("type")
+        if recordType == "adli_dropped_records":
+            for cache in self.caches.values():
+                for (key, entry) in cache.items():
+                    cache[key] = (entry[0], entry[1], True)
+            return
+        if recordType != "adli_header":
+            return
+        execInfo = record["header"].get("execInfo", {})
+        self.enabled = execInfo.get("delta", "off") != "off"
+        if self.cacheSize is None:
+            self.cacheSize = execInfo.get("deltaCacheSize")
+
+    def getBase(self, cache, key, record):
+        '''
+            Returns the cached value the delta refers to or None if it is
+            unknown.
+        '''
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        if "base" in record:
+            return entry if entry[0] == record["base"] else None
+        return None if len(entry) > 2 else entry
+
+    def resolve(self, record):
+        '''
+            Returns the variable record with its full value.
+
+            :param dict record: An adli_variable record.
+        '''
+        if not self.enabled:
+            return record
+
+        cache = self.caches.setdefault(record["thread"], collections.OrderedDict())
+        key = (record["varid"], record["scope_uid"])
+        delta = record.get("delta")
+
+        if delta is None:
+            value = record["value"]
+        else:
+            entry = self.getBase(cache, key, record)
+            if entry is None:
+                # The value is unknown until it is logged in full.
+                cache.pop(key, None)
+                self.unresolved += 1
+                record = {name: v for name, v in record.items() if name not in ("delta", "base", "set", "remove")}
+                record["value"] = None
+                record["delta_unresolved"] = True
+                return record
+            if delta == "unchanged":
+                value = entry[1]
+            elif delta == "diff":
+                value = applyDiff(entry[1], record["set"], record["remove"])
+            else:
+                raise ValueError(f"Unknown delta: {delta}")
+
+        cache.pop(key, None)
+        cache[key] = (record.get("seq"), value)
+        if self.cacheSize is not None and len(cache) > self.cacheSize:
+            cache.popitem(last=False)
+
+        if delta is None:
+            return record
+
+        record = {name: v for name, v in record.items() if name not in ("delta", "base", "set", "remove")}
+        record["value"] = value
+        return record
+
+def applyDiff(value, changed, removed):
+    '''
+        Returns a copy of the dictionary with the diff applied.
+
+        :param dict value: The previous value.
+        :param dict changed: The added or changed keys at their paths (see
+        applyOverlay). Logs written before the overlay was used have a list
+        with the [path, value] of each added or changed key.
+        :param list removed: The path of each removed key.
+    '''
+    value = copy.deepcopy(value)
+
+    if isinstance(changed, dict):
+        applyOverlay(value, changed)
+    else:
+        for path, newValue in changed:
+            target = value
+            for key in path[:-1]:
+                target = target[key]
+            target[path[-1]] = newValue
+
+    for path in removed:
+        target = value
+        for key in path[:-1]:
+            target = target[key]
+        del target[path[-1]]
+
+    return value
+
+def applyOverlay(target, overlay):
+    '''
+        Sets the values of the overlay in the target dictionary. A nested
+        dictionary of the overlay is applied to the dictionary at the same
+        key of the target, since the logger only compares the keys of
+        values that are dictionaries in both the previous and new value.
+        Other values replace the value of the target.
+    '''
+    for (key, newValue) in overlay.items():
+        current = target.get(key)
+        if isinstance(newValue, dict) and isinstance(current, dict):
+            applyOverlay(current, newValue)
+        else:
+            target[key] = newValue
+
+def resolveDeltas(records, cacheSize=None):
+    '''
+        Given an iterable of CDL records, yields the records with the full
+        value of each adli_variable record that was logged as a delta.
+        The records must be in the order they appear in the CDL file. The
+        deltas whose base was dropped have "delta_unresolved": true.
+
+        :param records: Iterable of CDL records in the order they were written.
+        :param int cacheSize: Size of the cache used by AdliLogger. If None,
+        the size is read from the header.
+    '''
+    resolver = DeltaResolver(cacheSize)
+
+    for record in records:
+        if record.get("type") == "adli_variable":
+            record = resolver.resolve(record)
+        else:
+            resolver.readHeader(record)
+        yield record
@@ -0,0 +1,132 @@
+import os
+from reader.CdlFile import readCdlRecords, isCdlFile
+from reader.SegmentIndex import readSegmentFiles
+from reader.StackTable import expandStacks
+from reader.DeltaResolver import resolveDeltas
+from reader.TaskTable import assignTasks
+
+class ExecutionMerger:
+    '''
+        This class merges the CDL files written by the processes of a
+        program into one trace. Each process that is forked or spawned by
+        an instrumented process writes its own CDL file and logs the
+        execution id of its parent in the header. The parent logs an
+        adli_fork record when it forks, so the records of each child are
+        inserted after the adli_fork record that created it. Children
+        without an adli_fork record (spawned processes) are inserted after
+        the records of their parent.
+
+        Since stack ids, delta caches and task switches are local to a file,
+        the stacks are expanded, the deltas are resolved and the records
+        are assigned to their asyncio task before merging. Each
+        merged record has an "executionId" key with the id of the
+        execution that logged it. The segments of a segmented execution
+        are read in order as a single file.
+    '''
+    def __init__(self, paths):
+        '''
+            :param paths: Paths of the CDL files to merge.
+        '''
+        self.executions = {}
+        self.children = {}
+        self.skipped = []
+
+        for path in paths:
+            header, segment = self.readHeader(path)
+            if header is None:
+                self.skipped.append(path)
+                continue
+
+            execInfo = header["header"]["execInfo"]
+            executionId = execInfo["programExecutionId"]
+            if executionId in self.executions:
+                self.executions[executionId]["segments"].append((segment, path))
+                continue
+
+            parent = execInfo.get("parentExecution") or {}
+            self.executions[executionId] = {
+                "segments": [(segment, path)],
+                "parent": parent.get("executionId"),
+                "timestamp": float(execInfo.get("timestamp", 0))
+            }
+
+        for execution in self.executions.values():
+            execution["segments"].sort()
+
+        for executionId, execution in self.executions.items():
+            if execution["parent"] in self.executions:
+                self.children.setdefault(execution["parent"], []).append(executionId)
+
+        for children in self.children.values():
+            children.sort(key=lambda executionId: self.executions[executionId]["timestamp"])
+
+    def readHeader(self, path):
+        '''
+            Returns the header record of the CDL file and its segment
+            number (0 if the output isn't segmented). The header is None if
+            the file doesn't contain a header (the process was killed before
+            it was flushed).
+        '''
+        header = None
+        for record in readCdlRecords(path, allowIncomplete=True):
+            if header is not None:
+                return header, record.get("segment", 0) if record.get("type") == "adli_segment" else 0
+            if record.get("type") == "adli_header":
+                header = record
+        return header, 0
+
+    def getRoots(self):
+        '''
+            Returns the ids of the executions whose parent wasn't merged,
+            ordered by the time they started.
+        '''
+        roots = [e for e, info in self.executions.items() if info["parent"] not in self.executions]
+        return sorted(roots, key=lambda executionId: self.executions[executionId]["timestamp"])
+
+    def readExecution(self, executionId):
+        '''
+            Yields the records of the execution followed by the records of
+            the executions it created.
+        '''
+        segments = self.executions[executionId]["segments"]
+        records = readSegmentFiles([path for (segment, path) in segments])
+        merged = set()
+
+        for record in assignTasks(resolveDeltas(expandStacks(records))):
+            record["executionId"] = executionId
+            yield record
+
+            child = record.get("childExecutionId")
+            if record.get("type") == "adli_fork" and child in self.executions and child not in merged:
+                merged.add(child)
+                yield from self.readExecution(child)
+
+        for child in self.children.get(executionId, []):
+            if child not in merged:
+                yield from self.readExecution(child)
+
+    def __iter__(self):
+        for executionId in self.getRoots():
+            yield from self.readExecution(executionId)
+
+def findCdlFiles(paths):
+    '''
+        Returns the CDL files in the given files and directories.
+
+        :param paths: Paths of CDL files or of directories containing them.
+    '''
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if isCdlFile(name)))
+        else:
+            files.append(path)
+    return files
+
+def mergeExecutions(paths):
+    '''
+        Yields the records of the given CDL files merged into one trace.
+
+        :param paths: Paths of CDL files or of directories containing them.
+    '''
+    return iter(ExecutionMerger(findCdlFiles(paths)))
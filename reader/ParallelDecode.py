@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+from reader.CdlStream import CdlStream
+from reader.MergeExecutions import findCdlFiles
+from reader.SegmentIndex import getChunkIndex
+from reader.TraceSummary import TraceSummary, summarizeStream
+
+'''
+    Decodes the CDL files of a program or of a whole system run in a pool
+    of processes. The input is split into units that can be decoded on
+    their own: each CDL file, each segment (segments are separate files)
+    and each chunk of a chunked file with an index. Each process returns
+    a partial result for its units and the partial results are reduced in
+    the order of the units, so the result doesn't depend on the number of
+    processes or on the order in which the units finish.
+'''
+
+def getDecodeUnits(paths, headerPath=None):
+    '''
+        Returns the units of the CDL files in the order their records
+        are read by CdlStream. A unit is a dictionary with the path of the
+        file, the index entry of the chunk (None for a whole file), the
+        execution id of the chunk, the header.json to use and the
+        compressed size used to schedule the largest units first.
+
+        :param paths: Paths of CDL files or of directories containing them.
+        :param headerPath: Path of the header.json to use for every file.
+    '''
+    units = []
+    for path in findCdlFiles(paths):
+        index = getChunkIndex(path)
+        if index is None:
+            units.append({
+                "path": path,
+                "chunk": None,
+                "executionId": None,
+                "headerPath": headerPath,
+                "size": os.path.getsize(path)
+            })
+            continue
+
+        for chunk in index["segments"]:
+            # The length of the last chunk is None until the file is closed.
+            size = chunk["length"]
+            if size is None:
+                size = os.path.getsize(path) - chunk["offset"]
+            units.append({
+                "path": path,
+                "chunk": chunk,
+                "executionId": index["executionId"],
+                "headerPath": headerPath,
+                "size": size
+            })
+    return units
+
+def runUnit(task):
+    (position, function, unit) = task
+    return position, function(unit)
+
+def decodeUnits(units, function, processes=None):
+    '''
+        Returns the results of calling the function on each unit, in the
+        order of the units. The largest units are decoded first so that
+        a large file doesn't end up running alone at the end.
+
+        :param list units: Units returned by getDecodeUnits.
+        :param function: Function of the module level (so it can be
+        pickled) which accepts a unit and returns its partial result.
+        :param int processes: Number of processes, the number of CPUs if
+        None. The units are decoded in this process if it is 1.
+    '''
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(units))
+    if processes <= 1:
+        return [function(unit) for unit in units]
+
+    tasks = sorted(
+        ((position, function, unit) for (position, unit) in enumerate(units)),
+        key=lambda task: task[2]["size"],
+        reverse=True
+    )
+    results = [None] * len(units)
+    with multiprocessing.Pool(processes) as pool:
+        for (position, result) in pool.imap_unordered(runUnit, tasks):
+            results[position] = result
+    return results
+
+def summarizeUnit(unit):
+    '''
+        Returns the TraceSummary of the records of a unit.
+    '''
+    stream = CdlStream([], unit["headerPath"])
+    return summarizeStream(stream, stream.readFile(unit["path"], unit["chunk"], unit["executionId"]))
+
+def summarizeParallel(paths, headerPath=None, processes=None):
+    '''
+        Returns the TraceSummary of the CDL files, decoded in a pool of
+        processes. The summary is the same as the one of summarizeStream.
+
+        :param paths: Paths of CDL files or of directories containing them.
+        :param headerPath: Path of the header.json to use for every file.
+        :param int processes: Number of processes, the number of CPUs if None.
+    '''
+    summary = TraceSummary()
+    for partial in decodeUnits(getDecodeUnits(paths, headerPath), summarizeUnit, processes):
+        summary.merge(partial)
+    return summary
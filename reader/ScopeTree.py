@@ -0,0 +1,63 @@
+class ScopeTree:
+    '''
+        This class rebuilds the call tree of an execution from its adli_scope
+        records. AdliLogger logs an adli_scope record for each call to an
+        instrumented function with the scope id of the call, the scope id
+        of its caller (parent) and the logtype id of the function (funcid).
+        The root scope of each module is "global".
+    '''
+    def __init__(self):
+        self.scopes = {}
+
+    def addScope(self, record):
+        '''
+            Saves the record if it is a scope record. Returns True if the
+            record was a scope record.
+
+            :param dict record: A record from the CDL file.
+        '''
+        if record.get("type") != "adli_scope":
+            return False
+
+        self.scopes[record["id"]] = {
+            "parent": record["parent"],
+            "funcid": record["funcid"],
+            "thread": record["thread"]
+        }
+        return True
+
+    def getParent(self, scopeId):
+        '''
+            Returns the scope id of the caller, "global" for calls from the
+            module level or None if the caller isn't instrumented.
+
+            :param scopeId: The scope id logged in a record.
+        '''
+        scope = self.scopes.get(scopeId)
+        return scope["parent"] if scope else None
+
+    def getCallPath(self, scopeId):
+        '''
+            Returns the scopes from the outermost call to the given scope
+            as a list of (scope id, funcid) tuples.
+
+            :param scopeId: The scope id logged in a record.
+        '''
+        path = []
+        while scopeId in self.scopes:
+            scope = self.scopes[scopeId]
+            path.append((scopeId, scope["funcid"]))
+            scopeId = scope["parent"]
+        path.reverse()
+        return path
+
+def buildScopeTree(records):
+    '''
+        Returns the ScopeTree of the given CDL records.
+
+        :param records: Iterable of CDL records.
+    '''
+    tree = ScopeTree()
+    for record in records:
+        tree.addScope(record)
+    return tree
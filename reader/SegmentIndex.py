@@ -0,0 +1,313 @@
+import json
+import os
+from reader.BinaryDecoder import BinaryDecoder
+from reader.CdlFile import readCdlRecords, readClpFrame, CLP_EXTENSION, BINARY_EXTENSION, JSONL_EXTENSION
+from reader.ZstdFrames import FrameReader
+
+'''
+    Reads the segments written when the output of an execution is
+    segmented (ADLI_SEGMENT_SIZE, ADLI_SEGMENT_SECONDS or ADLI_SEGMENT_RECORDS)
+    or chunked (ADLI_CHUNK_SIZE or ADLI_CHUNK_RECORDS). The index
+    (<execution_id>.segments.json or <execution_id>.index.json) lists the
+    segments which were not deleted with their first and last sequence
+    number, time range and the threads, scopes and logtypes of their
+    records. The chunks of a chunked output are segments stored in a
+    single file at the offset given in the index.
+'''
+
+def readSegmentIndex(path):
+    '''
+        Returns the index of the segments.
+
+        :param path: Path to the <execution_id>.segments.json or
+        <execution_id>.index.json file.
+    '''
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def getChunkIndex(path):
+    '''
+        Returns the index of a chunked CDL file or None if the file isn't
+        chunked or its index wasn't written (see adli_index.py).
+
+        :param path: Path to the CDL file.
+    '''
+    name = os.path.basename(path)
+    for extension in (CLP_EXTENSION, BINARY_EXTENSION, JSONL_EXTENSION):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+            break
+    indexPath = os.path.join(os.path.dirname(path), f"{name}.index.json")
+    if not os.path.exists(indexPath):
+        return None
+    index = readSegmentIndex(indexPath)
+    return index if index.get("chunked") else None
+
+def inRanges(entries, value):
+    '''
+        Returns True if the value is in the list of [first, last] ranges
+        and values written by the logger (see AdliWriters.toRanges).
+    '''
+    for entry in entries:
+        if isinstance(entry, list):
+            if isinstance(value, int) and entry[0] <= value <= entry[1]:
+                return True
+        elif entry == value:
+            return True
+    return False
+
+def findSegments(index, seq=None, timestamp=None, thread=None, scope=None, logtype=None):
+    '''
+        Returns the segments of the index which may contain the record with
+        the given sequence number or the records logged at the given time,
+        by the given thread, in the given scope or of the given logtype.
+        Sequence numbers are allocated to threads in blocks, so the ranges
+        of consecutive segments can overlap. An empty segment has no
+        sequence numbers. The segment that is being written (or whose
+        process was killed) has no endTime and its threads, scopes and
+        logtypes only cover the records that were flushed, so it is
+        returned for any thread, scope and logtype.
+
+        :param dict index: The index returned by readSegmentIndex.
+        :param int seq: Sequence number of a record.
+        :param float timestamp: Time in seconds since the epoch.
+        :param int thread: Thread id.
+        :param scope: Scope uid (see adli_scope records).
+        :param int logtype: Logtype id of an adli_execution record.
+    '''
+    segments = []
+    for segment in index["segments"]:
+        if seq is not None:
+            if segment["firstSeq"] is None or not segment["firstSeq"] <= seq <= segment["lastSeq"]:
+                continue
+        if timestamp is not None:
+            endTime = segment["endTime"] if segment["endTime"] is not None else float("inf")
+            if not segment["startTime"] <= timestamp <= endTime:
+                continue
+        # Indexes written before the threads, scopes and logtypes were
+        # added to the index don't filter on them.
+        if segment["endTime"] is None:
+            segments.append(segment)
+            continue
+        if thread is not None and "threads" in segment and thread not in segment["threads"]:
+            continue
+        if scope is not None and "scopes" in segment and not inRanges(segment["scopes"], scope):
+            continue
+        if logtype is not None and "logtypes" in segment and not inRanges(segment["logtypes"], logtype):
+            continue
+        segments.append(segment)
+    return segments
+
+def readSegmentFiles(paths, allowIncomplete=True):
+    '''
+        Yields the records of consecutive segments of an execution. The
+        header is only yielded from the first segment, the definitions that
+        are repeated at the start of each segment are yielded again.
+
+        :param paths: Paths of the segments in order.
+        :param bool allowIncomplete: If True, a truncated segment is read up
+        to its last complete record.
+    '''
+    headerRead = False
+    for path in paths:
+        for record in readCdlRecords(path, allowIncomplete):
+            if record.get("type") == "adli_header":
+                if headerRead:
+                    continue
+                headerRead = True
+            yield record
+
+def readChunk(path, chunk, allowIncomplete=True):
+    '''
+        Yields the records of one chunk of a chunked CDL file without
+        reading the rest of the file. Each chunk starts with an
+        adli_segment record and the stack definitions, only the first
+        chunk has the header.
+
+        :param path: Path to the chunked CDL file.
+        :param dict chunk: The entry of the chunk in the index.
+        :param bool allowIncomplete: If True, a truncated chunk is read up
+        to its last complete record.
+    '''
+    with open(path, "rb") as f:
+        f.seek(chunk["offset"])
+
+        if path.endswith(JSONL_EXTENSION):
+            data = f.read() if chunk["length"] is None else f.read(chunk["length"])
+            for line in data.splitlines(keepends=True):
+                if not line.endswith(b"\n") and allowIncomplete:
+                    return
+                yield json.loads(line)
+            return
+
+        for frame in FrameReader(f):
+            if path.endswith(BINARY_EXTENSION):
+                yield from BinaryDecoder(frame, allowIncomplete, compressed=False)
+            else:
+                yield from readClpFrame(frame, allowIncomplete)
+            return
+
+def readSegments(indexPath, segments=None):
+    '''
+        Yields the records of the segments of the index in order.
+
+        :param indexPath: Path to the <execution_id>.segments.json or
+        <execution_id>.index.json file.
+        :param segments: Segments to read (from findSegments), every
+        segment in the index is read if None.
+    '''
+    index = readSegmentIndex(indexPath)
+    directory = os.path.dirname(indexPath)
+    if segments is None:
+        segments = index["segments"]
+
+    if index.get("chunked"):
+        return (
+            record
+            for segment in segments
+            for record in readChunk(os.path.join(directory, segment["file"]), segment)
+        )
+
+    paths = [os.path.join(directory, segment["file"]) for segment in segments]
+    return readSegmentFiles(paths)
+
+def readScopeRecords(indexPath, scope, thread=None):
+    '''
+        Yields the records logged in a scope (the adli_scope record of the
+        call and the records with its scope_uid), only decoding the
+        segments which contain the scope. The header, stack definitions
+        and segment records are also yielded, so that the stacks can be
+        expanded (see StackTable.expandStacks).
+
+        :param indexPath: Path to the <execution_id>.segments.json or
+        <execution_id>.index.json file.
+        :param scope: Scope uid.
+        :param int thread: Thread id of the scope, if known.
+    '''
+    segments = findSegments(readSegmentIndex(indexPath), thread=thread, scope=scope)
+    for record in readSegments(indexPath, segments):
+        if "thread" not in record:
+            yield record
+        elif record.get("scope_uid") == scope:
+            yield record
+        elif record["type"] == "adli_scope" and record["id"] == scope:
+            yield record
+
+class ChunkInfo:
+    '''
+        Collects the index entry of a chunk from its records, the same
+        entry SegmentedWriter writes in the index.
+    '''
+    def __init__(self, segment, name, offset):
+        self.info = {
+            "segment": segment,
+            "file": name,
+            "firstSeq": None,
+            "lastSeq": None,
+            "startTime": None,
+            "endTime": None,
+            "records": 0,
+            "threads": [],
+            "scopes": [],
+            "logtypes": [],
+            "offset": offset,
+            "length": None
+        }
+        self.threads = set()
+        self.scopes = set()
+        self.logTypes = set()
+        self.recordCount = None
+
+    def add(self, record):
+        info = self.info
+        recordType = record.get("type")
+        if recordType == "adli_segment":
+            info["segment"] = record["segment"]
+            info["startTime"] = record["startTime"]
+            return
+        if recordType == "adli_segment_end":
+            info["endTime"] = record["endTime"]
+            self.recordCount = record["records"]
+            return
+        if recordType == "adli_header":
+            return
+
+        info["records"] += 1
+        thread = record.get("thread")
+        if thread is not None:
+            self.threads.add(thread)
+        scope = record.get("scope_uid")
+        if scope is not None:
+            self.scopes.add(scope)
+        if recordType == "adli_scope":
+            self.scopes.add(record["id"])
+        elif recordType == "adli_execution":
+            self.logTypes.add(record["value"])
+
+        seq = record.get("seq")
+        if seq is not None:
+            if info["firstSeq"] is None or seq < info["firstSeq"]:
+                info["firstSeq"] = seq
+            if info["lastSeq"] is None or seq > info["lastSeq"]:
+                info["lastSeq"] = seq
+
+    def toDict(self, length):
+        from injector.LoggerInstance.AdliWriters import toRanges
+
+        info = self.info
+        info["length"] = length
+        if self.recordCount is not None:
+            info["records"] = self.recordCount
+        info["threads"] = sorted(self.threads)
+        info["scopes"] = toRanges(self.scopes)
+        info["logtypes"] = toRanges(self.logTypes)
+        return info
+
+def buildChunkIndex(path):
+    '''
+        Returns the index of a chunked CDL file by decoding every chunk,
+        for example when the process was killed before the index was
+        written. Each chunk of a compressed file is a zstd frame, the
+        chunks of a JSON lines file start at their adli_segment record.
+
+        :param path: Path to the chunked CDL file.
+    '''
+    name = os.path.basename(path)
+    chunks = []
+    executionId = None
+
+    with open(path, "rb") as f:
+        if path.endswith(JSONL_EXTENSION):
+            chunk = ChunkInfo(0, name, 0)
+            offset = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                if record.get("type") == "adli_segment" and record["segment"] > 0:
+                    chunks.append(chunk.toDict(offset - chunk.info["offset"]))
+                    chunk = ChunkInfo(record["segment"], name, offset)
+                elif record.get("type") == "adli_header":
+                    executionId = record["header"]["execInfo"]["programExecutionId"]
+                chunk.add(record)
+                offset += len(line)
+            chunks.append(chunk.toDict(offset - chunk.info["offset"]))
+        else:
+            for frame in FrameReader(f):
+                chunk = ChunkInfo(len(chunks), name, frame.offset)
+                if path.endswith(BINARY_EXTENSION):
+                    records = BinaryDecoder(frame, allowIncomplete=True, compressed=False)
+                else:
+                    records = readClpFrame(frame, allowIncomplete=True)
+                for record in records:
+                    if record.get("type") == "adli_header":
+                        executionId = record["header"]["execInfo"]["programExecutionId"]
+                    chunk.add(record)
+                frame.skip()
+                chunks.append(chunk.toDict(frame.length))
+
+    return {
+        "executionId": executionId,
+        "chunked": True,
+        "segments": chunks
+    }
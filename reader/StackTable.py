@@ -0,0 +1,78 @@
+class StackTable:
+    '''
+        This class rebuilds the stacks of adli_execution records when the
+        CDL file was generated with interned stacks. AdliLogger logs each
+        distinct frame and stack once as a definition record and execution
+        records only contain the stack id.
+    '''
+    def __init__(self):
+        self.frames = {}
+        self.stacks = {}
+        self.expanded = {}
+
+    def addDefinition(self, record):
+        '''
+            Saves the record if it is a frame or stack definition.
+            Returns True if the record was a definition.
+
+            :param dict record: A record from the CDL file.
+        '''
+        recordType = record.get("type")
+
+        if recordType == "adli_stack_frame":
+            self.frames[record["id"]] = {
+                "name": record["name"],
+                "filename": record["filename"],
+                "lineno": record["lineno"]
+            }
+            return True
+        elif recordType == "adli_stack":
+            self.stacks[record["id"]] = record["frames"]
+            return True
+
+        return False
+
+    def expand(self, stackId):
+        '''
+            Returns the stack object for the given stack id in the same
+            shape as a stack logged in full. The expanded stack is cached
+            and shared between records, it should not be modified.
+
+            :param int stackId: The id logged in the execution record.
+        '''
+        stack = self.expanded.get(stackId)
+        if stack is not None:
+            return stack
+
+        if stackId not in self.stacks:
+            raise KeyError(f"Stack {stackId} was used before it was defined.")
+
+        stack = {}
+        for index, frameId in enumerate(self.stacks[stackId]):
+            stack[str(index)] = self.frames[frameId]
+
+        self.expanded[stackId] = stack
+        return stack
+
+def expandStacks(records, keepDefinitions=False):
+    '''
+        Given an iterable of CDL records, yields the records with the
+        stack id of each execution record replaced by the full stack.
+        Stacks that were already logged in full are left unchanged.
+
+        :param records: Iterable of CDL records in the order they were logged.
+        :param bool keepDefinitions: If True, definition records are also yielded.
+    '''
+    table = StackTable()
+
+    for record in records:
+        if table.addDefinition(record):
+            if keepDefinitions:
+                yield record
+            continue
+
+        if record.get("type") == "adli_execution" and isinstance(record.get("stack"), int):
+            record = dict(record)
+            record["stack"] = table.expand(record["stack"])
+
+        yield record
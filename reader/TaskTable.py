@@ -0,0 +1,82 @@
+class TaskTable:
+    '''
+        This class tracks the asyncio task of each thread from the task
+        records logged by AdliLogger. An adli_task record defines a task
+        with its parent task, name and root scope, and the thread that
+        logged it starts logging for that task. An adli_task_switch record
+        means the thread logs for another task (None outside of tasks)
+        until the next switch.
+    '''
+    def __init__(self):
+        self.tasks = {}
+        self.current = {}
+
+    def addRecord(self, record):
+        '''
+            Saves the record if it is a task record. Returns True if the
+            record was a task record.
+
+            :param dict record: A record from the CDL file.
+        '''
+        recordType = record.get("type")
+
+        if recordType == "adli_task":
+            self.tasks[record["id"]] = {
+                "parent": record["parent"],
+                "name": record["name"],
+                "scope_uid": record["scope_uid"],
+                "thread": record["thread"]
+            }
+            self.current[record["thread"]] = record["id"]
+            return True
+        elif recordType == "adli_task_switch":
+            self.current[record["thread"]] = record["task"]
+            return True
+
+        return False
+
+    def getTask(self, thread):
+        '''
+            Returns the id of the task the thread is logging for or None.
+
+            :param int thread: The thread ident logged in a record.
+        '''
+        return self.current.get(thread)
+
+    def getTaskPath(self, taskId):
+        '''
+            Returns the ids of the tasks from the outermost task to the given
+            task, following the task that created each task.
+
+            :param int taskId: The id of the task.
+        '''
+        path = []
+        while taskId in self.tasks:
+            path.append(taskId)
+            taskId = self.tasks[taskId]["parent"]
+        path.reverse()
+        return path
+
+def assignTasks(records, keepSwitches=False):
+    '''
+        Given an iterable of CDL records, yields the records with a "task"
+        key set to the id of the asyncio task that logged them (None
+        outside of tasks). Records logged before the first task record of
+        their thread and records that already have a task key (written by
+        the flight recorder) are left unchanged.
+
+        :param records: Iterable of CDL records in the order they were logged.
+        :param bool keepSwitches: If True, adli_task_switch records are also yielded.
+    '''
+    table = TaskTable()
+
+    for record in records:
+        if table.addRecord(record) and record.get("type") == "adli_task_switch" and not keepSwitches:
+            continue
+
+        thread = record.get("thread")
+        if thread in table.current and "task" not in record:
+            record = dict(record)
+            record["task"] = table.current[thread]
+
+        yield record
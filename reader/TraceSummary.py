@@ -0,0 +1,190 @@
+import collections
+import json
+
+# Records counted as events of their thread.
+EVENT_TYPES = frozenset(["adli_execution", "adli_variable", "adli_scope", "adli_exception", "adli_input", "adli_output"])
+
+def getValueBytes(record):
+    '''
+        Returns the number of bytes of the value logged by a variable
+        record, JSON encoded. A delta (ADLI_DELTA) is counted by the keys
+        it was written with instead of the full value: 0 for an unchanged
+        value and the set and remove keys for a diff.
+
+        :param dict record: An adli_variable record.
+    '''
+    delta = record.get("delta")
+    if delta == "unchanged":
+        return 0
+    if delta == "diff":
+        return len(json.dumps(record["set"])) + len(json.dumps(record["remove"]))
+    return len(json.dumps(record.get("value")))
+
+class TraceSummary:
+    '''
+        This class summarizes a trace in a single pass over its records:
+        the hit count of each logtype, the calls to each function, the
+        events of each thread and the number and size of the values logged
+        for each variable (see getValueBytes). Only counters are kept, so
+        the memory used depends on the size of the program and not on the
+        size of the trace.
+
+        Logtypes and variables executed in the iterations omitted by loop
+        summaries are counted from the adli_loop_summary records. For
+        sampled logtypes and variables, the number of executions is taken
+        from the adli_sample_counts records logged at exit.
+    '''
+    def __init__(self):
+        self.ltMap = {}
+        self.varMap = {}
+        self.records = 0
+        self.logTypeHits = collections.Counter()
+        self.variableHits = collections.Counter()
+        self.sampledLogTypes = collections.Counter()
+        self.sampledVariables = collections.Counter()
+        self.functionCalls = collections.Counter()
+        self.threadEvents = collections.Counter()
+        self.variableRecords = collections.Counter()
+        self.variableBytes = collections.Counter()
+
+    def addHeader(self, header):
+        '''
+            Saves the logtypes and variables of the program.
+
+            :param dict header: The header of the program (header.json).
+        '''
+        self.ltMap.update(header.get("ltMap", {}))
+        self.varMap.update(header.get("varMap", {}))
+
+    def addRecord(self, record, executionId=None):
+        '''
+            Counts the record.
+
+            :param dict record: A record from the CDL file.
+            :param str executionId: The execution that logged the record.
+        '''
+        self.records += 1
+        recordType = record.get("type")
+
+        if recordType in EVENT_TYPES:
+            self.threadEvents[(executionId, record.get("thread"))] += 1
+
+        if recordType == "adli_execution":
+            self.logTypeHits[record["value"]] += 1
+        elif recordType == "adli_variable":
+            varid = record["varid"]
+            self.variableHits[varid] += 1
+            self.variableRecords[varid] += 1
+            self.variableBytes[varid] += getValueBytes(record)
+        elif recordType == "adli_scope":
+            self.functionCalls[record["funcid"]] += 1
+        elif recordType == "adli_loop_summary":
+            counts = record["counts"]
+            for (ltId, count) in counts.get("adli_execution", {}).items():
+                self.logTypeHits[int(ltId)] += count
+            for (varid, count) in counts.get("adli_variable", {}).items():
+                self.variableHits[int(varid)] += count
+        elif recordType == "adli_sample_counts":
+            for (ltId, count) in record["stmt"].items():
+                self.sampledLogTypes[int(ltId)] += count
+            for (varid, count) in record["variable"].items():
+                self.sampledVariables[int(varid)] += count
+
+    def merge(self, other):
+        '''
+            Adds the counts of another summary, for example the summary of
+            another file or chunk decoded in another process. Merging the
+            summaries of consecutive parts of a trace in order gives the
+            same summary as reading the whole trace, including the order of
+            entries with the same count.
+
+            :param TraceSummary other: The summary to add.
+        '''
+        self.ltMap.update(other.ltMap)
+        self.varMap.update(other.varMap)
+        self.records += other.records
+        self.logTypeHits.update(other.logTypeHits)
+        self.variableHits.update(other.variableHits)
+        self.sampledLogTypes.update(other.sampledLogTypes)
+        self.sampledVariables.update(other.sampledVariables)
+        self.functionCalls.update(other.functionCalls)
+        self.threadEvents.update(other.threadEvents)
+        self.variableRecords.update(other.variableRecords)
+        self.variableBytes.update(other.variableBytes)
+
+    def getLogTypeHits(self):
+        '''
+            Returns the number of executions of each logtype.
+        '''
+        hits = collections.Counter(self.logTypeHits)
+        for (ltId, count) in self.sampledLogTypes.items():
+            hits[ltId] = count
+        return hits
+
+    def getVariableHits(self):
+        '''
+            Returns the number of times each variable was assigned.
+        '''
+        hits = collections.Counter(self.variableHits)
+        for (varid, count) in self.sampledVariables.items():
+            hits[varid] = count
+        return hits
+
+    def getLogType(self, ltId):
+        return self.ltMap.get(str(ltId), {})
+
+    def getLocation(self, ltId):
+        lt = self.getLogType(ltId)
+        return {"file": lt.get("file"), "lineno": lt.get("lineno"), "statement": lt.get("statement")}
+
+    def getFunctionName(self, funcId):
+        lt = self.getLogType(funcId)
+        return f"{lt.get('file', '?')}:{lt.get('name', funcId)}"
+
+    def toDict(self, limit=None):
+        '''
+            Returns the summary as a JSON compatible dictionary. Each list
+            is sorted by count and truncated to limit entries.
+
+            :param int limit: Number of entries in each list, all if None.
+        '''
+        logTypeHits = self.getLogTypeHits()
+        variableHits = self.getVariableHits()
+        return {
+            "records": self.records,
+            "logTypes": [
+                {"id": ltId, "hits": count, **self.getLocation(ltId)}
+                for (ltId, count) in logTypeHits.most_common(limit)
+            ],
+            "functions": [
+                {"funcid": funcId, "name": self.getFunctionName(funcId), "calls": count}
+                for (funcId, count) in self.functionCalls.most_common(limit)
+            ],
+            "threads": [
+                {"executionId": executionId, "thread": thread, "events": count}
+                for ((executionId, thread), count) in self.threadEvents.most_common(limit)
+            ],
+            "variables": [
+                {"varid": varid, "name": self.varMap.get(str(varid), {}).get("name"),
+                 "records": self.variableRecords[varid], "bytes": size, "assignments": variableHits[varid]}
+                for (varid, size) in self.variableBytes.most_common(limit)
+            ]
+        }
+
+def summarizeStream(stream, records=None):
+    '''
+        Returns the TraceSummary of the records of a CdlStream.
+
+        :param CdlStream stream: The stream to summarize.
+        :param records: Records read from the stream (see
+        CdlStream.readFile), every record of the stream if None.
+    '''
+    summary = TraceSummary()
+    header = None
+    for record in stream if records is None else records:
+        if stream.header is not header:
+            header = stream.header
+            if header is not None:
+                summary.addHeader(header)
+        summary.addRecord(record, stream.executionId)
+    return summary
@@ -0,0 +1,94 @@
+import io
+
+'''
+    Reads zstd compressed files one frame at a time. AdliLogger writes each
+    CDL file, or each chunk of a chunked CDL file (ADLI_CHUNK_SIZE or
+    ADLI_CHUNK_RECORDS), as one zstd frame holding a complete stream, so
+    the frames are decoded one after the other with a new decoder.
+'''
+
+class ZstdFrame(io.RawIOBase):
+    '''
+        The decompressed data of one frame. offset is the position of the
+        frame in the file and length its compressed size, which is only
+        known once the frame was read to its end.
+    '''
+    def __init__(self, frames, offset):
+        self.frames = frames
+        self.offset = offset
+        self.length = None
+        self.decompressor = frames.decompressors.decompressobj()
+        self.output = b""
+        self.outputPosition = 0
+
+    def readable(self):
+        return True
+
+    def fill(self):
+        '''
+            Decompresses more of the frame. Returns False at the end of the
+            frame or if the file ends before the frame.
+        '''
+        decompressor = self.decompressor
+        if decompressor.eof:
+            return False
+
+        frames = self.frames
+        if not frames.input:
+            frames.input = frames.file.read(FrameReader.READ_SIZE)
+            if not frames.input:
+                return False
+
+        data = frames.input
+        self.output = decompressor.decompress(data)
+        self.outputPosition = 0
+        frames.input = decompressor.unused_data if decompressor.eof else b""
+        frames.position += len(data) - len(frames.input)
+        return True
+
+    def skip(self):
+        '''
+            Reads the rest of the frame.
+        '''
+        while self.fill():
+            pass
+        self.length = self.frames.position - self.offset
+
+    def readinto(self, buffer):
+        while self.outputPosition >= len(self.output):
+            if not self.fill():
+                return 0
+
+        size = min(len(buffer), len(self.output) - self.outputPosition)
+        buffer[:size] = self.output[self.outputPosition:self.outputPosition + size]
+        self.outputPosition += size
+        return size
+
+class FrameReader:
+    '''
+        Iterates over the frames of a zstd compressed file. The rest of a
+        frame is skipped when the next frame is requested.
+    '''
+    READ_SIZE = 1 << 17
+
+    def __init__(self, f):
+        '''
+            :param f: The compressed file opened in binary mode, positioned
+            at the start of a frame.
+        '''
+        from zstandard import ZstdDecompressor
+
+        self.file = f
+        self.decompressors = ZstdDecompressor()
+        self.input = b""
+        self.position = f.tell()
+
+    def __iter__(self):
+        while True:
+            if not self.input:
+                self.input = self.file.read(FrameReader.READ_SIZE)
+                if not self.input:
+                    return
+            frame = ZstdFrame(self, self.position)
+            yield frame
+            frame.skip()
@@ -0,0 +1,76 @@
+import glob
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+
+from injector.ProgramProcessor import ProgramProcessor
+from reader.CdlFile import readCdlRecords
+
+CDL_PATTERNS = ("*.clp.zst", "*.adlib.zst", "*.cdl.jsonl")
+
+class InjectedProgram:
+    '''
+        A program injected into a temporary directory which can be run
+        with different runtime settings (ADLI_* environment variables).
+    '''
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+
+    def getCdlFiles(self):
+        files = set()
+        for pattern in CDL_PATTERNS:
+            files.update(glob.glob(os.path.join(self.directory, pattern)))
+        return files
+
+    def run(self, **env):
+        '''
+            Runs the program and returns the path of the CDL file it wrote.
+            ADLI_* variables of the test environment are not inherited.
+
+            :param env: Environment variables of the run.
+        '''
+        before = self.getCdlFiles()
+        runEnv = {name: value for (name, value) in os.environ.items() if not name.startswith("ADLI_")}
+        runEnv.update({name: str(value) for (name, value) in env.items()})
+        subprocess.run(
+            [sys.executable, f"{self.name}.py"],
+            cwd=self.directory,
+            env=runEnv,
+            check=True,
+            capture_output=True
+        )
+        written = sorted(self.getCdlFiles() - before)
+        assert len(written) == 1, written
+        return written[0]
+
+    def records(self, **env):
+        '''
+            Runs the program and returns the records of its CDL file.
+        '''
+        return list(readCdlRecords(self.run(**env)))
+
+@pytest.fixture
+def injectProgram(tmp_path):
+    '''
+        Returns a function which injects the source of a program and
+        returns an InjectedProgram.
+    '''
+    def inject(source, name="program", sampling=None, loopSummary=None):
+        sourceDirectory = tmp_path / "source"
+        sourceDirectory.mkdir(exist_ok=True)
+        path = sourceDirectory / f"{name}.py"
+        path.write_text(textwrap.dedent(source))
+
+        workingDirectory = tmp_path / "work"
+        processor = ProgramProcessor(str(path), str(workingDirectory), None, sampling, loopSummary)
+        processor.run()
+        return InjectedProgram(processor.outputDirectory, name)
+
+    return inject
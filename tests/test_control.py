@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+PROGRAM = '''
+def quiet(n):
+    total = 0
+    for i in range(n):
+        total += i
+    return total
+
+def loud(n):
+    value = n * 2
+    return value
+
+for round in range(5):
+    hidden = quiet(round)
+    shown = loud(round)
+'''
+
+SINKS = [{"ADLI_SINK": "jsonl"}, {"ADLI_FORMAT": "clp"}, {"ADLI_FORMAT": "binary"}]
+
+@pytest.mark.parametrize("sink", SINKS)
+def test_header_is_first_with_control_file(injectProgram, tmp_path, sink):
+    controlFile = tmp_path / "control.json"
+    controlFile.write_text(json.dumps({"rules": [{"enabled": False, "functions": ["quiet"]}]}))
+
+    records = injectProgram(PROGRAM).records(ADLI_CONTROL_FILE=controlFile, **sink)
+    assert [record["type"] for record in records[:2]] == ["adli_header", "adli_control"]
+    assert records[1]["source"] == "file"
+
+    # The logtypes of quiet are disabled from the start.
+    ltMap = records[0]["header"]["ltMap"]
+    quiet = {int(ltId) for (ltId, lt) in ltMap.items() if ltMap.get(str(lt["funcid"]), {}).get("name") == "quiet"}
+    assert quiet and set(records[1]["disabled"]) == quiet
+    logTypes = {record["value"] for record in records if record["type"] == "adli_execution"}
+    assert logTypes and not logTypes & quiet
+
+def test_missing_control_file_logs_everything(injectProgram, tmp_path):
+    program = injectProgram(PROGRAM)
+    expected = [record["type"] for record in program.records(ADLI_SINK="jsonl")]
+
+    records = program.records(ADLI_SINK="jsonl", ADLI_CONTROL_FILE=tmp_path / "missing.json")
+    assert [record["type"] for record in records] == expected
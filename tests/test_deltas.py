@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from reader.DeltaResolver import resolveDeltas
+
+PROGRAM = '''
+def mutate(rounds):
+    state = {"count": 0, "items": {"a": 1, "b": [1, 2]}, "name": "start"}
+    for i in range(rounds):
+        if i % 3 == 0:
+            state["count"] += 1
+        if i % 5 == 0:
+            state["items"]["c" + str(i)] = i
+        if i % 7 == 0:
+            state["items"].pop("a", None)
+        if i % 11 == 0:
+            state["name"] = i
+        snapshot = dict(state)
+    return state
+
+def types():
+    for value in [1, True, 1.0, 1, 1, "1", None, 0, False]:
+        current = value
+    for value in [{"a": 1}, {"a": True}, {"a": 1.0}, {"a": 1.0}, {"a": [1]}, {"a": [True]}]:
+        current = value
+
+mutate(60)
+types()
+'''
+
+def getValues(records):
+    '''
+        Returns the JSON encoded value of each variable record by seq, so
+        that 1, 1.0 and True are different values.
+    '''
+    return {
+        record["seq"]: json.dumps(record.get("value"))
+        for record in records
+        if record["type"] == "adli_variable"
+    }
+
+@pytest.mark.parametrize("delta", ["unchanged", "diff"])
+@pytest.mark.parametrize("sink", [{"ADLI_SINK": "jsonl"}, {"ADLI_FORMAT": "clp"}, {"ADLI_FORMAT": "binary"}])
+def test_resolved_deltas_match_full_values(injectProgram, delta, sink):
+    program = injectProgram(PROGRAM)
+    expected = getValues(program.records(**sink))
+
+    records = program.records(ADLI_DELTA=delta, **sink)
+    assert any("delta" in record for record in records)
+    assert getValues(resolveDeltas(records)) == expected
+
+@pytest.mark.parametrize("delta", ["unchanged", "diff"])
+def test_dropped_records_are_not_resolved_to_wrong_values(injectProgram, delta):
+    program = injectProgram(PROGRAM)
+    expected = getValues(program.records(ADLI_SINK="jsonl"))
+
+    records = program.records(
+        ADLI_SINK="jsonl", ADLI_DELTA=delta, ADLI_WRITER="async", ADLI_QUEUE_SIZE=4, ADLI_OVERFLOW="drop"
+    )
+    for record in resolveDeltas(records):
+        if record["type"] != "adli_variable" or record.get("delta_unresolved"):
+            continue
+        assert json.dumps(record["value"]) == expected[record["seq"]]
+
+def test_missing_base_is_unresolved(injectProgram):
+    program = injectProgram(PROGRAM)
+    records = program.records(ADLI_SINK="jsonl", ADLI_DELTA="diff")
+
+    # Remove a full value that a delta refers to, as if it was lost.
+    bases = {record["base"] for record in records if "delta" in record}
+    removed = next(record for record in records if record.get("seq") in bases and "delta" not in record)
+    dependent = {record["seq"] for record in records if record.get("base") == removed["seq"]}
+    records = [record for record in records if record is not removed]
+
+    for record in resolveDeltas(records):
+        if record.get("seq") in dependent:
+            assert record["delta_unresolved"]
+            assert record["value"] is None
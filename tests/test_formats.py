@@ -0,0 +1,74 @@
+import pytest
+
+PROGRAM = '''
+class Item:
+    def __init__(self, name, count):
+        self.name = name
+        self.count = count
+
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+def build(size):
+    items = {}
+    for i in range(size):
+        items[f"item{i}"] = {"count": i, "flags": [i % 2 == 0, i * 1.5, None]}
+    return items
+
+def update(items):
+    total = 0
+    for (name, value) in items.items():
+        value["count"] += 1
+        total += value["count"]
+    return total
+
+def fail():
+    try:
+        raise ValueError("expected")
+    except ValueError as e:
+        message = str(e)
+    return message
+
+items = build(20)
+for _ in range(3):
+    total = update(items)
+result = fib(8)
+message = fail()
+item = Item("a", 1)
+'''
+
+# Keys of the header which change between runs.
+EXEC_INFO_KEYS = ("programExecutionId", "pid", "timestamp", "sink", "format", "clpEncoder")
+
+def normalize(records):
+    '''
+        Returns the records without the values that change between runs.
+    '''
+    normalized = []
+    for record in records:
+        record = dict(record)
+        if record["type"] == "adli_header":
+            header = dict(record["header"])
+            header["execInfo"] = {
+                name: value for (name, value) in header["execInfo"].items() if name not in EXEC_INFO_KEYS
+            }
+            record["header"] = header
+        if "thread" in record:
+            record["thread"] = "main"
+        normalized.append(record)
+    return normalized
+
+@pytest.mark.parametrize("stackMode", ["interned", "full", "none"])
+@pytest.mark.parametrize("threadBuffer", [0, 16])
+def test_formats_match_json_lines(injectProgram, stackMode, threadBuffer):
+    program = injectProgram(PROGRAM)
+    settings = {"ADLI_STACK_MODE": stackMode, "ADLI_THREAD_BUFFER": threadBuffer}
+    expected = normalize(program.records(ADLI_SINK="jsonl", **settings))
+    assert expected[0]["type"] == "adli_header"
+    assert any(record["type"] == "adli_scope" for record in expected)
+
+    for (format, encoder) in (("clp", "direct"), ("clp", "logging"), ("binary", "direct")):
+        records = program.records(ADLI_FORMAT=format, ADLI_CLP_ENCODER=encoder, **settings)
+        assert normalize(records) == expected, (format, encoder)
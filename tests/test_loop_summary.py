@@ -0,0 +1,110 @@
+import collections
+
+from reader.TraceSummary import TraceSummary
+
+PROGRAM = '''
+def search(values, target):
+    for value in values:
+        found = value
+        if value == target:
+            break
+    else:
+        found = None
+    return found
+
+def count(limit):
+    total = 0
+    n = 0
+    while n < limit:
+        n += 1
+        total += n
+    else:
+        done = total
+        for extra in range(4):
+            done += extra
+    return done
+
+def nested(size):
+    cells = 0
+    for i in range(size):
+        for j in range(size):
+            cells += 1
+    else:
+        last = cells
+    return last
+
+search(list(range(20)), 12)
+search(list(range(20)), 50)
+count(15)
+nested(6)
+'''
+
+LOOP_SUMMARY = {"first": 1, "last": 1}
+
+def summarize(records):
+    '''
+        Returns the logtype and variable hits of the records keyed by their
+        source, since ids are not kept between injections.
+    '''
+    summary = TraceSummary()
+    for record in records:
+        if record["type"] == "adli_header":
+            summary.addHeader(record["header"])
+        summary.addRecord(record)
+
+    def getKey(ltId):
+        lt = summary.getLogType(ltId)
+        return (lt["lineno"], lt["statement"])
+
+    logTypeHits = collections.Counter()
+    for (ltId, count) in summary.getLogTypeHits().items():
+        logTypeHits[getKey(ltId)] += count
+    variableHits = collections.Counter()
+    for (varid, count) in summary.getVariableHits().items():
+        var = summary.varMap[str(varid)]
+        variableHits[(getKey(var["logType"]), var["name"])] += count
+    return (logTypeHits, variableHits)
+
+def test_summarized_counts_match_full_run(injectProgram):
+    full = injectProgram(PROGRAM).records()
+    records = injectProgram(PROGRAM, loopSummary=LOOP_SUMMARY).records()
+
+    assert any(record["type"] == "adli_loop_summary" for record in records)
+    assert len(records) < len(full)
+
+    assert summarize(records) == summarize(full)
+
+def getVariableRecords(records, name):
+    varMap = records[0]["header"]["varMap"]
+    varids = {int(varid) for (varid, var) in varMap.items() if var["name"] == name}
+    return [(index, record) for (index, record) in enumerate(records)
+            if record["type"] == "adli_variable" and record["varid"] in varids]
+
+def getLoopSummary(records, statement):
+    ltMap = records[0]["header"]["ltMap"]
+    ltId = next(int(ltId) for (ltId, lt) in ltMap.items() if lt["statement"].startswith(statement))
+    return next(index for (index, record) in enumerate(records)
+                if record["type"] == "adli_loop_summary" and record["value"] == ltId)
+
+def test_else_block_is_not_part_of_the_last_iteration(injectProgram):
+    # The last iterations are omitted, so records added to them are lost.
+    records = injectProgram(PROGRAM, loopSummary={"first": 1, "last": 0}).records()
+
+    last = getVariableRecords(records, "last")
+    assert [record["value"] for (_, record) in last] == [36]
+    assert last[0][0] > getLoopSummary(records, "for i in range(size)")
+
+    done = getVariableRecords(records, "done")
+    assert [record["value"] for (_, record) in done][0] == 120
+    assert done[0][0] > getLoopSummary(records, "while n < limit")
+
+def test_break_logs_last_iteration(injectProgram):
+    program = injectProgram(PROGRAM, loopSummary=LOOP_SUMMARY)
+    records = program.records()
+    header = records[0]["header"]
+
+    found = {int(varid) for (varid, var) in header["varMap"].items() if var["name"] == "found"}
+    values = [record["value"] for record in records if record["type"] == "adli_variable" and record["varid"] in found]
+    # The first call breaks at 12, the second one runs the else block.
+    assert values[:2] == [0, 12]
+    assert values[-1] is None
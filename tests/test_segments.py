@@ -0,0 +1,63 @@
+import os
+import shutil
+
+import pytest
+
+from reader.CdlFile import readCdlRecords
+from reader.SegmentIndex import buildChunkIndex, findSegments, getChunkIndex, readChunk
+
+PROGRAM = '''
+def work(n):
+    total = 0
+    for i in range(n):
+        total += i
+    return total
+
+for round in range(20):
+    result = work(10)
+'''
+
+SINKS = [{"ADLI_SINK": "jsonl"}, {"ADLI_FORMAT": "clp"}, {"ADLI_FORMAT": "binary"}]
+
+def getRecords(path, chunks):
+    return [record for chunk in chunks for record in readChunk(path, chunk)]
+
+def truncate(path, chunk, destination):
+    '''
+        Copies the file up to the middle of the chunk, as if the process
+        was killed while writing it.
+    '''
+    shutil.copyfile(path, destination)
+    with open(destination, "r+b") as f:
+        f.truncate(chunk["offset"] + chunk["length"] // 2)
+    return destination
+
+@pytest.mark.parametrize("sink", SINKS)
+def test_chunk_index_matches_written_index(injectProgram, sink):
+    path = injectProgram(PROGRAM).run(ADLI_CHUNK_RECORDS=50, **sink)
+    index = getChunkIndex(path)
+    assert len(index["segments"]) > 3
+
+    assert buildChunkIndex(path) == index
+    assert getRecords(path, index["segments"]) == list(readCdlRecords(path))
+
+@pytest.mark.parametrize("sink", SINKS)
+def test_truncated_chunked_file(injectProgram, tmp_path, sink):
+    path = injectProgram(PROGRAM).run(ADLI_CHUNK_RECORDS=50, **sink)
+    index = getChunkIndex(path)
+    last = index["segments"][-2]
+    truncated = truncate(path, last, str(tmp_path / os.path.basename(path)))
+
+    rebuilt = buildChunkIndex(truncated)
+    complete = rebuilt["segments"][:-1]
+    assert complete == index["segments"][:-2]
+    assert rebuilt["segments"][-1]["endTime"] is None
+
+    # Every complete record can be found by its sequence number.
+    records = getRecords(truncated, rebuilt["segments"])
+    assert 0 < len(records) < len(list(readCdlRecords(path)))
+    for record in records:
+        if "seq" not in record:
+            continue
+        found = getRecords(truncated, findSegments(rebuilt, seq=record["seq"]))
+        assert record in found